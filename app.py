@@ -6,16 +6,22 @@ from home import home_bp
 from login import login_bp
 from register import register_bp
 from dashboard import dashboard_bp
-from upload import predict_bp
+from upload import predict_bp, start_warmup
 from logout import logout_bp
 from history import history_bp
 from analytics import stats_bp
 from settings import settings_bp
 from users import users_bp
 from account import account_bp
+from thumbnails import thumbs_bp
+from upload_store import IngestRequest, MAX_UPLOAD_BYTES
+from metrics import UPLOADS, metrics_bp
+from profiling import init_profiling
 
 
 app = Flask(__name__)
+# File upload đi thẳng vào spool có hash + giới hạn dung lượng (upload_store.IngestRequest)
+app.request_class = IngestRequest
 app.secret_key = "change-this-secret-key"
 
 # Cấu hình thư mục upload và định dạng cho phép
@@ -23,6 +29,10 @@ UPLOAD_FOLDER = os.path.join("static", "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["ALLOWED_EXTENSIONS"] = {"png", "jpg", "jpeg"}
+# Request lớn hơn giới hạn bị từ chối (413) trước khi đọc hết body (MAX_UPLOAD_MB, mặc định 10)
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+# Nhận diện bất đồng bộ: upload trả job id ngay, suy luận chạy trên executor nền (jobs.py)
+app.config["PREDICT_ASYNC"] = os.environ.get("PREDICT_ASYNC", "0") == "1"
 
 # VietQR (EMVCo) config (có thể override bằng biến môi trường)
 # Lưu ý: VIETQR_BANK_BIN là BIN NAPAS 6 số của ngân hàng (bắt buộc để VietQR scan ra đúng).
@@ -45,6 +55,14 @@ app.register_blueprint(stats_bp, url_prefix="/statistics")
 app.register_blueprint(settings_bp, url_prefix="/settings")
 app.register_blueprint(account_bp, url_prefix="/account")
 app.register_blueprint(users_bp, url_prefix="/users")
+app.register_blueprint(thumbs_bp, url_prefix="")
+# Prometheus text format tại /metrics (không cần dịch vụ ngoài; METRICS_TOKEN để bảo vệ)
+app.register_blueprint(metrics_bp, url_prefix="")
+# Admin thêm ?profile=1 (hoặc header X-Profile) để chạy request dưới cProfile; xem ở /users/profiles
+init_profiling(app)
+
+# Nạp + chạy thử mô hình ở nền; /ready trả 503 cho tới khi xong (MODEL_WARMUP=0 để tắt)
+model_warmup = start_warmup()
 
 
 # Context processor để inject theme vào tất cả templates
@@ -85,6 +103,13 @@ def handle_not_found(e):
     return render_template("error.html", code=404, message="Không tìm thấy trang hoặc tài nguyên yêu cầu."), 404
 
 
+@app.errorhandler(413)
+def handle_too_large(e):
+    UPLOADS.inc(outcome="too_large")
+    limit_mb = (app.config.get("MAX_CONTENT_LENGTH") or 0) / (1024 * 1024)
+    return render_template("error.html", code=413, message=f"File quá lớn. Dung lượng tối đa {limit_mb:g} MB."), 413
+
+
 @app.errorhandler(500)
 def handle_server_error(e):
     return render_template("error.html", code=500, message="Lỗi hệ thống. Vui lòng thử lại sau."), 500
@@ -95,6 +120,14 @@ def health():
     return jsonify({"status": "ok"}), 200
 
 
+@app.route("/ready")
+def ready():
+    """Readiness cho load balancer: chỉ nhận traffic sau khi warm-up mô hình xong."""
+    if model_warmup.ready:
+        return jsonify({"status": "ready", "warmup_ms": model_warmup.duration_ms}), 200
+    return jsonify({"status": "warming_up"}), 503
+
+
 if __name__ == "__main__":
     url = "http://127.0.0.1:5000"
     print(f"\nTruy cập ứng dụng tại: {url}\n")
@@ -0,0 +1,13 @@
+"""
+Benchmarks for the recognition pipeline.
+
+Usage (from the repository root):
+  python -m benchmarks run [--images static/uploads] [--cases hog,predict,detect] [--json bench.json]
+  python -m benchmarks run --json new.json --baseline bench.json
+  python -m benchmarks compare bench.json new.json [--threshold 0.1]
+
+Each case is timed on a fixture set with small, large, multi-dog and non-dog images
+(see benchmarks/fixtures.py). The JSON report holds latency percentiles, throughput and
+peak RSS per case and category. `compare` flags regressions against a saved baseline and
+exits with code 1 if any are found.
+"""
@@ -0,0 +1,124 @@
+"""
+Command line for the benchmark suite; see benchmarks/__init__.py for usage.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def run(args) -> int:
+    # Before importing the app: no background warm-up / registry polling, and no result
+    # cache (repeated images would otherwise be served from it) unless --cache is given.
+    os.environ.setdefault("MODEL_WARMUP", "0")
+    os.environ.setdefault("MODEL_REGISTRY_POLL", "0")
+    if not args.cache:
+        os.environ["RESULT_CACHE_SIZE"] = "0"
+        os.environ["RESULT_CACHE_DIR"] = ""
+
+    from benchmarks.cases import CASE_NAMES, build_cases, cleanup
+    from benchmarks.fixtures import CATEGORIES, build_fixtures
+    from benchmarks.report import compare, environment, load_report, peak_rss_mb, print_results, summarize, write_report
+
+    names = [n.strip() for n in args.cases.split(",") if n.strip()] if args.cases else list(CASE_NAMES)
+    unknown = [n for n in names if n not in CASE_NAMES]
+    if unknown:
+        raise SystemExit(f"Unknown case(s): {', '.join(unknown)}; choose from {', '.join(CASE_NAMES)}")
+    categories = [c.strip() for c in args.categories.split(",") if c.strip()] if args.categories else list(CATEGORIES)
+
+    with tempfile.TemporaryDirectory(prefix="dogai-bench-") as tmp:
+        fixtures = build_fixtures(tmp, args.images, args.per_category)
+        cases = build_cases(names)
+        results = {}
+        try:
+            for case in cases:
+                entry = {"categories": {}}
+                for cat in categories:
+                    latencies, errors = [], 0
+                    for path in fixtures.get(cat, []):
+                        try:
+                            state = case.prepare(path)
+                        except Exception as e:
+                            print(f"  {case.name}/{cat}: prepare failed for {os.path.basename(path)}: {e}")
+                            errors += 1
+                            continue
+                        for i in range(args.warmup + args.repeat):
+                            gc.collect()
+                            t0 = time.perf_counter()
+                            try:
+                                ok = case.ok(case.run(state))
+                            except Exception as e:
+                                print(f"  {case.name}/{cat}: {e}")
+                                ok = False
+                            elapsed = (time.perf_counter() - t0) * 1000.0
+                            if i < args.warmup:
+                                continue
+                            if ok:
+                                latencies.append(elapsed)
+                            else:
+                                errors += 1
+                    entry["categories"][cat] = summarize(latencies, errors)
+                entry["peak_rss_mb"] = peak_rss_mb()
+                results[case.name] = entry
+                print(f"{case.name}: done (peak RSS {entry['peak_rss_mb']} MB)")
+        finally:
+            cleanup()
+
+    model_versions = None
+    if "upload" in sys.modules:
+        model_versions = sys.modules["upload"]._model_versions()
+    report = {
+        "environment": environment(model_versions),
+        "settings": {"repeat": args.repeat, "warmup": args.warmup, "per_category": args.per_category,
+                     "images": args.images, "cache": args.cache},
+        "fixtures": {cat: [os.path.basename(p) for p in paths] for cat, paths in fixtures.items()},
+        "results": results,
+    }
+    print_results(results)
+    if args.json:
+        write_report(args.json, report)
+    if args.baseline:
+        regressions = compare(load_report(args.baseline), report, args.threshold, args.min_delta_ms)
+        return 1 if regressions else 0
+    return 0
+
+
+def main() -> None:
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    ap = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    r = sub.add_parser("run", help="Run the benchmarks")
+    r.add_argument("--images", default=None, help="Source photos (optionally with small/large/multi_dog/non_dog sub-folders)")
+    r.add_argument("--cases", default=None, help="Comma-separated cases (default: all)")
+    r.add_argument("--categories", default=None, help="Comma-separated fixture categories (default: all)")
+    r.add_argument("--per-category", type=int, default=3, help="Images per category")
+    r.add_argument("--repeat", type=int, default=10, help="Timed runs per image")
+    r.add_argument("--warmup", type=int, default=2, help="Untimed runs per image before timing")
+    r.add_argument("--cache", action="store_true", help="Keep the result cache enabled")
+    r.add_argument("--json", default=None, help="Write the report to this file")
+    r.add_argument("--baseline", default=None, help="Compare with this saved report (exit 1 on regression)")
+
+    c = sub.add_parser("compare", help="Compare two saved reports")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    for p in (r, c):
+        p.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown that counts as a regression")
+        p.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    args = ap.parse_args()
+
+    if args.command == "compare":
+        from benchmarks.report import compare, load_report
+        regressions = compare(load_report(args.baseline), load_report(args.current), args.threshold, args.min_delta_ms)
+        raise SystemExit(1 if regressions else 0)
+    raise SystemExit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark cases. Each case prepares its input once per fixture image (not timed) and
+then times `run` on it. The cases call the same functions the app uses, so the numbers
+include the batching queues, the model server (if configured) and the configured backend.
+
+  decode    ImageFrame.from_path (probe + reduced decode + EXIF orientation)
+  hog       utils.extract_hog_features on a fresh frame
+  predict   ImagePredictor.predict (HOG + SVM) on a fresh frame
+  cascade   ImagePredictor.dog_margin (species SVM margin used by PRE_CASCADE)
+  detect    upload._detect_species (letterbox + detect model)
+  segment   upload._segment (letterbox + segment model + mask encoding)
+  breed     upload._predict_breed on the detected dogs (skipped without a breed model)
+  annotate  overlay boxes + thumbnails, the annotate step of upload._process_upload
+            (includes removing the previous run's thumbnails)
+  upload    POST /predict/upload through Flask's test client (admin session, no quota).
+            Repeats hit the content store like a duplicate upload; history and timing rows
+            go to whatever connect.get_connection() points at.
+"""
+from __future__ import annotations
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Any, Callable
+
+CASE_NAMES = ("decode", "hog", "predict", "cascade", "detect", "segment", "breed", "annotate", "upload")
+# Under static/uploads so thumbnails and the content store behave as in production
+BENCH_UPLOAD_DIR = os.path.join("static", "uploads", ".bench")
+
+
+@dataclass
+class Case:
+    name: str
+    prepare: Callable[[str], Any]      # fixture path -> input for run (not timed)
+    run: Callable[[Any], Any]
+    ok: Callable[[Any], bool] = lambda result: True
+
+
+def _frame(path: str):
+    from utils import ImageFrame
+    frame = ImageFrame.from_path(path)
+    if frame is None:
+        raise ValueError(f"unreadable fixture: {path}")
+    return frame
+
+
+def _fresh(frame):
+    """New frame over the same pixels: per-frame caches (letterbox, HOG) start empty, as in a request."""
+    from utils import ImageFrame
+    return ImageFrame(frame.bgr, source=frame.source)
+
+
+def _cascade_available(upload) -> bool:
+    import numpy as np
+    from utils import ImageFrame
+    predictor = upload.predictor.get()
+    if predictor is None:
+        return False
+    return predictor.dog_margin(ImageFrame(np.zeros((64, 64, 3), dtype=np.uint8))) is not None
+
+
+def build_cases(names: list[str]) -> list[Case]:
+    import upload
+    from utils import ImageFrame, extract_hog_features
+    from thumbnails import delete_thumbnails, generate_thumbnails
+
+    cases: dict[str, Case] = {}
+    cases["decode"] = Case("decode", lambda p: p, lambda p: ImageFrame.from_path(p), ok=lambda f: f is not None)
+    cases["hog"] = Case("hog", _frame, lambda f: extract_hog_features(_fresh(f)))
+    cases["predict"] = Case("predict", _frame, lambda f: upload.predictor.get().predict(_fresh(f)))
+    # dog_margin returns None at once without a binary Dog/Cat species SVM: skip rather than time a no-op
+    if _cascade_available(upload):
+        cases["cascade"] = Case(
+            "cascade", _frame, lambda f: upload.predictor.get().dog_margin(_fresh(f)), ok=lambda m: m is not None
+        )
+    cases["detect"] = Case("detect", _frame, lambda f: upload._detect_species(_fresh(f)))
+    cases["segment"] = Case("segment", _frame, lambda f: upload._segment(_fresh(f)))
+    if upload.breed_queue is not None:
+        def prepare_breed(path):
+            frame = _frame(path)
+            return frame, upload._detect_species(_fresh(frame))[1]
+        cases["breed"] = Case("breed", prepare_breed, lambda s: upload._predict_breed(_fresh(s[0]), s[1]))
+
+    def prepare_annotate(path):
+        frame = _frame(path)
+        os.makedirs(BENCH_UPLOAD_DIR, exist_ok=True)
+        dest = os.path.join(BENCH_UPLOAD_DIR, os.path.basename(path))
+        shutil.copyfile(path, dest)
+        try:
+            det_items = upload._detect_species(_fresh(frame))[1]
+        except Exception as e:
+            print(f"  annotate: no detections for {os.path.basename(path)} ({e})")
+            det_items = []
+        return dest, frame, det_items
+
+    def run_annotate(state):
+        dest, frame, det_items = state
+        # Thumbnails that already exist are skipped, so drop them to time a first upload
+        delete_thumbnails(dest)
+        upload._overlay_boxes(det_items)
+        return generate_thumbnails(dest, frame.bgr)
+
+    cases["annotate"] = Case("annotate", prepare_annotate, run_annotate)
+    if "upload" in names:
+        cases["upload"] = _upload_case()
+
+    missing = [n for n in names if n not in cases]
+    if missing:
+        print(f"Skipping unavailable case(s): {', '.join(missing)}")
+    return [cases[n] for n in names if n in cases]
+
+
+def _upload_case() -> Case:
+    import io
+    from app import app
+
+    app.config["UPLOAD_FOLDER"] = BENCH_UPLOAD_DIR
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = int(os.environ.get("BENCH_USER_ID", "1"))
+        sess["username"] = "bench"
+        sess["role"] = "admin"
+
+    def prepare(path):
+        with open(path, "rb") as f:
+            return os.path.basename(path), f.read()
+
+    def run(state):
+        name, data = state
+        return client.post(
+            "/predict/upload", data={"image": (io.BytesIO(data), name)}, content_type="multipart/form-data"
+        )
+
+    return Case("upload", prepare, run, ok=lambda r: r.status_code == 200)
+
+
+def cleanup() -> None:
+    """Remove the files written by annotate / upload (uploads and their thumbnails)."""
+    from thumbnails import THUMB_ROOT, THUMB_WIDTHS
+    shutil.rmtree(BENCH_UPLOAD_DIR, ignore_errors=True)
+    for w in THUMB_WIDTHS:
+        shutil.rmtree(os.path.join(THUMB_ROOT, str(w), os.path.basename(BENCH_UPLOAD_DIR)), ignore_errors=True)
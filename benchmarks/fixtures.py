@@ -0,0 +1,105 @@
+"""
+Fixture images for the benchmarks: small, large, multi_dog and non_dog.
+
+If --images has sub-folders with those names, their images are used as they are. Missing
+categories are built from the other images in the folder (any depth):
+  small      source photo downscaled to a 320 px long side
+  large      source photo upscaled to 4032x3024 (exercises the reduced JPEG decode)
+  multi_dog  2x2 mosaic of source photos (1280x960)
+  non_dog    procedural texture (gradients, shapes, noise) with no animal in it
+Without any source photo, every category is procedural, so the pipeline only takes the
+"not a dog" paths. Pass real dog photos to measure segment / breed / HOG.
+"""
+from __future__ import annotations
+import os
+
+import cv2
+import numpy as np
+
+CATEGORIES = ("small", "large", "multi_dog", "non_dog")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+LARGE_SIZE = (4032, 3024)
+SMALL_SIDE = 320
+MOSAIC_TILE = (640, 480)
+
+
+def _list_images(root: str) -> list[str]:
+    return sorted(
+        os.path.join(d, f) for d, _, files in os.walk(root) for f in files if f.lower().endswith(IMAGE_EXTS)
+    )
+
+
+def _procedural(width: int, height: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.stack([
+        127 + 120 * np.sin(xx / (37 + 11 * c) + yy / (53 + 7 * c) + seed) for c in range(3)
+    ], axis=-1)
+    img = np.clip(img + rng.normal(0, 18, img.shape), 0, 255).astype(np.uint8)
+    for _ in range(12):
+        color = tuple(int(v) for v in rng.integers(0, 255, 3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        r = int(rng.integers(10, max(11, min(width, height) // 4)))
+        if rng.random() < 0.5:
+            cv2.circle(img, (x, y), r, color, -1)
+        else:
+            cv2.rectangle(img, (x, y), (x + r, y + r // 2), color, -1)
+    return img
+
+
+def _resize_long_side(img: np.ndarray, side: int) -> np.ndarray:
+    h, w = img.shape[:2]
+    r = side / max(h, w)
+    interp = cv2.INTER_AREA if r < 1 else cv2.INTER_CUBIC
+    return cv2.resize(img, (max(1, round(w * r)), max(1, round(h * r))), interpolation=interp)
+
+
+def _mosaic(images: list[np.ndarray]) -> np.ndarray:
+    tw, th = MOSAIC_TILE
+    tiles = [cv2.resize(images[i % len(images)], (tw, th), interpolation=cv2.INTER_AREA) for i in range(4)]
+    return np.vstack([np.hstack(tiles[:2]), np.hstack(tiles[2:])])
+
+
+def build_fixtures(out_dir: str, images_dir: str | None = None, per_category: int = 3) -> dict[str, list[str]]:
+    """Write the fixture set as JPEG files into out_dir; returns {category: [paths]}."""
+    os.makedirs(out_dir, exist_ok=True)
+    fixtures: dict[str, list[str]] = {}
+    sources: list[np.ndarray] = []
+    if images_dir:
+        for cat in CATEGORIES:
+            sub = os.path.join(images_dir, cat)
+            if os.path.isdir(sub):
+                paths = _list_images(sub)[:per_category]
+                if paths:
+                    fixtures[cat] = paths
+        for path in _list_images(images_dir):
+            if len(sources) >= max(4, per_category):
+                break
+            if os.path.basename(os.path.dirname(path)) == "non_dog":
+                continue
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+            if img is not None:
+                sources.append(img)
+
+    def write(cat: str, i: int, img: np.ndarray) -> str:
+        path = os.path.join(out_dir, f"{cat}_{i}.jpg")
+        cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        return path
+
+    for cat in CATEGORIES:
+        if cat in fixtures:
+            continue
+        paths = []
+        for i in range(per_category):
+            src = sources[i % len(sources)] if sources else _procedural(1024, 768, seed=i)
+            if cat == "small":
+                img = _resize_long_side(src, SMALL_SIDE)
+            elif cat == "large":
+                img = cv2.resize(src, LARGE_SIZE, interpolation=cv2.INTER_CUBIC)
+            elif cat == "multi_dog":
+                img = _mosaic(sources[i:] + sources[:i]) if sources else _procedural(*MOSAIC_TILE, seed=100 + i)
+            else:
+                img = _procedural(1024, 768, seed=200 + i)
+            paths.append(write(cat, i, img))
+        fixtures[cat] = paths
+    return fixtures
@@ -0,0 +1,140 @@
+"""
+Timing statistics, JSON reports and baseline comparison for the benchmarks.
+"""
+from __future__ import annotations
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Settings that change the numbers; stored with every report so comparisons are explainable
+# (the env vars yolo_models.py / upload.py / utils.py read, plus OMP_NUM_THREADS for torch)
+ENV_KEYS = (
+    "INFER_BACKEND", "BREED_WEIGHTS", "BREED_CROP_IMGSZ", "BREED_CROP_PAD", "YOLO_MAX_DET", "IMAGE_MAX_SIDE",
+    "INFER_BATCH_WINDOW_MS", "INFER_MAX_BATCH", "YOLO_SINGLE_PASS", "OMP_NUM_THREADS", "MODEL_SERVER_ADDRESS",
+    "PRE_CASCADE", "PRE_CASCADE_MARGIN", "SEGMENT_PLANS", "MASK_FORMAT", "MASK_PERSIST", "RESULT_CACHE_SIZE",
+)
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process so far (MB)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def summarize(latencies_ms: list[float], errors: int = 0) -> dict:
+    arr = np.asarray(latencies_ms, dtype=np.float64)
+    if arr.size == 0:
+        return {"n": 0, "errors": errors}
+    total_s = float(arr.sum()) / 1000.0
+    return {
+        "n": int(arr.size),
+        "errors": errors,
+        "mean_ms": round(float(arr.mean()), 3),
+        "min_ms": round(float(arr.min()), 3),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "max_ms": round(float(arr.max()), 3),
+        "throughput_per_s": round(arr.size / total_s, 2) if total_s > 0 else None,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def environment(model_versions: dict | None = None) -> dict:
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": _git_commit(),
+        "env": {k: os.environ[k] for k in ENV_KEYS if k in os.environ},
+        "model_versions": model_versions or {},
+    }
+
+
+def write_report(path: str, report: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {path}")
+
+
+def load_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_results(results: dict) -> None:
+    print(f"{'case':<10} {'category':<10} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>8} {'RSS MB':>8}")
+    for case, entry in results.items():
+        for cat, s in entry["categories"].items():
+            if not s.get("n"):
+                print(f"{case:<10} {cat:<10} {0:>4} {'-':>9} {'-':>9} {'-':>9} {'-':>8} {'-':>8}  errors={s.get('errors', 0)}")
+                continue
+            print(
+                f"{case:<10} {cat:<10} {s['n']:>4} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} "
+                f"{s['throughput_per_s'] or 0:>8.1f} {entry.get('peak_rss_mb') or 0:>8.0f}"
+                + (f"  errors={s['errors']}" if s.get("errors") else "")
+            )
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10, min_delta_ms: float = 1.0) -> list[dict]:
+    """p50 / p95 of every (case, category) present in both reports.
+
+    A row regresses when it is slower than the baseline by more than `threshold` (relative)
+    AND by more than `min_delta_ms` (so sub-millisecond noise is ignored). Prints a table and
+    returns the regressions.
+    """
+    base_env, cur_env = baseline.get("environment", {}), current.get("environment", {})
+    for key in ("platform", "cpu_count", "env", "model_versions"):
+        if base_env.get(key) != cur_env.get(key):
+            print(f"note: {key} differs from the baseline: {base_env.get(key)} -> {cur_env.get(key)}")
+
+    regressions = []
+    print(f"{'case':<10} {'category':<10} {'metric':<6} {'baseline':>10} {'current':>10} {'change':>8}")
+    for case, entry in current.get("results", {}).items():
+        base_entry = baseline.get("results", {}).get(case)
+        if base_entry is None:
+            continue
+        for cat, s in entry["categories"].items():
+            b = base_entry["categories"].get(cat)
+            if not b or not b.get("n") or not s.get("n"):
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                old, new = b[metric], s[metric]
+                change = (new - old) / old if old else 0.0
+                bad = change > threshold and (new - old) > min_delta_ms
+                print(
+                    f"{case:<10} {cat:<10} {metric[:3]:<6} {old:>10.2f} {new:>10.2f} {change:>+7.1%}"
+                    + ("  REGRESSION" if bad else "")
+                )
+                if bad:
+                    regressions.append({
+                        "case": case, "category": cat, "metric": metric,
+                        "baseline": old, "current": new, "change": round(change, 4),
+                    })
+    print(f"{len(regressions)} regression(s) (threshold {threshold:.0%}, min {min_delta_ms} ms)")
+    return regressions
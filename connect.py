@@ -6,6 +6,11 @@ import psycopg2
 
 
 def get_connection():
+    # DB_BACKEND=sqlite: SQLite cục bộ (local_db.py) thay cho PostgreSQL, cho load test / máy không có PostgreSQL
+    if os.environ.get("DB_BACKEND", "postgres") == "sqlite":
+        from local_db import connect as connect_sqlite
+        return connect_sqlite(os.environ.get("SQLITE_PATH", "local.db"))
+
     host = os.environ.get("PGHOST", "localhost")
     database = os.environ.get("PGDATABASE", "khoaluantn")
     user = os.environ.get("PGUSER", "postgres")
@@ -3,11 +3,25 @@
 
 from flask import Blueprint, render_template, session, redirect, url_for, flash, jsonify, request
 from connect import get_connection
+from mask_codec import load_masks
 from models import PredictionHistory
 
 history_bp = Blueprint("history", __name__)
 
 
+def _attach_masks(predictions):
+    """Thêm mask đã lưu (MASK_PERSIST=1, <ảnh>_masks.json) vào dữ liệu overlay của từng bản ghi"""
+    for p in predictions:
+        overlay = p.get('detections')
+        if not overlay:
+            continue
+        saved = load_masks(p['image_path'])
+        if saved and saved.get('masks'):
+            overlay['masks'] = saved['masks']
+            overlay.setdefault('size', [saved.get('width'), saved.get('height')])
+    return predictions
+
+
 @history_bp.route("/")
 def history():
     """Trang lịch sử nhận diện với phân trang"""
@@ -30,7 +44,7 @@ def history():
         
         # Lấy tổng số bản ghi và dữ liệu trang hiện tại
         total_records = PredictionHistory.count_by_user(conn, user_id)
-        predictions = PredictionHistory.get_by_user(conn, user_id, limit=per_page, offset=offset)
+        predictions = _attach_masks(PredictionHistory.get_by_user(conn, user_id, limit=per_page, offset=offset))
         
         # Tính tổng số trang
         import math
@@ -62,7 +76,7 @@ def api_recent():
             return jsonify({"error": "Not authenticated"}), 401
         user_id = int(user_id_any)
         limit = int(request.args.get('limit', 10))
-        predictions = PredictionHistory.get_by_user(conn, user_id, limit=limit)
+        predictions = _attach_masks(PredictionHistory.get_by_user(conn, user_id, limit=limit))
         conn.close()
         
         # Convert datetime to string
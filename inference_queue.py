@@ -0,0 +1,129 @@
+# inference_queue.py
+# Hàng đợi gom batch (micro-batching) cho các mô hình YOLO dùng chung giữa các request
+
+import threading
+import time
+import queue
+from concurrent.futures import Future
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+
+class BatchScheduler:
+	"""Gom nhiều request suy luận đơn lẻ thành 1 lần gọi batch cho mô hình.
+
+	- Mỗi thread web gọi submit(item) và chờ kết quả của riêng nó.
+	- 1 thread nền lấy item đầu tiên, chờ thêm tối đa `window_ms` hoặc đến khi đủ
+	  `max_batch` item, rồi gọi `run_batch(items)` đúng 1 lần.
+	- `run_batch` phải trả về list kết quả cùng thứ tự với items.
+
+	Nếu window_ms <= 0 hoặc max_batch <= 1 thì submit() gọi thẳng mô hình (không dùng thread).
+	"""
+
+	def __init__(self, name: str, run_batch: Callable[[List[Any]], List[Any]],
+				 window_ms: float = 10.0, max_batch: int = 8):
+		self.name = name
+		self.run_batch = run_batch
+		self.window_ms = float(window_ms)
+		self.max_batch = int(max_batch)
+		self._queue: "queue.Queue[tuple[Any, Future]]" = queue.Queue()
+		self._thread: threading.Thread | None = None
+		self._lock = threading.Lock()
+		self._stats_lock = threading.Lock()
+		self._batch_sizes: Counter = Counter()
+		self._queue_depths: Counter = Counter()
+		self._items_total = 0
+		self._batches_total = 0
+		self._errors_total = 0
+
+	@property
+	def enabled(self) -> bool:
+		return self.window_ms > 0 and self.max_batch > 1
+
+	def submit(self, item: Any, timeout: float | None = None) -> Any:
+		"""Gửi 1 item và chờ kết quả (ném lại exception nếu mô hình lỗi)."""
+		if not self.enabled:
+			self._record(1, 0)
+			return self.run_batch([item])[0]
+		self._ensure_worker()
+		fut: Future = Future()
+		self._queue.put((item, fut))
+		return fut.result(timeout=timeout)
+
+	def submit_many(self, items: List[Any], timeout: float | None = None) -> List[Any]:
+		"""Gửi nhiều item của cùng 1 request (vd. các crop chó) và chờ đủ kết quả.
+
+		Các item vào hàng đợi liền nhau nên thường nằm chung 1 batch (trừ khi vượt max_batch).
+		"""
+		if not items:
+			return []
+		if not self.enabled:
+			self._record(len(items), 0)
+			return self.run_batch(list(items))
+		self._ensure_worker()
+		futs: List[Future] = []
+		for item in items:
+			fut: Future = Future()
+			self._queue.put((item, fut))
+			futs.append(fut)
+		return [f.result(timeout=timeout) for f in futs]
+
+	def _ensure_worker(self) -> None:
+		if self._thread is not None and self._thread.is_alive():
+			return
+		with self._lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(target=self._loop, name=f"batch-{self.name}", daemon=True)
+				self._thread.start()
+
+	def _loop(self) -> None:
+		while True:
+			first = self._queue.get()
+			batch = [first]
+			deadline = time.monotonic() + self.window_ms / 1000.0
+			while len(batch) < self.max_batch:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					break
+				try:
+					batch.append(self._queue.get(timeout=remaining))
+				except queue.Empty:
+					break
+			self._record(len(batch), self._queue.qsize())
+			items = [it for it, _ in batch]
+			try:
+				results = self.run_batch(items)
+				if len(results) != len(items):
+					raise RuntimeError(f"{self.name}: batch trả về {len(results)} kết quả cho {len(items)} ảnh")
+			except Exception as e:
+				with self._stats_lock:
+					self._errors_total += 1
+				for _, fut in batch:
+					fut.set_exception(e)
+				continue
+			for (_, fut), res in zip(batch, results):
+				fut.set_result(res)
+
+	def _record(self, batch_size: int, depth_after: int) -> None:
+		with self._stats_lock:
+			self._batch_sizes[batch_size] += 1
+			self._queue_depths[depth_after] += 1
+			self._items_total += batch_size
+			self._batches_total += 1
+
+	def stats(self) -> Dict[str, Any]:
+		"""Thống kê để tinh chỉnh window: độ sâu hàng đợi + histogram kích thước batch."""
+		with self._stats_lock:
+			return {
+				"name": self.name,
+				"enabled": self.enabled,
+				"window_ms": self.window_ms,
+				"max_batch": self.max_batch,
+				"queue_depth": self._queue.qsize(),
+				"items_total": self._items_total,
+				"batches_total": self._batches_total,
+				"errors_total": self._errors_total,
+				"avg_batch_size": (self._items_total / self._batches_total) if self._batches_total else 0.0,
+				"batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+				"queue_depth_histogram": dict(sorted(self._queue_depths.items())),
+			}
@@ -0,0 +1,107 @@
+# jobs.py
+# Chạy nhận diện bất đồng bộ: request upload trả job id ngay, suy luận chạy trên executor nền
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class JobManager:
+	"""Quản lý job suy luận chạy nền với số worker và độ dài hàng chờ giới hạn.
+
+	- Tách năng lực phục vụ request (thread waitress) khỏi năng lực suy luận:
+	  thread web chỉ nhận file rồi trả job id, worker nền mới chạy YOLO/SVM.
+	- Khi số job chưa xong vượt `max_pending`, submit() trả None để route báo "quá tải"
+	  thay vì xếp hàng vô hạn.
+	- Job đã xong được giữ `ttl_seconds` để client poll kết quả, sau đó bị dọn.
+	"""
+
+	def __init__(self, max_workers: int = 2, max_pending: int = 32, ttl_seconds: float = 3600.0):
+		self.max_workers = int(max_workers)
+		self.max_pending = int(max_pending)
+		self.ttl_seconds = float(ttl_seconds)
+		self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="predict-job")
+		self._jobs: Dict[str, Dict[str, Any]] = {}
+		self._lock = threading.Lock()
+		self._pending = 0
+
+	def submit(self, owner_id: int, fn: Callable[..., Any], *args, **kwargs) -> Optional[str]:
+		"""Đưa job vào hàng chờ. Trả về job id, hoặc None nếu hàng chờ đã đầy."""
+		self._prune()
+		with self._lock:
+			if self._pending >= self.max_pending:
+				return None
+			self._pending += 1
+			job_id = uuid.uuid4().hex
+			self._jobs[job_id] = {
+				"id": job_id,
+				"owner_id": owner_id,
+				"status": "queued",
+				"result": None,
+				"error": None,
+				"created_at": time.time(),
+				"started_at": None,
+				"finished_at": None,
+			}
+		self._executor.submit(self._run, job_id, fn, args, kwargs)
+		return job_id
+
+	def _run(self, job_id: str, fn: Callable[..., Any], args, kwargs) -> None:
+		self._update(job_id, status="running", started_at=time.time())
+		try:
+			result = fn(*args, **kwargs)
+			self._update(job_id, status="done", result=result, finished_at=time.time())
+		except Exception as e:
+			print(f"[JOBS] job {job_id} error: {e}")
+			self._update(job_id, status="error", error=str(e), finished_at=time.time())
+		finally:
+			with self._lock:
+				self._pending -= 1
+
+	def _update(self, job_id: str, **fields) -> None:
+		with self._lock:
+			job = self._jobs.get(job_id)
+			if job is not None:
+				job.update(fields)
+
+	def get(self, job_id: str, owner_id: int | None = None) -> Optional[Dict[str, Any]]:
+		"""Lấy bản sao trạng thái job; None nếu không có hoặc không thuộc owner_id."""
+		with self._lock:
+			job = self._jobs.get(job_id)
+			if job is None:
+				return None
+			if owner_id is not None and job["owner_id"] != owner_id:
+				return None
+			return dict(job)
+
+	def _prune(self) -> None:
+		cutoff = time.time() - self.ttl_seconds
+		with self._lock:
+			expired = [
+				jid for jid, j in self._jobs.items()
+				if j["finished_at"] is not None and j["finished_at"] < cutoff
+			]
+			for jid in expired:
+				del self._jobs[jid]
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			by_status: Dict[str, int] = {}
+			for j in self._jobs.values():
+				by_status[j["status"]] = by_status.get(j["status"], 0) + 1
+			return {
+				"max_workers": self.max_workers,
+				"max_pending": self.max_pending,
+				"pending": self._pending,
+				"jobs": by_status,
+			}
+
+
+job_manager = JobManager(
+	max_workers=int(os.environ.get("PREDICT_JOB_WORKERS", "2")),
+	max_pending=int(os.environ.get("PREDICT_JOB_MAX_PENDING", "32")),
+	ttl_seconds=float(os.environ.get("PREDICT_JOB_TTL", "3600")),
+)
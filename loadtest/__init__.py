@@ -0,0 +1,17 @@
+"""
+Offline load test for the web tier: no PostgreSQL and no model weights needed.
+
+Usage (from the repository root):
+  python -m loadtest [--users 16] [--duration 30] [--mix login=1,upload=3,history=3,statistics=2]
+                     [--det-ms 40 --seg-ms 60 --breed-ms 25 --hog-ms 15] [--json load.json]
+
+The app starts in-process with stand-ins:
+  - DB_BACKEND=sqlite: connect.get_connection() returns a local SQLite database
+    (local_db.py) created from schema.sql in a temporary directory.
+  - Deterministic fake YOLO (detect / segment / breed) and ImagePredictor objects
+    (loadtest/fakes.py) with a fixed latency per call, swapped into upload.py's models.
+Each virtual user logs in with its own cookie jar and then loops over the weighted mix.
+The report gives throughput, latency percentiles and error rates per operation. It also
+shows where server time went: inference stages (the fakes' latency) versus DB queries,
+templates and sessions.
+"""
@@ -0,0 +1,252 @@
+"""
+Command line for the offline load test; see loadtest/__init__.py for usage.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OPERATIONS = ("login", "upload", "history", "statistics")
+LOADTEST_UPLOAD_DIR = os.path.join("static", "uploads", ".loadtest")
+PASSWORD = "loadtest-123"
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise SystemExit("--mix needs at least one operation with a positive weight")
+    return mix
+
+
+def seed_users(n: int, plan: str) -> list[str]:
+    from werkzeug.security import generate_password_hash
+    from connect import get_connection
+    from models import UserQuota
+
+    pwd_hash = generate_password_hash(PASSWORD)
+    names = [f"loadtest_{i}" for i in range(n)]
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            for name in names:
+                cur.execute(
+                    "INSERT INTO users (username, password_hash, email, fullname) VALUES (%s, %s, %s, %s) RETURNING id",
+                    (name, pwd_hash, f"{name}@example.com", name),
+                )
+                user_id = cur.fetchone()[0]
+                UserQuota.set_plan(conn, user_id, plan)
+        conn.commit()
+    finally:
+        conn.close()
+    return names
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, app, index: int, username: str, images: list[tuple[str, bytes]], mix: dict[str, float],
+                 deadline: float, seed: int, record):
+        super().__init__(name=f"vu-{index}", daemon=True)
+        self.client = app.test_client()
+        self.username = username
+        self.images = images
+        self.ops = list(mix)
+        self.weights = [mix[o] for o in self.ops]
+        self.deadline = deadline
+        self.rng = random.Random(seed + index)
+        self.record = record
+
+    def login(self) -> tuple[bool, int]:
+        self.client.get("/logout/")
+        r = self.client.post("/login/", data={"username": self.username, "password": PASSWORD})
+        return r.status_code == 302 and "/dashboard" in (r.headers.get("Location") or ""), r.status_code
+
+    def upload(self) -> tuple[bool, int]:
+        import io
+        name, data = self.rng.choice(self.images)
+        r = self.client.post(
+            "/predict/upload", data={"image": (io.BytesIO(data), name)}, content_type="multipart/form-data"
+        )
+        return r.status_code == 200, r.status_code
+
+    def history(self) -> tuple[bool, int]:
+        r = self.client.get("/history/")
+        return r.status_code == 200, r.status_code
+
+    def statistics(self) -> tuple[bool, int]:
+        r = self.client.get("/statistics/")
+        return r.status_code == 200, r.status_code
+
+    def run(self) -> None:
+        ok, _ = self.login()
+        if not ok:
+            self.record("setup_login", 0.0, False, 0)
+            return
+        while time.perf_counter() < self.deadline:
+            op = self.rng.choices(self.ops, self.weights)[0]
+            t0 = time.perf_counter()
+            try:
+                ok, status = getattr(self, op)()
+            except Exception as e:
+                print(f"[LOADTEST] {op}: {e}")
+                ok, status = False, 0
+            self.record(op, (time.perf_counter() - t0) * 1000.0, ok, status)
+
+
+def _diff(after: dict, before: dict) -> dict:
+    out = {}
+    for key, (count, total) in after.items():
+        c0, t0 = before.get(key, (0, 0.0))
+        if count - c0 > 0:
+            out[key[0] if key else ""] = (count - c0, total - t0)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(prog="python -m loadtest")
+    ap.add_argument("--users", type=int, default=16, help="Concurrent virtual users")
+    ap.add_argument("--duration", type=float, default=30.0, help="Seconds of traffic after login")
+    ap.add_argument("--mix", default="login=1,upload=3,history=3,statistics=2", help="Operation weights")
+    ap.add_argument("--plan", default="pro", help="Plan of the seeded users (free hits the quota pages)")
+    ap.add_argument("--images", default=None, help="Source photos for the upload fixtures (see benchmarks/fixtures.py)")
+    ap.add_argument("--det-ms", type=float, default=40.0, help="Fake detect model latency per batch")
+    ap.add_argument("--seg-ms", type=float, default=60.0, help="Fake segment model latency per batch")
+    ap.add_argument("--breed-ms", type=float, default=25.0, help="Fake breed model latency per batch (<0: no breed model)")
+    ap.add_argument("--hog-ms", type=float, default=15.0, help="Fake HOG+SVM predictor latency")
+    ap.add_argument("--per-image-ms", type=float, default=0.0, help="Extra fake model latency per image in a batch")
+    ap.add_argument("--dog-rate", type=float, default=0.75, help="Share of images the fake detector calls a dog")
+    ap.add_argument("--cache", action="store_true", help="Keep the result cache enabled")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", default=None, help="Write the report to this file")
+    args = ap.parse_args()
+    mix = parse_mix(args.mix)
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    tmp = tempfile.mkdtemp(prefix="dogai-load-")
+    # Stand-ins must be configured before the app is imported
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(tmp, "loadtest.db")
+    os.environ["MODEL_WARMUP"] = "0"
+    os.environ["MODEL_REGISTRY_POLL"] = "0"
+    os.environ.pop("MODEL_SERVER_ADDRESS", None)
+    os.environ.pop("PREDICT_ASYNC", None)
+    if not args.cache:
+        os.environ["RESULT_CACHE_SIZE"] = "0"
+        os.environ["RESULT_CACHE_DIR"] = ""
+
+    import upload
+    from loadtest import fakes
+    from app import app
+    from benchmarks.fixtures import build_fixtures
+    from benchmarks.report import peak_rss_mb, summarize
+    from metrics import DB_SECONDS, STAGE_SECONDS
+    from thumbnails import THUMB_ROOT, THUMB_WIDTHS
+
+    fakes.install(upload, args.det_ms, args.seg_ms, args.breed_ms if args.breed_ms >= 0 else None, args.hog_ms,
+                  args.per_image_ms, args.dog_rate)
+    app.config["UPLOAD_FOLDER"] = LOADTEST_UPLOAD_DIR
+
+    try:
+        usernames = seed_users(args.users, args.plan)
+        fixtures = build_fixtures(os.path.join(tmp, "fixtures"), args.images, per_category=2)
+        images = []
+        for paths in fixtures.values():
+            for p in paths:
+                with open(p, "rb") as f:
+                    images.append((os.path.basename(p), f.read()))
+
+        lock = threading.Lock()
+        samples: dict[str, list[float]] = defaultdict(list)
+        errors: Counter = Counter()
+        statuses: dict[str, Counter] = defaultdict(Counter)
+
+        def record(op: str, ms: float, ok: bool, status: int) -> None:
+            with lock:
+                statuses[op][status] += 1
+                if ok:
+                    samples[op].append(ms)
+                else:
+                    errors[op] += 1
+
+        print(f"{args.users} users, {args.duration:g}s, mix {mix}, fake models det={args.det_ms} seg={args.seg_ms} "
+              f"breed={args.breed_ms} hog={args.hog_ms} ms")
+        stage_before, db_before = STAGE_SECONDS.totals(), DB_SECONDS.totals()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        users = [VirtualUser(app, i, u, images, mix, deadline, args.seed, record) for i, u in enumerate(usernames)]
+        for u in users:
+            u.start()
+        for u in users:
+            u.join()
+        wall = time.perf_counter() - start
+        stages = _diff(STAGE_SECONDS.totals(), stage_before)
+        db = _diff(DB_SECONDS.totals(), db_before)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(LOADTEST_UPLOAD_DIR, ignore_errors=True)
+        for w in THUMB_WIDTHS:
+            shutil.rmtree(os.path.join(THUMB_ROOT, str(w), os.path.basename(LOADTEST_UPLOAD_DIR)), ignore_errors=True)
+
+    total = sum(len(v) for v in samples.values()) + sum(errors.values())
+    operations = {}
+    for op in list(mix) + (["setup_login"] if errors.get("setup_login") else []):
+        s = summarize(samples.get(op, []), errors.get(op, 0))
+        n = s.get("n", 0) + s["errors"]
+        s["error_rate"] = round(s["errors"] / n, 4) if n else 0.0
+        s["rate_per_s"] = round(n / wall, 2) if wall > 0 else None
+        s["statuses"] = {str(k): v for k, v in sorted(statuses[op].items())}
+        operations[op] = s
+
+    report = {
+        "settings": {k: v for k, v in vars(args).items() if k != "json"},
+        "wall_s": round(wall, 2),
+        "requests": total,
+        "throughput_per_s": round(total / wall, 2) if wall > 0 else None,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "operations": operations,
+        "server_stages": {k: {"count": c, "mean_ms": round(t / c * 1000.0, 3), "total_s": round(t, 3)}
+                          for k, (c, t) in sorted(stages.items())},
+        "db_queries": {k: {"count": c, "mean_ms": round(t / c * 1000.0, 3), "total_s": round(t, 3)}
+                       for k, (c, t) in sorted(db.items(), key=lambda kv: -kv[1][1])},
+    }
+
+    print(f"\n{total} requests in {wall:.1f}s: {report['throughput_per_s']} req/s, error rate {report['error_rate']:.2%}")
+    print(f"{'operation':<12} {'n':>6} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for op, s in operations.items():
+        if not s.get("n"):
+            print(f"{op:<12} {0:>6} {s['rate_per_s'] or 0:>7.1f} {'-':>9} {'-':>9} {'-':>9} {'-':>9} {s['errors']:>7}  {s['statuses']}")
+            continue
+        print(f"{op:<12} {s['n']:>6} {s['rate_per_s'] or 0:>7.1f} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} "
+              f"{s['p99_ms']:>9.1f} {s['max_ms']:>9.1f} {s['errors']:>7}"
+              + (f"  {s['statuses']}" if s["errors"] else ""))
+    print("\nServer-side stages (dogai_stage_duration_seconds):")
+    for name, s in report["server_stages"].items():
+        print(f"  {name:<14} {s['count']:>7} x {s['mean_ms']:>8.2f} ms = {s['total_s']:>8.2f} s")
+    print("DB calls in models.py (dogai_db_query_duration_seconds), by total time:")
+    for name, s in list(report["db_queries"].items())[:10]:
+        print(f"  {name:<34} {s['count']:>7} x {s['mean_ms']:>8.2f} ms = {s['total_s']:>8.2f} s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Deterministic stand-ins for the models, with a configurable latency.
+
+FakeYOLO follows the contract of yolo_models.run_yolo: called with a batch of letterboxed
+BGR images, it returns one plain dict per image (names, cls, conf, xyxy, masks). Outputs
+depend only on the pixels, so the same image always gives the same species, box and breed.
+Latency comes from time.sleep, which releases the GIL like torch / onnxruntime do, so
+concurrent requests overlap the same way they would with a real model.
+"""
+from __future__ import annotations
+import time
+import zlib
+
+import numpy as np
+
+COCO_NAMES = {0: "person", 15: "cat", 16: "dog"}
+BREED_NAMES = {0: "beagle", 1: "golden_retriever", 2: "husky", 3: "poodle", 4: "pug", 5: "shiba_inu"}
+
+
+def _digest(img: np.ndarray) -> int:
+    return zlib.crc32(np.ascontiguousarray(img[::8, ::8]).tobytes())
+
+
+class FakeYOLO:
+    """kind: detect | segment | breed. latency_ms per batch call, plus per_image_ms per image."""
+
+    def __init__(self, kind: str, latency_ms: float, per_image_ms: float = 0.0, dog_rate: float = 0.75):
+        self.kind = kind
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self.dog_rate = dog_rate
+        self.names = BREED_NAMES if kind == "breed" else COCO_NAMES
+
+    def __call__(self, images: list[np.ndarray]) -> list[dict]:
+        time.sleep((self.latency_ms + self.per_image_ms * len(images)) / 1000.0)
+        return [self._result(img) for img in images]
+
+    def _result(self, img: np.ndarray) -> dict:
+        h, w = img.shape[:2]
+        d = _digest(img)
+        x1, y1, x2, y2 = 0.2 * w, 0.15 * h, 0.8 * w, 0.9 * h
+        if self.kind == "breed":
+            return {"names": self.names, "cls": [float(d % len(BREED_NAMES))], "conf": [0.6 + (d % 40) / 100.0],
+                    "xyxy": [[x1, y1, x2, y2]], "masks": None}
+        is_dog = (d % 1000) / 1000.0 < self.dog_rate
+        cls = 16.0 if is_dog else 15.0
+        conf = 0.80 + (d % 19) / 100.0
+        masks = None
+        if self.kind == "segment":
+            masks = np.zeros((1, h, w), dtype=np.uint8)
+            masks[0, int(y1):int(y2), int(x1):int(x2)] = 1
+        return {"names": self.names, "cls": [cls], "conf": [conf], "xyxy": [[x1, y1, x2, y2]], "masks": masks}
+
+
+class FakePredictor:
+    """Stand-in for predict.ImagePredictor (HOG + SVM): predict() and dog_margin()."""
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+
+    def predict(self, image) -> dict:
+        time.sleep(self.latency_ms / 1000.0)
+        d = _digest(image.bgr)
+        return {
+            "image_path": image.source or "",
+            "species": "Dog",
+            "breed": BREED_NAMES[d % len(BREED_NAMES)],
+            "parts_info": {},
+            "model_ready": True,
+            "message": "Dự đoán thành công.",
+        }
+
+    def dog_margin(self, frame) -> float:
+        time.sleep(self.latency_ms / 4000.0)
+        return ((_digest(frame.bgr) % 400) - 100) / 100.0
+
+
+def install(upload, det_ms: float, seg_ms: float, breed_ms: float | None, hog_ms: float, per_image_ms: float = 0.0,
+            dog_rate: float = 0.75) -> None:
+    """Swap the fakes into upload.py's LazyModels (and add a breed queue if there is none)."""
+    from inference_queue import BatchScheduler
+    from yolo_models import LazyModel
+
+    upload.model_client = None
+    upload.det_model.replace(FakeYOLO("detect", det_ms, per_image_ms, dog_rate), "fake")
+    upload.seg_model.replace(FakeYOLO("segment", seg_ms, per_image_ms, dog_rate), "fake")
+    if breed_ms is None:
+        upload.breed_model = upload.breed_queue = None
+    else:
+        fake = FakeYOLO("breed", breed_ms, per_image_ms)
+        if upload.breed_model is None:
+            upload.breed_model = LazyModel("breed", lambda: fake, "fake")
+            upload.breed_queue = BatchScheduler(
+                "breed", upload._yolo_batch_runner(upload.breed_model), upload.BATCH_WINDOW_MS, upload.BATCH_MAX_SIZE
+            )
+        upload.breed_model.replace(fake, "fake")
+    upload.predictor.replace(FakePredictor(hog_ms), "fake")
@@ -0,0 +1,147 @@
+# local_db.py
+# SQLite cục bộ thay cho PostgreSQL sau cùng giao diện get_connection() (DB_BACKEND=sqlite).
+#
+# Dùng cho load test / chạy thử trên máy không có PostgreSQL: bảng tạo từ schema.sql, câu SQL của
+# app được dịch những chỗ khác nhau (%s, SERIAL, ::jsonb, NOW(), ANY(%s), public.) rồi chạy trên
+# SQLite. Đủ cho luồng chính (đăng ký / đăng nhập / upload / lịch sử / thống kê / quota); truy vấn
+# chỉ PostgreSQL mới có (percentile_cont, INTERVAL ở trang /users/latency) sẽ ném lỗi như DB lỗi.
+
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+_schema_lock = threading.Lock()
+_initialized = set()
+
+# Kiểu cột khai báo TIMESTAMP / BOOLEAN đọc ra datetime / bool như psycopg2
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("BOOLEAN", lambda b: b not in (b"0", b""))
+
+_REWRITES = [
+	(re.compile(r"\bSERIAL PRIMARY KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+	(re.compile(r"\bpublic\."), ""),
+	(re.compile(r"::(?:jsonb|json|float8|int|text)\b", re.I), ""),
+	(re.compile(r"\bNOW\(\)", re.I), "CURRENT_TIMESTAMP"),
+]
+# SQLite không có ADD COLUMN IF NOT EXISTS; cột đã có sẵn trong schema.sql nên bỏ qua câu này
+_ALTER_ADD_COLUMN = re.compile(r"^\s*ALTER TABLE\s+\S+\s+ADD COLUMN IF NOT EXISTS\b", re.I)
+_ANY_PARAM = re.compile(r"=\s*ANY\(%s\)", re.I)
+
+
+def translate(sql: str, params: Sequence[Any] = ()) -> "tuple[Optional[str], List[Any]]":
+	"""Câu SQL PostgreSQL của app -> (câu SQLite, tham số); (None, []) nếu câu nên bỏ qua."""
+	if _ALTER_ADD_COLUMN.match(sql):
+		return None, []
+	for pattern, repl in _REWRITES:
+		sql = pattern.sub(repl, sql)
+	params = list(params or ())
+	out_params: List[Any] = []
+	parts = []
+	# Thay từng %s bằng ?, mở rộng "= ANY(%s)" (list) thành "IN (?, ?, ...)"
+	pos = 0
+	for m in re.finditer(r"=\s*ANY\(%s\)|%s", sql, re.I):
+		parts.append(sql[pos:m.start()])
+		pos = m.end()
+		value = params.pop(0)
+		if _ANY_PARAM.fullmatch(m.group(0)):
+			values = list(value) or [None]
+			parts.append("IN (" + ", ".join("?" for _ in values) + ")")
+			out_params.extend(values)
+		else:
+			parts.append("?")
+			out_params.append(value)
+	parts.append(sql[pos:])
+	return "".join(parts), out_params
+
+
+class LocalCursor:
+	"""Cursor kiểu psycopg2: context manager, fetchone/fetchall, rowcount; dict khi dùng RealDictCursor."""
+
+	def __init__(self, conn: sqlite3.Connection, as_dict: bool):
+		self._cur = conn.cursor()
+		self._as_dict = as_dict
+		self._rows: List[Any] = []
+		self.rowcount = -1
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+		sql, params = translate(sql, params)
+		if sql is None:
+			self._rows, self.rowcount = [], 0
+			return
+		self._cur.execute(sql, params)
+		# Đọc hết ngay (kể cả RETURNING) để commit() sau đó không vướng câu lệnh đang dở
+		rows = self._cur.fetchall()
+		self.rowcount = self._cur.rowcount
+		if self._as_dict and self._cur.description:
+			names = [d[0] for d in self._cur.description]
+			rows = [dict(zip(names, r)) for r in rows]
+		self._rows = list(rows)
+
+	def fetchone(self):
+		return self._rows.pop(0) if self._rows else None
+
+	def fetchall(self):
+		rows, self._rows = self._rows, []
+		return rows
+
+	def close(self) -> None:
+		self._cur.close()
+
+
+class LocalConnection:
+	def __init__(self, path: str):
+		self._conn = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+		self._conn.execute("PRAGMA foreign_keys = ON")
+
+	def cursor(self, cursor_factory=None) -> LocalCursor:
+		# cursor_factory duy nhất app dùng là RealDictCursor -> trả dict
+		return LocalCursor(self._conn, as_dict=cursor_factory is not None)
+
+	def commit(self) -> None:
+		self._conn.commit()
+
+	def rollback(self) -> None:
+		self._conn.rollback()
+
+	def close(self) -> None:
+		self._conn.close()
+
+
+def _schema_statements(path: str = SCHEMA_FILE) -> List[str]:
+	with open(path, encoding="utf-8") as f:
+		text = "\n".join(line for line in f if not line.lstrip().startswith("--"))
+	return [s.strip() for s in text.split(";") if s.strip()]
+
+
+def init_schema(conn: LocalConnection) -> None:
+	with conn.cursor() as cur:
+		for stmt in _schema_statements():
+			cur.execute(stmt)
+	conn.commit()
+
+
+def connect(path: str) -> LocalConnection:
+	"""Mở SQLite tại `path` (tạo bảng từ schema.sql ở lần đầu của tiến trình)."""
+	if path not in _initialized:
+		with _schema_lock:
+			if path not in _initialized:
+				first = LocalConnection(path)
+				try:
+					first._conn.execute("PRAGMA journal_mode = WAL")
+					init_schema(first)
+				finally:
+					first.close()
+				_initialized.add(path)
+	return LocalConnection(path)
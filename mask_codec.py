@@ -0,0 +1,107 @@
+# mask_codec.py
+# Mã hoá mask phân đoạn YOLO gọn nhẹ (RLE / polygon) theo toạ độ ảnh gốc, dùng cho template + JSON API
+
+import json
+import os
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from utils import ImageFrame
+
+MASK_FORMATS = ("polygon", "rle")
+
+
+def rle_encode(mask: np.ndarray) -> Dict[str, Any]:
+	"""RLE theo thứ tự hàng (row-major): counts xen kẽ số pixel 0 / 1, luôn bắt đầu bằng run 0."""
+	flat = np.asarray(mask, dtype=np.uint8).ravel()
+	if flat.size == 0:
+		return {"size": [int(mask.shape[0]), int(mask.shape[1])], "counts": []}
+	change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+	bounds = np.concatenate(([0], change, [flat.size]))
+	counts = np.diff(bounds).tolist()
+	if flat[0] == 1:
+		counts.insert(0, 0)
+	return {"size": [int(mask.shape[0]), int(mask.shape[1])], "counts": counts}
+
+
+def rle_decode(rle: Dict[str, Any]) -> np.ndarray:
+	h, w = rle["size"]
+	values = np.arange(len(rle["counts"])) % 2
+	flat = np.repeat(values.astype(np.uint8), rle["counts"])
+	return flat.reshape(h, w)
+
+
+def mask_polygons(mask: np.ndarray, epsilon: float = 1.5, min_area: float = 16.0) -> List[np.ndarray]:
+	"""Contour ngoài của mask, đơn giản hoá bằng approxPolyDP (epsilon tính theo pixel của mask)."""
+	contours, _ = cv2.findContours(np.ascontiguousarray(mask, dtype=np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+	polys = []
+	for c in contours:
+		if cv2.contourArea(c) < min_area:
+			continue
+		approx = cv2.approxPolyDP(c, epsilon, True).reshape(-1, 2)
+		if len(approx) >= 3:
+			polys.append(approx.astype(np.float32))
+	return polys
+
+
+def _native_mask(mask: np.ndarray, frame: ImageFrame, size: int) -> np.ndarray:
+	"""Bỏ viền letterbox rồi resize mask (nearest) về đúng kích thước ảnh gốc."""
+	r, (pad_x, pad_y) = frame.letterbox_info(size)
+	nw, nh = int(round(frame.width * r)), int(round(frame.height * r))
+	inner = mask[pad_y:pad_y + nh, pad_x:pad_x + nw]
+	return cv2.resize(inner, (frame.width, frame.height), interpolation=cv2.INTER_NEAREST)
+
+
+def encode_masks(r: Dict[str, Any], frame: ImageFrame, size: int, fmt: str = "polygon") -> List[Dict[str, Any]]:
+	"""Mã hoá mask trong kết quả YOLO thuần (yolo_models.to_plain) theo toạ độ ảnh gốc.
+
+	Mỗi phần tử: {label, conf, bbox, polygons: [[x1, y1, x2, y2, ...], ...]} hoặc {..., rle}.
+	Polygon được tìm trên mask letterbox rồi map toạ độ về ảnh gốc (rẻ); RLE cần resize mask
+	về kích thước gốc nên chính xác từng pixel nhưng tốn hơn.
+	"""
+	masks = r.get("masks")
+	if masks is None:
+		return []
+	r_scale, (pad_x, pad_y) = frame.letterbox_info(size)
+	names = r.get("names") or {}
+	out: List[Dict[str, Any]] = []
+	for i, m in enumerate(masks):
+		item: Dict[str, Any] = {
+			"label": names.get(int(r["cls"][i])) if i < len(r["cls"]) else None,
+			"conf": round(float(r["conf"][i]), 4) if i < len(r["conf"]) else None,
+			"bbox": [round(v, 1) for v in frame.to_original(r["xyxy"][i], size)] if i < len(r["xyxy"]) else None,
+		}
+		if fmt == "rle":
+			item["rle"] = rle_encode(_native_mask(m, frame, size))
+		else:
+			polys = []
+			for poly in mask_polygons(m):
+				xs = np.clip((poly[:, 0] - pad_x) / r_scale, 0, frame.width)
+				ys = np.clip((poly[:, 1] - pad_y) / r_scale, 0, frame.height)
+				polys.append(np.round(np.stack([xs, ys], axis=1), 1).ravel().tolist())
+			item["polygons"] = polys
+		out.append(item)
+	return out
+
+
+def masks_path_for(image_path: str) -> str:
+	base, _ = os.path.splitext(image_path)
+	return f"{base}_masks.json"
+
+
+def save_masks(image_path: str, masks: List[Dict[str, Any]], width: int, height: int) -> str:
+	"""Lưu mask đã mã hoá cạnh ảnh (để hiển thị lại sau, vd. từ lịch sử)."""
+	path = masks_path_for(image_path)
+	with open(path, "w", encoding="utf-8") as f:
+		json.dump({"width": width, "height": height, "masks": masks}, f, separators=(",", ":"))
+	return path
+
+
+def load_masks(image_path: str) -> Dict[str, Any] | None:
+	try:
+		with open(masks_path_for(image_path), "r", encoding="utf-8") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
@@ -0,0 +1,235 @@
+# metrics.py
+# Metrics trong tiến trình (counter / gauge / histogram có label) + endpoint /metrics theo
+# định dạng text của Prometheus (exposition format 0.0.4). Không cần thư viện hay dịch vụ ngoài:
+# Prometheus (nếu có) chỉ việc scrape, không có thì đọc thẳng /metrics bằng trình duyệt / curl.
+#
+# Lưu ý: số liệu nằm trong RAM của từng tiến trình; chạy nhiều worker thì mỗi worker 1 bộ số.
+
+import functools
+import hmac
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Blueprint, Response, abort, request
+
+# Bucket (giây) từ 1ms tới 30s: đủ cho cả truy vấn DB lẫn suy luận YOLO trên CPU
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+	parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+	if extra:
+		parts.append(extra)
+	return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(v: float) -> str:
+	if math.isinf(v):
+		return "+Inf" if v > 0 else "-Inf"
+	if float(v).is_integer():
+		return str(int(v))
+	return repr(float(v))
+
+
+class _Metric:
+	kind = ""
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: "Registry | None" = None):
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self._lock = threading.Lock()
+		(registry or REGISTRY).register(self)
+
+	def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+		if set(labels) != set(self.labelnames):
+			raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+		return tuple(str(labels[n]) for n in self.labelnames)
+
+	def render(self) -> List[str]:
+		return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+	def _samples(self) -> List[str]:
+		raise NotImplementedError
+
+
+class Counter(_Metric):
+	kind = "counter"
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._values: Dict[Tuple[str, ...], float] = {}
+
+	def inc(self, amount: float = 1.0, **labels) -> None:
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0.0) + amount
+
+	def value(self, **labels) -> float:
+		with self._lock:
+			return self._values.get(self._key(labels), 0.0)
+
+	def _samples(self) -> List[str]:
+		with self._lock:
+			items = sorted(self._values.items())
+		return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+	"""Gauge đọc giá trị lúc scrape: set() trực tiếp hoặc set_function() trả về {label tuple: giá trị}."""
+	kind = "gauge"
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._values: Dict[Tuple[str, ...], float] = {}
+		self._fn: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+	def set(self, value: float, **labels) -> None:
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = float(value)
+
+	def set_function(self, fn: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+		self._fn = fn
+
+	def _samples(self) -> List[str]:
+		with self._lock:
+			values = dict(self._values)
+		if self._fn is not None:
+			try:
+				values.update(self._fn())
+			except Exception as e:
+				print(f"[METRICS] gauge {self.name} error: {e}")
+		return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+	kind = "histogram"
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS,
+				 registry: "Registry | None" = None):
+		super().__init__(name, help, labelnames, registry)
+		self.buckets = tuple(sorted(buckets)) + (math.inf,)
+		self._series: Dict[Tuple[str, ...], List[float]] = {}  # [count từng bucket..., sum, count]
+
+	def observe(self, value: float, **labels) -> None:
+		key = self._key(labels)
+		with self._lock:
+			series = self._series.get(key)
+			if series is None:
+				series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+			for i, b in enumerate(self.buckets):
+				if value <= b:
+					series[i] += 1
+					break
+			series[-2] += value
+			series[-1] += 1
+
+	@contextmanager
+	def time(self, **labels):
+		"""Đo thời gian khối `with` (giây), kể cả khi khối ném exception."""
+		t0 = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(time.perf_counter() - t0, **labels)
+
+	def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+		"""{label tuple: (số lần, tổng giây)} để so 2 thời điểm (vd. load test) mà không cần scrape."""
+		with self._lock:
+			return {k: (int(v[-1]), v[-2]) for k, v in self._series.items()}
+
+	def _samples(self) -> List[str]:
+		with self._lock:
+			items = sorted((k, list(v)) for k, v in self._series.items())
+		lines = []
+		for key, series in items:
+			cumulative = 0.0
+			for i, b in enumerate(self.buckets):
+				cumulative += series[i]
+				le = 'le="' + _format_value(b) + '"'
+				lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+			lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+			lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+		return lines
+
+
+class Registry:
+	def __init__(self):
+		self._metrics: Dict[str, _Metric] = {}
+		self._lock = threading.Lock()
+
+	def register(self, metric: _Metric) -> None:
+		with self._lock:
+			if metric.name in self._metrics:
+				raise ValueError(f"metric {metric.name} already registered")
+			self._metrics[metric.name] = metric
+
+	def render(self) -> str:
+		with self._lock:
+			metrics = list(self._metrics.values())
+		return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- Metrics dùng chung ---
+STAGE_SECONDS = Histogram(
+	"dogai_stage_duration_seconds", "Thời gian từng bước xử lý upload (ingest, quota, detect, segment, ...)", ["stage"]
+)
+UPLOAD_SECONDS = Histogram("dogai_upload_duration_seconds", "Tổng thời gian xử lý 1 request upload", ["mode"])
+UPLOADS = Counter("dogai_uploads_total", "Số upload theo kết quả", ["outcome"])
+CACHE_LOOKUPS = Counter("dogai_result_cache_lookups_total", "Tra cache kết quả theo nội dung ảnh", ["result"])
+DOG_GATE = Counter("dogai_dog_gate_total", "Kết quả gate chó (pass / fail / cascade loại sớm)", ["outcome"])
+DB_SECONDS = Histogram("dogai_db_query_duration_seconds", "Thời gian các lời gọi DB trong models.py", ["query"])
+DB_ERRORS = Counter("dogai_db_errors_total", "Lời gọi DB trong models.py ném exception", ["query"])
+QUEUE_DEPTH = Gauge("dogai_inference_queue_depth", "Số ảnh đang chờ trong hàng đợi gom batch", ["model"])
+JOBS_PENDING = Gauge("dogai_jobs_pending", "Số job nhận diện bất đồng bộ đang chờ/chạy")
+
+
+def timed_db(query: str):
+	"""Decorator đo thời gian + đếm lỗi 1 lời gọi DB."""
+	def deco(fn):
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			t0 = time.perf_counter()
+			try:
+				return fn(*args, **kwargs)
+			except Exception:
+				DB_ERRORS.inc(query=query)
+				raise
+			finally:
+				DB_SECONDS.observe(time.perf_counter() - t0, query=query)
+		return wrapper
+	return deco
+
+
+def instrument_db(*classes) -> None:
+	"""Bọc mọi staticmethod public của các model class bằng timed_db("<Class>.<method>")."""
+	for cls in classes:
+		for name, attr in list(vars(cls).items()):
+			if name.startswith("_") or not isinstance(attr, staticmethod):
+				continue
+			setattr(cls, name, staticmethod(timed_db(f"{cls.__name__}.{name}")(attr.__func__)))
+
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+	"""Prometheus scrape endpoint. Đặt METRICS_TOKEN để yêu cầu header Authorization: Bearer <token>."""
+	token = os.environ.get("METRICS_TOKEN")
+	if token:
+		auth = request.headers.get("Authorization", "")
+		if not hmac.compare_digest(auth, f"Bearer {token}"):
+			abort(403)
+	return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
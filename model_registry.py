@@ -0,0 +1,240 @@
+# model_registry.py
+# Registry phiên bản mô hình YOLO: manifest JSON (tên, đường dẫn, hash, metrics, active)
+# + watcher nạp nóng phiên bản mới được kích hoạt mà không cần restart worker.
+#
+# Usage:
+#   python model_registry.py register breed runs/detect/breeds/weights/best.pt --metrics int8_report.json --activate
+#   python model_registry.py activate breed <version>
+#   python model_registry.py list
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from result_cache import sha256_file
+
+MANIFEST_PATH = os.environ.get("MODEL_REGISTRY_PATH", os.path.join("models", "registry.json"))
+_manifest_lock = threading.Lock()
+
+
+def file_version(path: str | None) -> str | None:
+	"""Phiên bản mặc định của 1 file trọng số chưa đăng ký: 12 ký tự đầu SHA-256."""
+	if not path or not os.path.exists(path):
+		return None
+	try:
+		return sha256_file(path)[:12]
+	except OSError:
+		return None
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, Any]:
+	"""Đọc manifest; chưa có file / file hỏng -> manifest rỗng."""
+	try:
+		with open(path, "r", encoding="utf-8") as f:
+			data = json.load(f)
+	except FileNotFoundError:
+		return {"models": []}
+	except (OSError, ValueError) as e:
+		print(f"[REGISTRY] read {path} error: {e}")
+		return {"models": []}
+	if not isinstance(data.get("models"), list):
+		data["models"] = []
+	return data
+
+
+def save_manifest(data: Dict[str, Any], path: str = MANIFEST_PATH) -> None:
+	"""Ghi manifest nguyên tử (file tạm + os.replace) để watcher không đọc phải file dở."""
+	os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+	tmp = f"{path}.{os.getpid()}.tmp"
+	with open(tmp, "w", encoding="utf-8") as f:
+		json.dump(data, f, ensure_ascii=False, indent=2)
+	os.replace(tmp, path)
+
+
+def active_entry(data: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
+	for entry in data["models"]:
+		if entry.get("name") == name and entry.get("active"):
+			return entry
+	return None
+
+
+def register(name: str, path: str, version: str | None = None, metrics: Dict[str, Any] | None = None,
+			 activate: bool = False, manifest_path: str = MANIFEST_PATH) -> Dict[str, Any]:
+	"""Thêm 1 phiên bản vào manifest (hash nội dung để phát hiện file bị ghi đè sau này)."""
+	if not os.path.exists(path):
+		raise FileNotFoundError(path)
+	digest = sha256_file(path)
+	entry = {
+		"name": name,
+		"version": version or digest[:12],
+		"path": path,
+		"sha256": digest,
+		"metrics": metrics or {},
+		"active": False,
+		"created_at": datetime.now().isoformat(timespec="seconds"),
+	}
+	with _manifest_lock:
+		data = load_manifest(manifest_path)
+		if any(e.get("name") == name and e.get("version") == entry["version"] for e in data["models"]):
+			raise ValueError(f"{name} version {entry['version']} already registered")
+		data["models"].append(entry)
+		save_manifest(data, manifest_path)
+	if activate:
+		set_active(name, entry["version"], manifest_path)
+		entry["active"] = True
+	return entry
+
+
+def set_active(name: str, version: str, manifest_path: str = MANIFEST_PATH) -> None:
+	"""Kích hoạt đúng 1 phiên bản cho `name` (các phiên bản khác cùng tên bị tắt)."""
+	with _manifest_lock:
+		data = load_manifest(manifest_path)
+		if not any(e.get("name") == name and e.get("version") == version for e in data["models"]):
+			raise KeyError(f"{name} version {version} not registered")
+		for e in data["models"]:
+			if e.get("name") == name:
+				e["active"] = e.get("version") == version
+		save_manifest(data, manifest_path)
+
+
+def resolve(name: str, default_path: str | None, manifest_path: str = MANIFEST_PATH) -> Tuple[str | None, str | None]:
+	"""(đường dẫn, phiên bản) cho mô hình `name`: ưu tiên bản active trong manifest,
+	không có thì dùng `default_path` (phiên bản = hash file)."""
+	entry = active_entry(load_manifest(manifest_path), name)
+	if entry is not None and os.path.exists(entry.get("path", "")):
+		return entry["path"], entry["version"]
+	return default_path, file_version(default_path)
+
+
+class RegistryWatcher:
+	"""Thread nền theo dõi manifest (theo mtime) và đổi nóng các LazyModel.
+
+	Khi bản active của 1 mô hình đổi: kiểm tra hash -> nạp -> warm-up bằng 1 lần suy luận
+	ảnh xám -> slot.replace(). Nạp/warm-up lỗi thì giữ nguyên bản cũ. Slot chưa từng được
+	nạp (vd. web dùng model server) chỉ được trỏ sang bản mới, nạp khi cần.
+	"""
+
+	def __init__(self, slots: Dict[str, Any], loader: Callable[[str, str], Any], imgsz: Dict[str, int],
+				 poll_seconds: float = 5.0, manifest_path: str = MANIFEST_PATH):
+		# loader(tên, đường dẫn) -> mô hình; imgsz: kích thước ảnh warm-up theo tên mô hình
+		self.slots = slots
+		self.loader = loader
+		self.imgsz = imgsz
+		self.poll_seconds = poll_seconds
+		self.manifest_path = manifest_path
+		self.swaps: List[Dict[str, Any]] = []
+		self._mtime: float | None = None
+		self._thread: threading.Thread | None = None
+
+	def start(self) -> "RegistryWatcher":
+		if self.poll_seconds > 0 and self._thread is None:
+			self._thread = threading.Thread(target=self._loop, name="model-registry", daemon=True)
+			self._thread.start()
+		return self
+
+	def _loop(self) -> None:
+		while True:
+			time.sleep(self.poll_seconds)
+			try:
+				self.check()
+			except Exception as e:
+				print(f"[REGISTRY] watcher error: {e}")
+
+	def check(self) -> None:
+		"""Đọc lại manifest nếu file đã đổi và áp dụng các bản active mới."""
+		try:
+			mtime = os.path.getmtime(self.manifest_path)
+		except OSError:
+			return
+		if mtime == self._mtime:
+			return
+		self._mtime = mtime
+		data = load_manifest(self.manifest_path)
+		for name, slot in self.slots.items():
+			entry = active_entry(data, name)
+			if entry is None or entry.get("version") == slot.version:
+				continue
+			self._apply(slot, entry)
+
+	def _apply(self, slot, entry: Dict[str, Any]) -> None:
+		path, version = entry.get("path"), entry.get("version")
+		try:
+			digest = sha256_file(path)
+		except OSError as e:
+			print(f"[REGISTRY] {slot.name} {version}: cannot read {path}: {e}")
+			return
+		if entry.get("sha256") and digest != entry["sha256"]:
+			print(f"[REGISTRY] {slot.name} {version}: hash mismatch for {path}, skipped")
+			return
+		if not slot.loaded:
+			slot.reset(lambda: self.loader(slot.name, path), version)
+			print(f"[REGISTRY] {slot.name} -> {version} (lazy)")
+			return
+		t0 = time.perf_counter()
+		size = self.imgsz.get(slot.name, 640)
+		try:
+			model = self.loader(slot.name, path)
+			model([np.full((size, size, 3), 114, dtype=np.uint8)])
+		except Exception as e:
+			print(f"[REGISTRY] {slot.name} {version}: load/warm-up error: {e}")
+			return
+		previous = slot.version
+		slot.replace(model, version)
+		self.swaps.append({
+			"name": slot.name,
+			"from": previous,
+			"to": version,
+			"load_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+			"at": datetime.now().isoformat(timespec="seconds"),
+		})
+		print(f"[REGISTRY] {slot.name}: {previous} -> {version}")
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"manifest": self.manifest_path,
+			"poll_seconds": self.poll_seconds,
+			"versions": {name: slot.version for name, slot in self.slots.items()},
+			"swaps": self.swaps[-20:],
+		}
+
+
+def main() -> None:
+	ap = argparse.ArgumentParser(description="Quản lý manifest phiên bản mô hình")
+	ap.add_argument("--manifest", default=MANIFEST_PATH)
+	sub = ap.add_subparsers(dest="cmd", required=True)
+	p_reg = sub.add_parser("register", help="Đăng ký 1 file trọng số")
+	p_reg.add_argument("name", help="detect | segment | breed")
+	p_reg.add_argument("path")
+	p_reg.add_argument("--version", default=None, help="Mặc định: 12 ký tự đầu SHA-256")
+	p_reg.add_argument("--metrics", default=None, help="File JSON metrics (vd. report của quantize_breed_model.py)")
+	p_reg.add_argument("--activate", action="store_true")
+	p_act = sub.add_parser("activate", help="Kích hoạt 1 phiên bản đã đăng ký")
+	p_act.add_argument("name")
+	p_act.add_argument("version")
+	sub.add_parser("list", help="Liệt kê các phiên bản")
+	args = ap.parse_args()
+
+	if args.cmd == "register":
+		metrics = None
+		if args.metrics:
+			with open(args.metrics, "r", encoding="utf-8") as f:
+				metrics = json.load(f)
+		entry = register(args.name, args.path, args.version, metrics, args.activate, args.manifest)
+		print(f"Registered {entry['name']} {entry['version']} ({entry['path']}){' [active]' if entry['active'] else ''}")
+	elif args.cmd == "activate":
+		set_active(args.name, args.version, args.manifest)
+		print(f"Activated {args.name} {args.version}")
+	else:
+		for e in load_manifest(args.manifest)["models"]:
+			mark = "*" if e.get("active") else " "
+			print(f"{mark} {e.get('name'):8} {e.get('version'):14} {e.get('created_at', ''):20} {e.get('path')}")
+
+
+if __name__ == "__main__":
+	main()
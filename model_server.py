@@ -0,0 +1,268 @@
+"""
+model_server.py — Tiến trình suy luận riêng giữ các mô hình YOLO cho mọi web worker
+
+Usage:
+  MODEL_SERVER_AUTHKEY=<bí mật> python model_server.py --address 127.0.0.1:6001 [--imgsz 640]
+
+Web worker đặt MODEL_SERVER_ADDRESS=127.0.0.1:6001 (nhiều server: phân tách bằng dấu phẩy)
+để gửi ảnh đã giải mã qua multiprocessing.shared_memory và nhận kết quả qua socket cục bộ.
+Khi server không chạy, web tự quay về suy luận trong tiến trình. Server và web phải đặt cùng
+MODEL_SERVER_AUTHKEY (bắt buộc): ai có khoá là gửi được dữ liệu pickle tới server.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List
+
+import numpy as np
+
+from model_registry import RegistryWatcher, resolve
+from yolo_models import DET_WEIGHTS, MODEL_IMGSZ, SEG_WEIGHTS, LazyModel, find_breed_weight, load_named, run_yolo
+
+# multiprocessing.connection unpickle mọi thứ nhận được: khoá phải bí mật, không có giá trị mặc định
+AUTHKEY_ENV = "MODEL_SERVER_AUTHKEY"
+
+
+def authkey_from_env() -> bytes | None:
+	key = os.environ.get(AUTHKEY_ENV, "").strip()
+	return key.encode("utf-8") if key else None
+
+
+class ModelServerUnavailable(Exception):
+	"""Không kết nối/không nhận được kết quả từ model server (web sẽ fallback)."""
+
+
+def _parse_address(addr: str):
+	addr = addr.strip()
+	if ":" in addr:
+		host, port = addr.rsplit(":", 1)
+		return (host or "127.0.0.1", int(port))
+	# Không có cổng -> coi là đường dẫn Unix socket
+	return addr
+
+
+# ----------------------------- Server -----------------------------
+
+
+class ModelServer:
+	"""Giữ det/seg/breed model, phục vụ yêu cầu suy luận theo batch.
+
+	Giao thức (pickle qua multiprocessing.connection):
+	  {"op": "ping"} -> {"ok": True, "models": [...], "versions": {tên: phiên bản}}
+	  {"op": "infer", "model": name, "shm": tên shared memory, "shape": [N, H, W, 3], "dtype": "uint8"}
+	    -> {"ok": True, "results": [dict thuần như yolo_models.to_plain + model_version]}
+	       | {"ok": False, "error": str}
+
+	Mô hình được đổi nóng theo model registry giống web worker.
+	"""
+
+	def __init__(self, imgsz: int = 640):
+		self.imgsz = imgsz
+		# breed chạy trên crop từng con chó nên có kích thước riêng (BREED_CROP_IMGSZ)
+		self.sizes = dict(MODEL_IMGSZ, detect=imgsz, segment=imgsz)
+		self.models: Dict[str, LazyModel] = {}
+		self.locks: Dict[str, threading.Lock] = {}
+		self.watcher: RegistryWatcher | None = None
+
+	def load(self) -> None:
+		defaults = {"detect": DET_WEIGHTS, "segment": SEG_WEIGHTS, "breed": find_breed_weight()}
+		for name, default in defaults.items():
+			path, version = resolve(name, default)
+			if not path:
+				continue
+			size = self.sizes[name]
+			slot = LazyModel(name, lambda n=name, p=path, sz=size: load_named(n, p, sz), version)
+			model = slot.get()
+			if model is None:
+				continue
+			# Warm-up trước khi nhận kết nối: request đầu không phải trả chi phí khởi tạo
+			try:
+				model([np.full((size, size, 3), 114, dtype=np.uint8)])
+			except Exception as e:
+				print(f"[MODEL-SERVER] warm-up {name} error: {e}")
+			self.models[name] = slot
+			self.locks[name] = threading.Lock()
+			print(f"[MODEL-SERVER] loaded {name}: {path} ({version})")
+		self.watcher = RegistryWatcher(
+			self.models,
+			loader=lambda name, p: load_named(name, p, self.sizes[name]),
+			imgsz=self.sizes,
+			poll_seconds=float(os.environ.get("MODEL_REGISTRY_POLL", "5")),
+		).start()
+
+	def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+		op = req.get("op")
+		if op == "ping":
+			return {"ok": True, "models": sorted(self.models), "versions": {n: m.version for n, m in self.models.items()}}
+		if op != "infer":
+			return {"ok": False, "error": f"unknown op {op!r}"}
+		name = req.get("model")
+		slot = self.models.get(name)
+		if slot is None:
+			return {"ok": False, "error": f"model {name!r} not loaded"}
+		model, version = slot.get_with_version()
+		shm = shared_memory.SharedMemory(name=req["shm"])
+		try:
+			# Bộ nhớ thuộc về client (client sẽ unlink) -> không để resource_tracker của server dọn
+			resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+			batch = np.ndarray(tuple(req["shape"]), dtype=np.dtype(req["dtype"]), buffer=shm.buf)
+			images = [batch[i] for i in range(batch.shape[0])]
+			# ultralytics không an toàn đa luồng: mỗi mô hình chỉ chạy 1 batch tại 1 thời điểm
+			with self.locks[name]:
+				results = run_yolo(model, images)
+			for r in results:
+				r["model_version"] = version
+			del images, batch
+			return {"ok": True, "results": results}
+		finally:
+			shm.close()
+
+	def _serve_conn(self, conn: Connection) -> None:
+		try:
+			while True:
+				try:
+					req = conn.recv()
+				except (EOFError, OSError):
+					break
+				try:
+					resp = self.handle(req)
+				except Exception as e:
+					resp = {"ok": False, "error": str(e)}
+				conn.send(resp)
+		finally:
+			conn.close()
+
+	def serve_forever(self, address, authkey: bytes) -> None:
+		with Listener(address, authkey=authkey) as listener:
+			print(f"[MODEL-SERVER] listening on {address}")
+			while True:
+				try:
+					conn = listener.accept()
+				except Exception as e:
+					print(f"[MODEL-SERVER] accept error: {e}")
+					continue
+				threading.Thread(target=self._serve_conn, args=(conn,), daemon=True).start()
+
+
+# ----------------------------- Client -----------------------------
+
+
+class ModelServerClient:
+	"""Client phía web worker: gửi batch ảnh qua shared memory, luân phiên giữa các server.
+
+	Mỗi thread giữ kết nối riêng. Khi 1 server lỗi, nó bị bỏ qua `retry_seconds` giây
+	để request sau không phải chờ timeout; hết server khả dụng -> ModelServerUnavailable.
+	"""
+
+	def __init__(self, addresses: List[str], authkey: bytes, timeout: float = 30.0, retry_seconds: float = 15.0):
+		self.addresses = [a for a in (x.strip() for x in addresses) if a]
+		self.authkey = authkey
+		self.timeout = timeout
+		self.retry_seconds = retry_seconds
+		self._rr = itertools.cycle(range(len(self.addresses))) if self.addresses else None
+		self._rr_lock = threading.Lock()
+		self._down_until: Dict[str, float] = {}
+		self._local = threading.local()
+
+	@classmethod
+	def from_env(cls) -> "ModelServerClient | None":
+		raw = os.environ.get("MODEL_SERVER_ADDRESS", "").strip()
+		if not raw:
+			return None
+		authkey = authkey_from_env()
+		if authkey is None:
+			print(f"[MODEL-CLIENT] MODEL_SERVER_ADDRESS is set but {AUTHKEY_ENV} is not; using in-process inference")
+			return None
+		timeout = float(os.environ.get("MODEL_SERVER_TIMEOUT", "30"))
+		return cls(raw.split(","), authkey, timeout=timeout)
+
+	def _conns(self) -> Dict[str, Connection]:
+		conns = getattr(self._local, "conns", None)
+		if conns is None:
+			conns = {}
+			self._local.conns = conns
+		return conns
+
+	def _connection(self, addr: str) -> Connection:
+		conns = self._conns()
+		conn = conns.get(addr)
+		if conn is None:
+			conn = Client(_parse_address(addr), authkey=self.authkey)
+			conns[addr] = conn
+		return conn
+
+	def _drop(self, addr: str) -> None:
+		conn = self._conns().pop(addr, None)
+		if conn is not None:
+			try:
+				conn.close()
+			except Exception:
+				pass
+		self._down_until[addr] = time.monotonic() + self.retry_seconds
+
+	def _candidates(self) -> List[str]:
+		if self._rr is None:
+			return []
+		with self._rr_lock:
+			start = next(self._rr)
+		now = time.monotonic()
+		ordered = [self.addresses[(start + i) % len(self.addresses)] for i in range(len(self.addresses))]
+		return [a for a in ordered if self._down_until.get(a, 0.0) <= now]
+
+	def _request(self, addr: str, req: Dict[str, Any]) -> Dict[str, Any]:
+		conn = self._connection(addr)
+		conn.send(req)
+		if not conn.poll(self.timeout):
+			raise TimeoutError(f"model server {addr} timeout")
+		return conn.recv()
+
+	def infer(self, model: str, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+		"""Suy luận 1 batch ảnh cùng kích thước trên model server."""
+		candidates = self._candidates()
+		if not candidates:
+			raise ModelServerUnavailable("no model server available")
+		batch = np.ascontiguousarray(np.stack(images))
+		shm = shared_memory.SharedMemory(create=True, size=max(batch.nbytes, 1))
+		try:
+			np.ndarray(batch.shape, dtype=batch.dtype, buffer=shm.buf)[:] = batch
+			req = {"op": "infer", "model": model, "shm": shm.name, "shape": list(batch.shape), "dtype": str(batch.dtype)}
+			for addr in candidates:
+				try:
+					resp = self._request(addr, req)
+				except Exception as e:
+					print(f"[MODEL-CLIENT] {addr} error: {e}")
+					self._drop(addr)
+					continue
+				if not resp.get("ok"):
+					# Server sống nhưng không phục vụ được (vd. thiếu model) -> để web tự chạy
+					raise ModelServerUnavailable(resp.get("error") or "model server error")
+				return resp["results"]
+			raise ModelServerUnavailable("all model servers failed")
+		finally:
+			shm.close()
+			shm.unlink()
+
+
+def main() -> None:
+	ap = argparse.ArgumentParser(description="Standalone YOLO inference server")
+	ap.add_argument("--address", default=os.environ.get("MODEL_SERVER_ADDRESS", "127.0.0.1:6001").split(",")[0],
+					help="host:port hoặc đường dẫn Unix socket")
+	ap.add_argument("--imgsz", type=int, default=640)
+	args = ap.parse_args()
+
+	authkey = authkey_from_env()
+	if authkey is None:
+		raise SystemExit(f"{AUTHKEY_ENV} is required (shared secret between web workers and the model server)")
+	server = ModelServer(imgsz=args.imgsz)
+	server.load()
+	server.serve_forever(_parse_address(args.address), authkey)
+
+
+if __name__ == "__main__":
+	main()
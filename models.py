@@ -5,19 +5,24 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 import json
 
+from metrics import instrument_db
+
 
 class PredictionHistory:
     """Model để lưu lịch sử nhận diện giống chó"""
     
     def __init__(self, id: Optional[int] = None, user_id: Optional[int] = None, 
                  image_path: str = "", breed: str = "", confidence: float = 0.0,
-                 species: str = "", created_at: Optional[datetime] = None):
+                 species: str = "", created_at: Optional[datetime] = None,
+                 model_version: Optional[str] = None, detections: Optional[Dict[str, Any]] = None):
         self.id = id
         self.user_id = user_id
         self.image_path = image_path
         self.breed = breed
         self.confidence = confidence
         self.species = species
+        self.model_version = model_version
+        self.detections = detections
         self.created_at = created_at or datetime.now()
     
     @staticmethod
@@ -32,23 +37,35 @@ class PredictionHistory:
                     breed VARCHAR(200),
                     confidence FLOAT,
                     species VARCHAR(50),
+                    model_version VARCHAR(64),
+                    detections TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
                 )
             """)
+            # Bảng tạo từ trước khi có model registry
+            cur.execute("ALTER TABLE prediction_history ADD COLUMN IF NOT EXISTS model_version VARCHAR(64)")
+            cur.execute("ALTER TABLE prediction_history ADD COLUMN IF NOT EXISTS detections TEXT")
+            # Đếm tham chiếu ảnh (kho ảnh theo nội dung, upload_store.py)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_prediction_history_image_path ON prediction_history (image_path)")
             conn.commit()
     
     @staticmethod
     def save(conn, user_id: int, image_path: str, breed: str, 
-             confidence: float, species: str = "Dog"):
-        """Lưu một lần nhận diện vào database"""
+             confidence: float, species: str = "Dog", model_version: Optional[str] = None,
+             detections: Optional[Dict[str, Any]] = None):
+        """Lưu một lần nhận diện vào database (kèm phiên bản mô hình đã cho ra kết quả).
+
+        detections: {"size": [w, h], "boxes": [...]} để vẽ lại overlay trên ảnh gốc.
+        """
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO prediction_history 
-                (user_id, image_path, breed, confidence, species)
-                VALUES (%s, %s, %s, %s, %s)
+                (user_id, image_path, breed, confidence, species, model_version, detections)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 RETURNING id
-            """, (user_id, image_path, breed, confidence, species))
+            """, (user_id, image_path, breed, confidence, species, model_version,
+                  json.dumps(detections) if detections else None))
             conn.commit()
             return cur.fetchone()[0]
     
@@ -57,7 +74,7 @@ class PredictionHistory:
         """Lấy lịch sử nhận diện của user với phân trang"""
         with conn.cursor() as cur:
             cur.execute("""
-                SELECT id, image_path, breed, confidence, species, created_at
+                SELECT id, image_path, breed, confidence, species, created_at, model_version, detections
                 FROM prediction_history
                 WHERE user_id = %s
                 ORDER BY created_at DESC
@@ -70,9 +87,43 @@ class PredictionHistory:
                 'breed': row[2],
                 'confidence': row[3],
                 'species': row[4],
-                'created_at': row[5]
+                'created_at': row[5],
+                'model_version': row[6],
+                'detections': PredictionHistory._load_detections(row[7])
             } for row in rows]
+
+    @staticmethod
+    def _load_detections(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
     
+    @staticmethod
+    def reference_counts(conn, image_paths: List[str]) -> Dict[str, int]:
+        """Số bản ghi lịch sử (mọi user) trỏ tới từng ảnh; ảnh không có bản ghi -> không có trong dict"""
+        if not image_paths:
+            return {}
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT image_path, COUNT(*) FROM prediction_history
+                WHERE image_path = ANY(%s)
+                GROUP BY image_path
+            """, (list(image_paths),))
+            return {row[0]: int(row[1]) for row in cur.fetchall()}
+
+    @staticmethod
+    def relink_image(conn, old_path: str, new_path: str) -> int:
+        """Đổi đường dẫn ảnh trong lịch sử (khi chuyển ảnh sang kho theo nội dung)"""
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE prediction_history SET image_path = %s WHERE image_path = %s
+            """, (new_path, old_path))
+            conn.commit()
+            return cur.rowcount
+
     @staticmethod
     def count_by_user(conn, user_id: int) -> int:
         """Đếm tổng số bản ghi lịch sử của user"""
@@ -324,12 +375,135 @@ class UserQuota:
             conn.commit()
 
 
+class PredictionTimings:
+    """Thời gian từng stage của mỗi lần nhận diện (1 dòng gọn / request) để theo dõi độ trễ.
+
+    stage_ms: {"ingest": 3.1, "detect": 41.7, ..., "total": 95.2} (ms, chỉ các stage đã chạy).
+    model_versions: {"detect": "v3", "segment": "v1", "breed": "v2"} lúc xử lý, để so trước/sau khi đổi mô hình.
+    """
+
+    @staticmethod
+    def create_table(conn):
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS prediction_timings (
+                    id SERIAL PRIMARY KEY,
+                    prediction_id INTEGER NULL,
+                    user_id INTEGER NULL,
+                    stage_ms JSONB NOT NULL,
+                    total_ms REAL NOT NULL,
+                    model_versions VARCHAR(200),
+                    width INTEGER,
+                    height INTEGER,
+                    work_width INTEGER,
+                    work_height INTEGER,
+                    cache_hit BOOLEAN NOT NULL DEFAULT FALSE,
+                    gate VARCHAR(16),
+                    mode VARCHAR(8),
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (prediction_id) REFERENCES prediction_history(id) ON DELETE SET NULL,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_prediction_timings_created_at ON prediction_timings (created_at)")
+            conn.commit()
+
+    @staticmethod
+    def save(conn, user_id: Optional[int], stage_ms: Dict[str, float], total_ms: float,
+             prediction_id: Optional[int] = None, model_versions: Optional[Dict[str, Any]] = None,
+             size: Optional[List[int]] = None, work_size: Optional[List[int]] = None,
+             cache_hit: bool = False, gate: Optional[str] = None, mode: Optional[str] = None) -> int:
+        """Lưu thời gian 1 lần nhận diện. size / work_size: [w, h] ảnh gốc / ảnh đã giải mã để suy luận."""
+        width, height = (size or [None, None])[:2]
+        work_width, work_height = (work_size or [None, None])[:2]
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO prediction_timings
+                (prediction_id, user_id, stage_ms, total_ms, model_versions, width, height,
+                 work_width, work_height, cache_hit, gate, mode)
+                VALUES (%s, %s, %s::jsonb, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (prediction_id, user_id, json.dumps(stage_ms), float(total_ms),
+                  json.dumps(model_versions, sort_keys=True) if model_versions else None,
+                  width, height, work_width, work_height, bool(cache_hit), gate, mode))
+            conn.commit()
+            return cur.fetchone()[0]
+
+    @staticmethod
+    def stage_percentiles(conn, window_seconds: int) -> List[Dict[str, Any]]:
+        """p50/p95/p99 (ms) từng stage trong `window_seconds` gần nhất, tính bằng percentile_cont."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT s.stage, COUNT(*),
+                       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY s.ms::float8),
+                       MAX(s.ms::float8)
+                FROM prediction_timings t
+                CROSS JOIN LATERAL jsonb_each_text(t.stage_ms) AS s(stage, ms)
+                WHERE t.created_at >= CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+                GROUP BY s.stage
+            """, (int(window_seconds),))
+            return [
+                {"stage": r[0], "count": int(r[1]), "p50": r[2][0], "p95": r[2][1], "p99": r[2][2], "max": r[3]}
+                for r in cur.fetchall()
+            ]
+
+    @staticmethod
+    def version_summary(conn, window_seconds: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Tổng thời gian theo bộ phiên bản mô hình: thấy ngay độ trễ đổi thế nào sau khi đổi mô hình."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT model_versions, COUNT(*), MIN(created_at), MAX(created_at),
+                       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY total_ms),
+                       AVG(CASE WHEN cache_hit THEN 1.0 ELSE 0.0 END),
+                       COUNT(*) FILTER (WHERE gate = 'pass'),
+                       COUNT(*) FILTER (WHERE gate = 'fail'),
+                       COUNT(*) FILTER (WHERE gate = 'cascade')
+                FROM prediction_timings
+                WHERE created_at >= CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+                GROUP BY model_versions
+                ORDER BY MAX(created_at) DESC
+                LIMIT %s
+            """, (int(window_seconds), limit))
+            rows = []
+            for r in cur.fetchall():
+                try:
+                    versions = json.loads(r[0]) if r[0] else {}
+                except ValueError:
+                    versions = {}
+                rows.append({
+                    "model_versions": versions,
+                    "count": int(r[1]),
+                    "first_at": r[2],
+                    "last_at": r[3],
+                    "p50": r[4][0],
+                    "p95": r[4][1],
+                    "p99": r[4][2],
+                    "cache_hit_rate": float(r[5] or 0.0),
+                    "gate_pass": int(r[6]),
+                    "gate_fail": int(r[7]),
+                    "gate_cascade": int(r[8]),
+                })
+            return rows
+
+    @staticmethod
+    def prune(conn, keep_days: int) -> int:
+        """Xoá bản ghi cũ hơn keep_days ngày"""
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM prediction_timings
+                WHERE created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+            """, (int(keep_days),))
+            conn.commit()
+            return cur.rowcount
+
+
 def init_database(conn):
     """Khởi tạo tất cả các bảng cần thiết"""
     PredictionHistory.create_table(conn)
     UserSettings.create_table(conn)
     UserQuota.create_table(conn)
     PaymentOrder.create_table(conn)
+    PredictionTimings.create_table(conn)
     print("✅ Database tables initialized successfully!")
 
 
@@ -475,3 +649,7 @@ class PaymentOrder:
             ok = cur.fetchone() is not None
             conn.commit()
             return bool(ok)
+
+
+# Đo thời gian + đếm lỗi mọi lời gọi DB (dogai_db_query_duration_seconds{query="Class.method"} trên /metrics)
+instrument_db(PredictionHistory, UserSettings, UserQuota, PaymentOrder, PredictionTimings)
@@ -11,7 +11,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from joblib import load
 
-from utils import load_image_bgr, extract_hog_features
+from utils import load_image_bgr, extract_hog_features, ImageFrame
 
 
 class ImagePredictor:
@@ -52,9 +52,11 @@ class ImagePredictor:
 			except Exception:
 				self.breed_labels = None
 
-	def predict(self, image_path: str) -> Dict[str, Any]:
+	def predict(self, image: "str | ImageFrame") -> Dict[str, Any]:
 		"""Dự đoán pipeline.
 
+		`image` là đường dẫn ảnh hoặc ImageFrame đã giải mã sẵn (tránh đọc lại file).
+
 		Trả về dict gồm:
 		- image_path: đường dẫn ảnh
 		- species: 'Dog' | 'Cat' | 'Unknown'
@@ -64,8 +66,14 @@ class ImagePredictor:
 		- message: hướng dẫn nếu thiếu model
 		"""
 
-		img = load_image_bgr(image_path)
-		if img is None:
+		if isinstance(image, ImageFrame):
+			frame: ImageFrame | None = image
+			image_path = image.source or ""
+		else:
+			image_path = image
+			img_raw = load_image_bgr(image_path)
+			frame = ImageFrame(img_raw, source=image_path) if img_raw is not None else None
+		if frame is None:
 			return {
 				"image_path": image_path,
 				"species": "Unknown",
@@ -75,7 +83,8 @@ class ImagePredictor:
 				"message": "Không thể đọc ảnh. Vui lòng thử lại với ảnh khác.",
 			}
 
-		feat = extract_hog_features(img)
+		img = frame.bgr
+		feat = extract_hog_features(frame)
 		model_ready = self.species_model is not None and self.breed_model is not None and self.breed_labels is not None
 
 		if not model_ready:
@@ -88,7 +97,7 @@ class ImagePredictor:
 				"image_path": image_path,
 				"species": species_guess,
 				"breed": "Unknown",
-				"parts_info": self._parts_demo(img),
+				"parts_info": self._parts_demo(frame.gray),
 				"model_ready": False,
 				"message": (
 					"Chưa có mô hình huấn luyện. Hãy chạy train.py với dữ liệu Oxford-IIIT Pet để tạo các file trong models/."
@@ -110,19 +119,34 @@ class ImagePredictor:
 			"image_path": image_path,
 			"species": species_pred,
 			"breed": breed_name,
-			"parts_info": self._parts_demo(img),
+			"parts_info": self._parts_demo(frame.gray),
 			"model_ready": model_ready,
 			"message": "Dự đoán thành công." if model_ready else "Chưa có mô hình huấn luyện.",
 		}
 
-	def _parts_demo(self, img: np.ndarray) -> Dict[str, Any]:
+	def dog_margin(self, frame: ImageFrame) -> float | None:
+		"""Khoảng cách có dấu tới siêu phẳng của species SVM: > 0 nghiêng về Dog, < 0 về Cat.
+
+		Rẻ hơn YOLO nhiều lần (HOG 256x256 + 1 SVM) nên dùng làm tầng lọc trước. None nếu
+		chưa có species model hoặc model không phải phân loại nhị phân Dog/Cat.
+		"""
+		model = self.species_model
+		if model is None or not hasattr(model, "decision_function"):
+			return None
+		classes = [str(c) for c in getattr(model, "classes_", [])]
+		if len(classes) != 2 or "Dog" not in classes:
+			return None
+		score = float(np.ravel(model.decision_function([extract_hog_features(frame)]))[0])
+		# decision_function > 0 nghĩa là classes_[1]
+		return score if classes[1] == "Dog" else -score
+
+	def _parts_demo(self, gray: np.ndarray) -> Dict[str, Any]:
 		"""Demo phân tích các phần bằng Canny + contour để minh họa.
 		Đây không phải segmentation chính xác, chỉ mang tính trình diễn.
 		"""
-		gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 		edges = cv2.Canny(gray, 50, 150)
 		contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-		h, w = img.shape[:2]
+		h, w = gray.shape[:2]
 		total_area = h * w
 		areas = [cv2.contourArea(c) for c in contours]
 		large = sum(1 for a in areas if a > 0.01 * total_area)
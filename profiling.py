@@ -0,0 +1,215 @@
+# profiling.py
+# Profile từng request theo yêu cầu (chỉ admin): thêm ?profile=1 (hoặc header X-Profile: 1) vào
+# /predict/upload hay route bất kỳ để chạy request dưới cProfile; profile=mem bật thêm tracemalloc.
+# Kết quả (.prof cho snakeviz / pstats + .txt tóm tắt top N hàm) nằm trong PROFILE_DIR, chỉ giữ
+# PROFILE_KEEP lần gần nhất; xem ở /users/profiles.
+#
+# Bọc ở tầng WSGI: request không có cờ chỉ tốn 1 lần tra environ, không có hook Flask nào chạy thêm.
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict, List, Optional
+
+from flask import Flask
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", "40"))
+# Tên 1 lần profile (không có đuôi) -> chặn đường dẫn lạ khi xem / tải file
+_NAME_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[A-Za-z0-9_.-]+$")
+
+
+def _requested_mode(environ) -> Optional[str]:
+	"""'cpu' / 'mem' nếu request có cờ profile, ngược lại None (đường đi nhanh cho mọi request)."""
+	raw = environ.get("HTTP_X_PROFILE")
+	if raw is None:
+		qs = environ.get("QUERY_STRING", "")
+		if "profile=" not in qs:
+			return None
+		m = re.search(r"(?:^|&)profile=([^&]*)", qs)
+		raw = m.group(1) if m else ""
+	raw = raw.strip().lower()
+	if raw in ("", "0", "false", "off"):
+		return None
+	return "mem" if raw == "mem" else "cpu"
+
+
+def _slug(path: str) -> str:
+	return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+
+
+class ProfilingMiddleware:
+	"""WSGI middleware: request có cờ profile và session là admin thì chạy dưới cProfile rồi lưu kết quả."""
+
+	def __init__(self, app: Flask, wsgi_app, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP,
+				 top: int = PROFILE_TOP):
+		self.app = app
+		self.wsgi_app = wsgi_app
+		self.directory = directory
+		self.keep = keep
+		self.top = top
+		# cProfile / tracemalloc là trạng thái toàn cục của interpreter: mỗi lúc chỉ profile 1 request
+		self._lock = threading.Lock()
+
+	def __call__(self, environ, start_response):
+		mode = _requested_mode(environ)
+		if mode is None:
+			return self.wsgi_app(environ, start_response)
+		user = self._admin_user(environ)
+		if user is None:
+			return self.wsgi_app(environ, start_response)
+		if not self._lock.acquire(blocking=False):
+			print("[PROFILE] another request is being profiled, running without profiler")
+			return self.wsgi_app(environ, start_response)
+		try:
+			return self._profiled(environ, start_response, mode, user)
+		finally:
+			self._lock.release()
+
+	def _admin_user(self, environ) -> Optional[str]:
+		"""Đọc session cookie (không đụng body) để kiểm tra role admin; trả về username hoặc None."""
+		try:
+			sess = self.app.session_interface.open_session(self.app, self.app.request_class(environ))
+		except Exception as e:
+			print(f"[PROFILE] session error: {e}")
+			return None
+		if not sess or sess.get("role") != "admin":
+			return None
+		return str(sess.get("username") or sess.get("user_id") or "admin")
+
+	def _profiled(self, environ, start_response, mode: str, user: str):
+		name = "-".join([
+			time.strftime("%Y%m%d-%H%M%S"),
+			environ.get("REQUEST_METHOD", "GET"),
+			_slug(environ.get("PATH_INFO", "")),
+			uuid.uuid4().hex[:6],
+		])
+		status_holder = {}
+
+		def _start_response(status, headers, exc_info=None):
+			status_holder["status"] = status
+			headers = list(headers) + [("X-Profile-Id", name)]
+			return start_response(status, headers, exc_info)
+
+		tracing = mode == "mem" and not tracemalloc.is_tracing()
+		if tracing:
+			tracemalloc.start(25)
+		profiler = cProfile.Profile()
+		t0 = time.perf_counter()
+		profiler.enable()
+		try:
+			# Body được tạo hết trong lúc profile (response thường đã ở trong bộ nhớ; file thì stream sau)
+			response = self.wsgi_app(environ, _start_response)
+		finally:
+			profiler.disable()
+			elapsed_ms = (time.perf_counter() - t0) * 1000.0
+			snapshot = peak = None
+			if tracing:
+				snapshot = tracemalloc.take_snapshot()
+				peak = tracemalloc.get_traced_memory()[1]
+				tracemalloc.stop()
+			try:
+				self._save(name, profiler, snapshot, peak, {
+					"path": environ.get("PATH_INFO", ""),
+					"query": environ.get("QUERY_STRING", ""),
+					"method": environ.get("REQUEST_METHOD", "GET"),
+					"status": status_holder.get("status", "-"),
+					"ms": f"{elapsed_ms:.1f}",
+					"user": user,
+					"mode": mode,
+				})
+			except Exception as e:
+				print(f"[PROFILE] save error: {e}")
+		return response
+
+	def _save(self, name: str, profiler: cProfile.Profile, snapshot, peak: Optional[int], meta: Dict[str, str]) -> None:
+		os.makedirs(self.directory, exist_ok=True)
+		base = os.path.join(self.directory, name)
+		profiler.dump_stats(base + ".prof")
+
+		out = io.StringIO()
+		for key, value in meta.items():
+			out.write(f"{key}: {value}\n")
+		out.write("\n")
+		for sort in ("cumulative", "tottime"):
+			out.write(f"=== top {self.top} theo {sort} ===\n")
+			pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(self.top)
+		if snapshot is not None:
+			out.write(f"=== tracemalloc: peak {peak / (1024 * 1024):.1f} MB, top {self.top} theo dòng ===\n")
+			snapshot = snapshot.filter_traces([
+				tracemalloc.Filter(False, tracemalloc.__file__),
+				tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+			])
+			for stat in snapshot.statistics("lineno")[: self.top]:
+				out.write(f"{stat}\n")
+		with open(base + ".txt", "w", encoding="utf-8") as f:
+			f.write(out.getvalue())
+		print(f"[PROFILE] {meta['method']} {meta['path']} {meta['ms']} ms -> {base}.prof")
+		self._rotate()
+
+	def _rotate(self) -> None:
+		"""Chỉ giữ `keep` lần profile mới nhất (xoá cả .prof và .txt)."""
+		names = sorted(p["name"] for p in list_profiles(self.directory))
+		for old in names[: max(0, len(names) - self.keep)]:
+			for ext in (".prof", ".txt"):
+				try:
+					os.remove(os.path.join(self.directory, old + ext))
+				except FileNotFoundError:
+					pass
+
+
+def init_profiling(app: Flask) -> None:
+	"""Gắn middleware profile vào app (gọi 1 lần trong app.py). PROFILE_REQUESTS=0 để tắt hẳn."""
+	if os.environ.get("PROFILE_REQUESTS", "1") == "0":
+		return
+	app.wsgi_app = ProfilingMiddleware(app, app.wsgi_app)
+
+
+def _read_meta(path: str) -> Dict[str, str]:
+	meta = {}
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			line = line.rstrip("\n")
+			if not line:
+				break
+			key, _, value = line.partition(": ")
+			meta[key] = value
+	return meta
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> List[Dict[str, Any]]:
+	"""Các lần profile đã lưu, mới nhất trước: name, created, size (bytes .prof) + meta trong .txt."""
+	if not os.path.isdir(directory):
+		return []
+	items = []
+	for fname in os.listdir(directory):
+		if not fname.endswith(".prof"):
+			continue
+		name = fname[: -len(".prof")]
+		if not _NAME_RE.match(name):
+			continue
+		prof = os.path.join(directory, fname)
+		txt = os.path.join(directory, name + ".txt")
+		try:
+			item = {"name": name, "created": os.path.getmtime(prof), "size": os.path.getsize(prof)}
+			item.update(_read_meta(txt) if os.path.exists(txt) else {})
+		except OSError:
+			continue
+		items.append(item)
+	items.sort(key=lambda p: p["name"], reverse=True)
+	return items
+
+
+def profile_path(name: str, ext: str, directory: str = PROFILE_DIR) -> Optional[str]:
+	"""Đường dẫn file .prof / .txt của 1 lần profile, None nếu tên không hợp lệ hoặc không tồn tại."""
+	if ext not in (".prof", ".txt") or not _NAME_RE.match(name or ""):
+		return None
+	path = os.path.join(directory, name + ext)
+	return path if os.path.isfile(path) else None
@@ -0,0 +1,155 @@
+# result_cache.py
+# Cache kết quả nhận diện theo nội dung ảnh (SHA-256) + dấu vân tay của bộ trọng số mô hình
+
+import copy
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+_CHUNK = 1024 * 1024
+
+
+def sha256_file(path: str) -> str:
+	"""SHA-256 của nội dung file (đọc theo chunk, không nạp cả file vào RAM)."""
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(_CHUNK), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+def fingerprint_files(paths: Iterable[Optional[str]], extra: str = "") -> str:
+	"""Dấu vân tay cho 1 bộ trọng số: hash nội dung từng file (bỏ qua file không tồn tại).
+
+	Đổi bất kỳ file trọng số nào (hoặc `extra`, ví dụ ngưỡng gate) sẽ ra fingerprint khác,
+	nên kết quả cache cũ tự động không còn được dùng.
+	"""
+	h = hashlib.sha256()
+	for p in paths:
+		if not p:
+			continue
+		h.update(os.path.basename(p).encode("utf-8"))
+		if os.path.exists(p):
+			try:
+				h.update(sha256_file(p).encode("ascii"))
+			except OSError:
+				h.update(b"unreadable")
+		else:
+			h.update(b"missing")
+	h.update(extra.encode("utf-8"))
+	return h.hexdigest()[:16]
+
+
+class ResultCache:
+	"""Cache 2 tầng cho kết quả pipeline.
+
+	- Tầng RAM: LRU giới hạn số phần tử + TTL.
+	- Tầng đĩa (tuỳ chọn, `disk_dir`): mỗi key 1 file pickle, giữ được qua lần restart;
+	  hit ở đĩa sẽ được nạp lại lên RAM.
+
+	Giá trị trả về từ get() là bản sao, người gọi sửa thoải mái không ảnh hưởng cache.
+	"""
+
+	def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600.0, disk_dir: str | None = None):
+		self.max_entries = int(max_entries)
+		self.ttl_seconds = float(ttl_seconds)
+		self.disk_dir = disk_dir or None
+		self._mem: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+		if self.disk_dir:
+			os.makedirs(self.disk_dir, exist_ok=True)
+
+	@property
+	def enabled(self) -> bool:
+		return self.max_entries > 0 or bool(self.disk_dir)
+
+	@staticmethod
+	def make_key(content_hash: str, model_fingerprint: str) -> str:
+		return f"{content_hash}-{model_fingerprint}"
+
+	def get(self, key: str) -> Optional[Any]:
+		now = time.time()
+		with self._lock:
+			entry = self._mem.get(key)
+			if entry is not None:
+				expires_at, value = entry
+				if expires_at >= now:
+					self._mem.move_to_end(key)
+					self.hits += 1
+					return copy.deepcopy(value)
+				del self._mem[key]
+
+		value = self._disk_get(key, now)
+		with self._lock:
+			if value is None:
+				self.misses += 1
+				return None
+			self.disk_hits += 1
+		self._mem_set(key, value, now)
+		return copy.deepcopy(value)
+
+	def set(self, key: str, value: Any) -> None:
+		now = time.time()
+		self._mem_set(key, copy.deepcopy(value), now)
+		self._disk_set(key, value)
+
+	def _mem_set(self, key: str, value: Any, now: float) -> None:
+		if self.max_entries <= 0:
+			return
+		with self._lock:
+			self._mem[key] = (now + self.ttl_seconds, value)
+			self._mem.move_to_end(key)
+			while len(self._mem) > self.max_entries:
+				self._mem.popitem(last=False)
+
+	def _disk_path(self, key: str) -> str:
+		assert self.disk_dir is not None
+		return os.path.join(self.disk_dir, key[:2], f"{key}.pkl")
+
+	def _disk_get(self, key: str, now: float) -> Optional[Any]:
+		if not self.disk_dir:
+			return None
+		path = self._disk_path(key)
+		try:
+			if now - os.path.getmtime(path) > self.ttl_seconds:
+				os.remove(path)
+				return None
+			with open(path, "rb") as f:
+				return pickle.load(f)
+		except FileNotFoundError:
+			return None
+		except Exception as e:
+			print(f"[CACHE] disk read error {key}: {e}")
+			return None
+
+	def _disk_set(self, key: str, value: Any) -> None:
+		if not self.disk_dir:
+			return
+		path = self._disk_path(key)
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+			with open(tmp, "wb") as f:
+				pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+			os.replace(tmp, path)
+		except Exception as e:
+			print(f"[CACHE] disk write error {key}: {e}")
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"entries": len(self._mem),
+				"max_entries": self.max_entries,
+				"ttl_seconds": self.ttl_seconds,
+				"disk_dir": self.disk_dir,
+				"hits": self.hits,
+				"disk_hits": self.disk_hits,
+				"misses": self.misses,
+			}
@@ -30,6 +30,8 @@ CREATE TABLE IF NOT EXISTS public.prediction_history (
   breed VARCHAR(200),
   confidence FLOAT,
   species VARCHAR(50),
+  model_version VARCHAR(64),
+  detections TEXT,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE
 );
@@ -59,9 +61,36 @@ CREATE TABLE IF NOT EXISTS public.payment_orders (
   FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE
 );
 
+-- Thời gian từng stage của mỗi lần nhận diện (trang /users/latency: p50/p95/p99 theo stage)
+CREATE TABLE IF NOT EXISTS public.prediction_timings (
+  id SERIAL PRIMARY KEY,
+  prediction_id INTEGER NULL,
+  user_id INTEGER NULL,
+  stage_ms JSONB NOT NULL,
+  total_ms REAL NOT NULL,
+  model_versions VARCHAR(200),
+  width INTEGER,
+  height INTEGER,
+  work_width INTEGER,
+  work_height INTEGER,
+  cache_hit BOOLEAN NOT NULL DEFAULT FALSE,
+  gate VARCHAR(16),
+  mode VARCHAR(8),
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (prediction_id) REFERENCES public.prediction_history(id) ON DELETE SET NULL,
+  FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_prediction_timings_created_at ON public.prediction_timings (created_at);
+
 -- Nếu thiếu cột trong users:
 ALTER TABLE public.users ADD COLUMN IF NOT EXISTS role VARCHAR(20) NOT NULL DEFAULT 'user';
 ALTER TABLE public.users ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE;
+-- Phiên bản mô hình (model registry) cho lịch sử nhận diện:
+ALTER TABLE public.prediction_history ADD COLUMN IF NOT EXISTS model_version VARCHAR(64);
+-- Box dog/cat (JSON) để vẽ overlay phía client thay cho ảnh _det:
+ALTER TABLE public.prediction_history ADD COLUMN IF NOT EXISTS detections TEXT;
+-- Đếm tham chiếu ảnh khi xoá lịch sử (ảnh lưu theo nội dung, dùng chung giữa các bản ghi):
+CREATE INDEX IF NOT EXISTS idx_prediction_history_image_path ON public.prediction_history (image_path);
 -- Optional: seed an example admin user (replace the hash with a real one).
 -- The hash below is just a placeholder; generate with Python werkzeug.security.generate_password_hash.
 -- INSERT INTO public.users (username, password_hash) VALUES ('admin', 'pbkdf2:sha256:...');
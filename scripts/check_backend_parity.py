@@ -0,0 +1,72 @@
+"""
+Check that an ONNX Runtime / OpenCV DNN backend gives the same boxes as PyTorch.
+
+Usage:
+  python scripts/check_backend_parity.py --weights yolov8n.pt --images static/uploads --backend onnxruntime
+
+For each image, boxes are matched by class with IoU >= --iou. The script exits with code 1 if
+any image has unmatched boxes or a confidence delta above --max-conf-delta, so it can gate a
+switch of INFER_BACKEND.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import ImageFrame  # noqa: E402
+from yolo_backends import BACKENDS, compare_results, load_backend  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", required=True, help="YOLOv8 .pt weights (ONNX is exported next to it)")
+    ap.add_argument("--images", required=True, help="Directory of sample images")
+    ap.add_argument("--backend", default="onnxruntime", choices=[b for b in BACKENDS if b != "torch"])
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--iou", type=float, default=0.9, help="IoU to count two boxes as the same")
+    ap.add_argument("--max-conf-delta", type=float, default=0.05)
+    ap.add_argument("--limit", type=int, default=50, help="Max number of images to check")
+    args = ap.parse_args()
+
+    paths = sorted(
+        os.path.join(d, f)
+        for d, _, files in os.walk(args.images)  # uploads are sharded: static/uploads/ab/cd/<sha>.jpg
+        for f in files
+        if f.lower().endswith(IMAGE_EXTS)
+    )[: args.limit]
+    if not paths:
+        raise SystemExit(f"No images found in {args.images}")
+
+    ref_model = load_backend(args.weights, "torch", args.imgsz)
+    other_model = load_backend(args.weights, args.backend, args.imgsz, task=ref_model.task)
+    if other_model.name != args.backend:
+        raise SystemExit(f"Could not load backend {args.backend}")
+
+    failures = 0
+    for p in paths:
+        frame = ImageFrame.from_path(p)
+        if frame is None:
+            print(f"  skip (unreadable): {p}")
+            continue
+        img = frame.letterbox(args.imgsz)
+        ref = ref_model([img])[0]
+        other = other_model([img])[0]
+        cmp = compare_results(ref, other, args.iou)
+        ok = cmp["ok"] and cmp["max_conf_delta"] <= args.max_conf_delta
+        failures += 0 if ok else 1
+        print(
+            f"  {'OK  ' if ok else 'DIFF'} {os.path.basename(p)}: "
+            f"torch={cmp['ref_boxes']} {args.backend}={cmp['other_boxes']} matched={cmp['matched']} "
+            f"max_conf_delta={cmp['max_conf_delta']:.4f}"
+        )
+
+    print(f"\n{len(paths) - failures}/{len(paths)} images match ({args.backend} vs torch)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare the single-pass pipeline (YOLO_SINGLE_PASS=1, segmentation model only) with the
+two-model flow (detect model for species + segmentation model for masks).
+
+Usage:
+  python scripts/check_single_pass.py --images static/uploads [--det yolov8n.pt --seg yolov8n-seg.pt]
+
+For each image it reports the species decision and whether the dog gate (>= --dog-threshold)
+agrees, plus how many dog/cat boxes match by class with IoU >= --iou. Exits with code 1 if any
+image gets a different species or gate decision.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import ImageFrame  # noqa: E402
+from yolo_backends import compare_results  # noqa: E402
+from yolo_models import DET_WEIGHTS, SEG_WEIGHTS, YOLO_IMGSZ, load_named  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def species_of(r: dict) -> tuple[str, float]:
+    """Same rule as upload._parse_species: highest-confidence dog/cat box wins."""
+    best, best_conf = "Unknown", 0.0
+    for ci, cf in zip(r["cls"], r["conf"]):
+        label = r["names"].get(int(ci))
+        if label in ("dog", "cat") and cf > best_conf:
+            best, best_conf = ("Dog" if label == "dog" else "Cat"), float(cf)
+    return best, best_conf
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", required=True, help="Directory of sample images")
+    ap.add_argument("--det", default=DET_WEIGHTS)
+    ap.add_argument("--seg", default=SEG_WEIGHTS)
+    ap.add_argument("--dog-threshold", type=float, default=0.75)
+    ap.add_argument("--iou", type=float, default=0.5, help="IoU to count two boxes as the same")
+    ap.add_argument("--limit", type=int, default=50, help="Max number of images to check")
+    args = ap.parse_args()
+
+    paths = sorted(
+        os.path.join(d, f)
+        for d, _, files in os.walk(args.images)  # uploads are sharded: static/uploads/ab/cd/<sha>.jpg
+        for f in files
+        if f.lower().endswith(IMAGE_EXTS)
+    )[: args.limit]
+    if not paths:
+        raise SystemExit(f"No images found in {args.images}")
+
+    det_model = load_named("detect", args.det)
+    seg_model = load_named("segment", args.seg)
+
+    failures = 0
+    for p in paths:
+        frame = ImageFrame.from_path(p)
+        if frame is None:
+            print(f"  skip (unreadable): {p}")
+            continue
+        img = frame.letterbox(YOLO_IMGSZ)
+        ref = det_model([img])[0]
+        single = seg_model([img])[0]
+        ref_species, ref_conf = species_of(ref)
+        single_species, single_conf = species_of(single)
+        ref_gate = ref_species == "Dog" and ref_conf >= args.dog_threshold
+        single_gate = single_species == "Dog" and single_conf >= args.dog_threshold
+        ok = ref_species == single_species and ref_gate == single_gate
+        failures += 0 if ok else 1
+        cmp = compare_results(ref, single, args.iou)
+        print(
+            f"  {'OK  ' if ok else 'DIFF'} {os.path.basename(p)}: "
+            f"two-pass={ref_species} {ref_conf:.2f} single={single_species} {single_conf:.2f} "
+            f"boxes {cmp['matched']}/{cmp['ref_boxes']} matched (single has {cmp['other_boxes']})"
+        )
+
+    print(f"\n{len(paths) - failures}/{len(paths)} images agree on species and dog gate")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Measure what the pre-YOLO cascade (PRE_CASCADE=1) would cost on a labeled image set.
+
+Usage:
+  python scripts/eval_cascade.py --dataset data/pets [--margins 0,0.5,1,1.5,2] [--yolo] [--json report.json]
+
+The dataset uses the train.py layout: <dataset>/Dog/<breed>/*.jpg counts as dog, every other
+top-level folder (Cat/, Other/, ...) counts as not-dog. For each margin it reports how many
+requests would be short-circuited and how many dogs would be wrongly rejected. With --yolo it
+also runs the detect model, so "lost" counts only the dogs that would otherwise have passed the
+dog gate (the real accuracy cost).
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from predict import ImagePredictor  # noqa: E402
+from utils import ImageFrame  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def collect(root: str, limit: int) -> list[tuple[str, bool]]:
+    items: list[tuple[str, bool]] = []
+    for top in sorted(os.listdir(root)):
+        top_dir = os.path.join(root, top)
+        if not os.path.isdir(top_dir):
+            continue
+        paths = sorted(
+            os.path.join(d, f) for d, _, files in os.walk(top_dir) for f in files if f.lower().endswith(IMAGE_EXTS)
+        )
+        items.extend((p, top == "Dog") for p in paths[:limit])
+    return items
+
+
+def yolo_gate(det_model, frame: ImageFrame, imgsz: int, threshold: float) -> bool:
+    """Same rule as upload._run_pipeline: best dog/cat box is a dog with conf >= threshold."""
+    r = det_model([frame.letterbox(imgsz)])[0]
+    best, best_conf = None, 0.0
+    for ci, cf in zip(r["cls"], r["conf"]):
+        label = r["names"].get(int(ci))
+        if label in ("dog", "cat") and cf > best_conf:
+            best, best_conf = label, float(cf)
+    return best == "dog" and best_conf >= threshold
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", required=True, help="Folder with Dog/ and other class folders")
+    ap.add_argument("--models-dir", default="models", help="Folder with species_svm.joblib")
+    ap.add_argument("--margins", default="0,0.5,1,1.5,2", help="Comma-separated PRE_CASCADE_MARGIN values")
+    ap.add_argument("--limit", type=int, default=500, help="Max images per top-level class folder")
+    ap.add_argument("--yolo", action="store_true", help="Also run the detect model to count lost dog predictions")
+    ap.add_argument("--dog-threshold", type=float, default=0.75)
+    ap.add_argument("--json", default=None, help="Write the report to this file")
+    args = ap.parse_args()
+
+    predictor = ImagePredictor(args.models_dir)
+    if predictor.species_model is None:
+        raise SystemExit(f"No species_svm.joblib in {args.models_dir}; run train.py first")
+    items = collect(args.dataset, args.limit)
+    if not items:
+        raise SystemExit(f"No images found in {args.dataset}")
+
+    det_model = None
+    if args.yolo:
+        from yolo_models import DET_WEIGHTS, YOLO_IMGSZ, load_named
+        det_model = load_named("detect", DET_WEIGHTS)
+
+    rows = []  # (margin, is_dog, yolo_pass)
+    cascade_ms = yolo_ms = 0.0
+    for path, is_dog in items:
+        frame = ImageFrame.from_path(path)
+        if frame is None:
+            print(f"  skip (unreadable): {path}")
+            continue
+        t0 = time.perf_counter()
+        margin = predictor.dog_margin(frame)
+        cascade_ms += (time.perf_counter() - t0) * 1000.0
+        passed = None
+        if det_model is not None:
+            t0 = time.perf_counter()
+            passed = yolo_gate(det_model, frame, YOLO_IMGSZ, args.dog_threshold)
+            yolo_ms += (time.perf_counter() - t0) * 1000.0
+        rows.append((margin, is_dog, passed))
+    if not rows:
+        raise SystemExit("No readable images")
+    if rows[0][0] is None:
+        raise SystemExit("species_svm.joblib is not a binary Dog/Cat SVM; cascade unavailable")
+
+    n = len(rows)
+    dogs = sum(1 for _, d, _ in rows if d)
+    report = {
+        "images": n,
+        "dogs": dogs,
+        "not_dogs": n - dogs,
+        "cascade_mean_ms": round(cascade_ms / n, 2),
+        "yolo_mean_ms": round(yolo_ms / n, 2) if det_model is not None else None,
+        "margins": [],
+    }
+    print(f"{n} images ({dogs} dog, {n - dogs} not dog), cascade {report['cascade_mean_ms']} ms/image"
+          + (f", detect {report['yolo_mean_ms']} ms/image" if det_model is not None else ""))
+    print(f"{'margin':>7} {'short-circuit':>14} {'not-dog caught':>15} {'dogs rejected':>14} {'lost':>6}")
+    for m in [float(x) for x in args.margins.split(",") if x.strip()]:
+        rejected = [(d, p) for s, d, p in rows if s <= -m]
+        caught = sum(1 for d, _ in rejected if not d)
+        dog_rejects = sum(1 for d, _ in rejected if d)
+        lost = sum(1 for d, p in rejected if d and p) if det_model is not None else None
+        entry = {
+            "margin": m,
+            "short_circuited": len(rejected),
+            "short_circuit_rate": round(len(rejected) / n, 4),
+            "not_dog_caught_rate": round(caught / (n - dogs), 4) if n > dogs else None,
+            "dog_false_reject_rate": round(dog_rejects / dogs, 4) if dogs else None,
+            "lost_dog_predictions": lost,
+        }
+        report["margins"].append(entry)
+        print(
+            f"{m:>7.2f} {entry['short_circuit_rate']:>13.1%} "
+            f"{(entry['not_dog_caught_rate'] or 0):>14.1%} {(entry['dog_false_reject_rate'] or 0):>13.1%} "
+            f"{'-' if lost is None else lost:>6}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+INT8 post-training quantization for the YOLOv8 breed model (CPU / ONNX Runtime).
+
+Usage:
+  python scripts/quantize_breed_model.py --weights runs/detect/breeds/weights/best.pt \
+      --data stanford-dogs-yolo/data.yaml --calib-size 200 --eval-size 300
+
+Steps:
+  1. Export best.pt -> best.onnx (dynamic batch), reusing an existing export if it is up to date.
+  2. Calibrate on a random subset of the train images written by stanford_dogs_to_yolo.py and
+     write best_int8.onnx next to the weights (static QDQ, per-channel INT8 weights). The Detect
+     head is left in float by default because quantizing it costs the most accuracy.
+  3. Evaluate FP32 (PyTorch) and INT8 on the val split: top-1 breed accuracy against the YOLO
+     label files and CPU latency per image, printed side by side.
+
+The app loads the result when BREED_WEIGHTS points at the .onnx file.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import letterbox, load_image_bgr  # noqa: E402
+from yolo_backends import export_onnx, load_backend  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def list_images(images_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(images_dir, f) for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTS)
+    )
+
+
+def label_for(image_path: str) -> Optional[int]:
+    """Class id from the YOLO label file (…/images/x.jpg -> …/labels/x.txt)."""
+    images_dir = os.path.dirname(image_path)
+    labels_dir = os.path.join(os.path.dirname(images_dir), "labels")
+    lab = os.path.join(labels_dir, os.path.splitext(os.path.basename(image_path))[0] + ".txt")
+    try:
+        with open(lab, "r", encoding="utf-8") as f:
+            first = f.readline().split()
+        return int(first[0]) if first else None
+    except (OSError, ValueError):
+        return None
+
+
+def to_input(img_bgr: np.ndarray, imgsz: int) -> np.ndarray:
+    """Same preprocessing as ultralytics for ONNX: letterbox, BGR->RGB, NCHW float32 / 255."""
+    lb, _, _ = letterbox(img_bgr, imgsz)
+    x = lb[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(x, dtype=np.float32)[None] / 255.0
+
+
+class YoloCalibrationReader:
+    """CalibrationDataReader feeding letterboxed calibration images one at a time."""
+
+    def __init__(self, paths: List[str], input_name: str, imgsz: int):
+        self.paths = paths
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._it = iter(self.paths)
+
+    def get_next(self):
+        for p in self._it:
+            img = load_image_bgr(p)
+            if img is not None:
+                return {self.input_name: to_input(img, self.imgsz)}
+        return None
+
+    def rewind(self):
+        self._it = iter(self.paths)
+
+
+def quantize(fp32_onnx: str, out_path: str, calib_paths: List[str], imgsz: int, exclude_prefix: Optional[str]) -> str:
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    prep_path = fp32_onnx.replace(".onnx", "_prep.onnx")
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(fp32_onnx, prep_path, skip_symbolic_shape=True)
+        src = prep_path
+    except Exception as e:
+        print(f"[warn] quant_pre_process failed ({e}); quantizing the raw export")
+        src = fp32_onnx
+
+    model = onnx.load(src)
+    input_name = model.graph.input[0].name
+    exclude = [n.name for n in model.graph.node if exclude_prefix and n.name.startswith(exclude_prefix)]
+    print(f"Calibrating on {len(calib_paths)} images, keeping {len(exclude)} head nodes in float")
+
+    quantize_static(
+        src,
+        out_path,
+        YoloCalibrationReader(calib_paths, input_name, imgsz),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=exclude,
+    )
+
+    # Keep ultralytics metadata (names, task, imgsz) so YOLO(out_path) loads it like the FP32 export
+    q = onnx.load(out_path)
+    meta = {p.key: p.value for p in onnx.load(fp32_onnx).metadata_props}
+    del q.metadata_props[:]
+    for k, v in meta.items():
+        entry = q.metadata_props.add()
+        entry.key, entry.value = k, v
+    onnx.save(q, out_path)
+    if src == prep_path and os.path.exists(prep_path):
+        os.remove(prep_path)
+    return out_path
+
+
+def evaluate(model, paths: List[str], imgsz: int) -> dict:
+    correct = 0
+    total = 0
+    latencies: List[float] = []
+    # First call pays session/graph setup; keep it out of the latency numbers
+    model([np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)])
+    for p in paths:
+        gt = label_for(p)
+        img = load_image_bgr(p)
+        if gt is None or img is None:
+            continue
+        lb, _, _ = letterbox(img, imgsz)
+        t0 = time.perf_counter()
+        r = model([lb])[0]
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        pred = None
+        if r["conf"]:
+            best_i = max(range(len(r["conf"])), key=lambda i: r["conf"][i])
+            pred = int(r["cls"][best_i])
+        total += 1
+        correct += int(pred == gt)
+    latencies.sort()
+    return {
+        "images": total,
+        "top1_acc": correct / total if total else 0.0,
+        "latency_ms_mean": statistics.fmean(latencies) if latencies else 0.0,
+        "latency_ms_p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", required=True, help="Trained breed best.pt")
+    ap.add_argument("--data", required=True, help="data.yaml written by stanford_dogs_to_yolo.py")
+    ap.add_argument("--output", default=None, help="Output .onnx (default: <weights>_int8.onnx)")
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--calib-size", type=int, default=200, help="Number of train images for calibration")
+    ap.add_argument("--eval-size", type=int, default=300, help="Number of val images for evaluation (0 = skip)")
+    ap.add_argument("--quantize-head", action="store_true", help="Also quantize the Detect head")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--report", default=None, help="Optional JSON report path")
+    args = ap.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    train_imgs = list_images(data["train"])
+    val_imgs = list_images(data["val"])
+    rng = random.Random(args.seed)
+    calib = rng.sample(train_imgs, min(args.calib_size, len(train_imgs)))
+    if not calib:
+        raise SystemExit(f"No calibration images in {data['train']}")
+
+    out_path = args.output or os.path.splitext(args.weights)[0] + "_int8.onnx"
+    fp32_onnx = export_onnx(args.weights, args.imgsz, dynamic=True)
+
+    exclude_prefix = None
+    if not args.quantize_head:
+        from ultralytics import YOLO
+        head_idx = YOLO(args.weights).model.model[-1].i
+        exclude_prefix = f"/model.{head_idx}/"
+    quantize(fp32_onnx, out_path, calib, args.imgsz, exclude_prefix)
+    print(f"INT8 model written to: {out_path}")
+
+    if args.eval_size <= 0:
+        return
+    eval_paths = rng.sample(val_imgs, min(args.eval_size, len(val_imgs)))
+    fp32 = load_backend(args.weights, "torch", args.imgsz)
+    int8 = load_backend(out_path, "onnxruntime", args.imgsz, task="detect")
+    rep_fp32 = evaluate(fp32, eval_paths, args.imgsz)
+    rep_int8 = evaluate(int8, eval_paths, args.imgsz)
+
+    print(f"\n{'':12}{'FP32 (torch)':>16}{'INT8 (onnx)':>16}{'delta':>12}")
+    print(f"{'top-1 acc':12}{rep_fp32['top1_acc']:>16.4f}{rep_int8['top1_acc']:>16.4f}"
+          f"{rep_int8['top1_acc'] - rep_fp32['top1_acc']:>+12.4f}")
+    for key, label in (("latency_ms_mean", "mean ms"), ("latency_ms_p95", "p95 ms")):
+        speedup = rep_fp32[key] / rep_int8[key] if rep_int8[key] else 0.0
+        print(f"{label:12}{rep_fp32[key]:>16.1f}{rep_int8[key]:>16.1f}{speedup:>11.2f}x")
+    print(f"(evaluated on {rep_fp32['images']} val images)")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"weights": args.weights, "int8": out_path, "fp32": rep_fp32, "int8_eval": rep_int8}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
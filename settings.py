@@ -4,7 +4,7 @@
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request
 from connect import get_connection
 from models import UserSettings
-import os
+from upload_store import release
 
 settings_bp = Blueprint("settings", __name__)
 
@@ -103,18 +103,13 @@ def clear_history():
             cur.execute("DELETE FROM prediction_history WHERE user_id = %s", (user_id,))
         conn.commit()
 
-        # Xóa file ảnh trong static/uploads nếu trỏ đúng thư mục (an toàn)
-        upload_root = os.path.abspath(os.path.join(os.getcwd(), "static", "uploads"))
+        # Xóa ảnh trong static/uploads không còn bản ghi nào tham chiếu
+        # (ảnh lưu theo nội dung nên có thể dùng chung với user khác / bản ghi khác)
         deleted_files = 0
-        for p in image_paths:
-            try:
-                # normalize path; allow both relative and absolute
-                abs_path = os.path.abspath(os.path.join(os.getcwd(), p)) if not os.path.isabs(p) else os.path.abspath(p)
-                if abs_path.startswith(upload_root) and os.path.exists(abs_path):
-                    os.remove(abs_path)
-                    deleted_files += 1
-            except Exception:
-                pass
+        try:
+            deleted_files = release(conn, image_paths)
+        except Exception as e:
+            print(f"[SETTINGS] release images error: {e}")
 
         flash(f"Đã xóa lịch sử nhận diện. (Đã xóa {deleted_files} ảnh lưu trữ)", "success")
         return redirect(url_for("settings.settings"))
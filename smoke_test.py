@@ -1,19 +1,46 @@
 """
-smoke_test.py — Quick YOLOv8 Dog/Cat detection check
+smoke_test.py — Quick YOLOv8 Dog/Cat detection check and model latency sweep
 
 Usage:
   python smoke_test.py --image path/to/image.jpg [--model yolov8n.pt]
 
-It prints all detected labels and confidence, and the final species guess
+  python smoke_test.py --images static/uploads [--models detect=yolov8n.pt,segment=yolov8n-seg.pt]
+      [--imgsz 320,480,640] [--threads 1,2,4] [--batch 1,4,8] [--backends torch,onnxruntime,opencv]
+      [--repeat 3] [--warmup 2] [--limit 32] [--json sweep.json]
+
+With --image it prints all detected labels and confidence, and the final species guess
 restricted to Dog/Cat if present.
+
+With --images it loads each model once per backend and times every combination of input
+size, thread count and batch size on the images of that directory. It prints mean / p95
+latency per batch, latency per image and throughput (images/s) per configuration, and can
+write the same numbers as JSON, to pick INFER_BACKEND / OMP_NUM_THREADS / INFER_MAX_BATCH
+/ input size per machine type.
+
+Notes:
+  - Thread count is applied with torch.set_num_threads and cv2.setNumThreads. An ONNX Runtime
+    session fixes its thread pool when it is created, so onnxruntime runs once per size and
+    batch with its default pool ("auto").
+  - The OpenCV DNN backend uses a static ONNX export (batch 1, one input size), so it only
+    runs at the size it was exported for.
 """
 from __future__ import annotations
 import argparse
-from ultralytics import YOLO
+import os
+import time
+from functools import lru_cache
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+@lru_cache(maxsize=None)
+def load_model(model_path: str):
+    from ultralytics import YOLO
+    return YOLO(model_path)
 
 
 def detect_species(image_path: str, model_path: str = "yolov8n.pt") -> str:
-    model = YOLO(model_path)
+    model = load_model(model_path)
     results = model(image_path)
     r = results[0]
     names = getattr(r, "names", {}) or {}
@@ -47,12 +74,199 @@ def detect_species(image_path: str, model_path: str = "yolov8n.pt") -> str:
     return species
 
 
+# ----------------------------- Latency sweep -----------------------------
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def parse_models(text: str) -> list[tuple[str, str]]:
+    """"detect=yolov8n.pt,my.pt" -> [("detect", "yolov8n.pt"), ("my", "my.pt")].
+
+    A name of detect / segment / breed applies that model's production class filter and max_det.
+    """
+    models = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, path = part.partition("=")
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(part))[0], part
+        models.append((name.strip(), path.strip()))
+    return models
+
+
+def load_images(directory: str, limit: int | None = None) -> list:
+    import cv2
+    paths = sorted(
+        os.path.join(root, f)
+        for root, _, files in os.walk(directory)
+        for f in files
+        if f.lower().endswith(IMAGE_EXTS)
+    )
+    images = []
+    for p in paths:
+        img = cv2.imread(p, cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append(img)
+        if limit and len(images) >= limit:
+            break
+    return images
+
+
+def set_threads(n: int | None) -> None:
+    import cv2
+    import torch
+    if n:
+        torch.set_num_threads(n)
+        cv2.setNumThreads(n)
+
+
+def make_batches(images: list, batch: int) -> list[list]:
+    """One pass over the images in batches of exactly `batch` (cycling if there are fewer images)."""
+    count = max(1, len(images) // batch)
+    return [[images[(k * batch + j) % len(images)] for j in range(batch)] for k in range(count)]
+
+
+def time_config(backend, images: list, imgsz: int, batch: int, repeat: int, warmup: int) -> dict:
+    from benchmarks.report import summarize
+
+    backend.imgsz = imgsz
+    backend.predict_kwargs.update(imgsz=imgsz, verbose=False)
+    batches = make_batches(images, batch)
+    for b in batches[:warmup]:
+        backend(b)
+    latencies, errors = [], 0
+    for _ in range(repeat):
+        for b in batches:
+            t0 = time.perf_counter()
+            try:
+                backend(b)
+            except Exception as e:
+                print(f"[SWEEP] {backend.name} imgsz={imgsz} batch={batch}: {e}")
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+    stats = summarize(latencies, errors)
+    if stats.get("n"):
+        total_s = sum(latencies) / 1000.0
+        stats["per_image_ms"] = round(stats["mean_ms"] / batch, 3)
+        stats["images_per_s"] = round(len(latencies) * batch / total_s, 2) if total_s > 0 else None
+    return stats
+
+
+def run_sweep(models: list[tuple[str, str]], images: list, sizes: list[int], threads: list[int],
+              batches: list[int], backends: list[str], repeat: int, warmup: int) -> list[dict]:
+    from yolo_models import MODEL_FILTERS, MODEL_IMGSZ, load_yolo
+
+    results = []
+    for name, path in models:
+        for backend_name in backends:
+            t0 = time.perf_counter()
+            # The static ONNX file for OpenCV is exported once at the model's production size
+            load_size = MODEL_IMGSZ.get(name, sizes[0]) if backend_name == "opencv" else sizes[0]
+            backend = load_yolo(path, load_size, backend_name, **MODEL_FILTERS.get(name, {}))
+            load_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+            if backend.name != backend_name:
+                # load_backend falls back to torch on export/load errors; don't report that as this backend
+                print(f"[SWEEP] {name}: backend {backend_name} unavailable, skipped")
+                continue
+            print(f"[SWEEP] loaded {name} ({path}) on {backend_name} in {load_ms} ms")
+            if backend_name == "opencv" and backend.imgsz not in sizes:
+                print(f"[SWEEP] {name}: opencv only runs at imgsz={backend.imgsz}, not in {sizes}")
+            for imgsz in sizes:
+                if backend_name == "opencv" and imgsz != backend.imgsz:
+                    continue
+                for n_threads in (threads if backend_name != "onnxruntime" else [None]):
+                    set_threads(n_threads)
+                    for batch in batches:
+                        stats = time_config(backend, images, imgsz, batch, repeat, warmup)
+                        row = {"model": name, "weights": path, "backend": backend_name, "imgsz": imgsz,
+                               "threads": n_threads or "auto", "batch": batch, "load_ms": load_ms, **stats}
+                        results.append(row)
+                        print_row(row)
+    return results
+
+
+def print_header() -> None:
+    print(f"{'model':<10} {'backend':<12} {'imgsz':>5} {'thr':>4} {'batch':>5} {'mean ms':>9} {'p95 ms':>9} "
+          f"{'ms/img':>8} {'img/s':>8}")
+
+
+def print_row(row: dict) -> None:
+    if not row.get("n"):
+        print(f"{row['model']:<10} {row['backend']:<12} {row['imgsz']:>5} {str(row['threads']):>4} {row['batch']:>5} "
+              f"{'failed':>9}")
+        return
+    print(f"{row['model']:<10} {row['backend']:<12} {row['imgsz']:>5} {str(row['threads']):>4} {row['batch']:>5} "
+          f"{row['mean_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['per_image_ms']:>8.1f} {row['images_per_s']:>8.1f}")
+
+
+def print_best(results: list[dict]) -> None:
+    """Per model: lowest p95 at batch 1 (interactive latency) and highest throughput (batch work)."""
+    for name in dict.fromkeys(r["model"] for r in results):
+        rows = [r for r in results if r["model"] == name and r.get("n")]
+        if not rows:
+            continue
+        single = [r for r in rows if r["batch"] == 1]
+        if single:
+            r = min(single, key=lambda r: r["p95_ms"])
+            print(f"{name}: lowest p95 at batch 1: {r['backend']} imgsz={r['imgsz']} threads={r['threads']} "
+                  f"({r['p95_ms']:.1f} ms)")
+        r = max(rows, key=lambda r: r["images_per_s"] or 0)
+        print(f"{name}: highest throughput: {r['backend']} imgsz={r['imgsz']} threads={r['threads']} "
+              f"batch={r['batch']} ({r['images_per_s']:.1f} img/s)")
+
+
+def sweep(args) -> None:
+    from benchmarks.report import environment, peak_rss_mb, write_report
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+    models = parse_models(args.models)
+    sizes, threads, batches = _int_list(args.imgsz), _int_list(args.threads), _int_list(args.batch)
+    backends = [b.strip().lower() for b in args.backends.split(",") if b.strip()]
+    print(f"{len(images)} images, models {[m for m, _ in models]}, backends {backends}, imgsz {sizes}, "
+          f"threads {threads}, batch {batches}, {args.repeat} passes")
+    print_header()
+    results = run_sweep(models, images, sizes, threads, batches, backends, args.repeat, args.warmup)
+    print()
+    print_best(results)
+    if args.json:
+        report = {
+            "environment": environment({name: path for name, path in models}),
+            "settings": {"images": args.images, "n_images": len(images), "imgsz": sizes, "threads": threads,
+                         "batch": batches, "backends": backends, "repeat": args.repeat, "warmup": args.warmup},
+            "peak_rss_mb": peak_rss_mb(),
+            "results": results,
+        }
+        write_report(args.json, report)
+
+
 def main() -> None:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--image", required=True, help="Path to test image")
+    ap.add_argument("--image", help="Path to test image")
     ap.add_argument("--model", default="yolov8n.pt", help="YOLOv8 detection model path")
+    ap.add_argument("--images", help="Directory of images: run the latency sweep instead")
+    ap.add_argument("--models", default="detect=yolov8n.pt", help="Sweep models, [name=]path comma-separated")
+    ap.add_argument("--imgsz", default="640", help="Input sizes, comma-separated")
+    ap.add_argument("--threads", default=str(os.cpu_count() or 1), help="Torch / OpenCV thread counts")
+    ap.add_argument("--batch", default="1", help="Batch sizes")
+    ap.add_argument("--backends", default="torch", help="torch, onnxruntime, opencv")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed passes over the images per configuration")
+    ap.add_argument("--warmup", type=int, default=2, help="Untimed batches per configuration")
+    ap.add_argument("--limit", type=int, default=32, help="Use at most this many images (0 = all)")
+    ap.add_argument("--json", default=None, help="Write the sweep report to this file")
     args = ap.parse_args()
 
+    if args.images:
+        sweep(args)
+        return
+    if not args.image:
+        ap.error("one of --image or --images is required")
     sp = detect_species(args.image, args.model)
     print(f"\nFinal species guess: {sp}")
 
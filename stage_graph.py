@@ -0,0 +1,132 @@
+# stage_graph.py
+# Đồ thị stage cho pipeline suy luận: mỗi stage khai báo phụ thuộc + điều kiện chạy.
+#
+# Stage chỉ chạy khi mọi stage nó phụ thuộc đã chạy (trừ phụ thuộc khai báo `may_skip`: chỉ cần
+# đã được xét, bỏ qua vì disabled / not_needed vẫn được), điều kiện `when` (đọc kết quả các stage
+# trước) đúng, và nếu là stage optional thì phải được bật cho request. Mỗi lần chạy trả về trace
+# (stage nào chạy / bị bỏ qua / lỗi, mất bao lâu); đồ thị cộng dồn thống kê để thấy tiết kiệm được
+# bao nhiêu lượt chạy.
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Trạng thái trong trace
+RAN = "ran"
+ERROR = "error"
+SKIP_DISABLED = "disabled"        # stage optional chưa được bật cho request
+SKIP_UPSTREAM = "upstream"        # stage phụ thuộc không chạy
+SKIP_NOT_NEEDED = "not_needed"    # điều kiện `when` sai: kết quả sẽ không được dùng
+
+
+@dataclass(frozen=True)
+class Stage:
+	name: str
+	fn: Callable[[Dict[str, Any]], Any]   # nhận state (kết quả các stage trước theo tên) -> kết quả
+	requires: Tuple[str, ...] = ()
+	when: Optional[Callable[[Dict[str, Any]], bool]] = None
+	optional: bool = False
+	fallback: Any = None                   # giá trị trong state khi stage lỗi
+	may_skip: Tuple[str, ...] = ()         # phụ thuộc (trong requires) được phép bị bỏ qua / không cần
+
+
+class StageGraph:
+	"""Danh sách stage theo thứ tự khai báo (phụ thuộc phải được khai báo trước)."""
+
+	def __init__(self, stages: Iterable[Stage], observer: Optional[Callable[[str, str, float], None]] = None):
+		# observer(tên stage, status, giây) được gọi sau mỗi stage đã chạy (vd. ghi histogram /metrics)
+		self.observer = observer
+		self.stages: List[Stage] = []
+		seen = set()
+		for st in stages:
+			if st.name in seen:
+				raise ValueError(f"duplicate stage {st.name}")
+			missing = [d for d in st.requires if d not in seen]
+			if missing:
+				raise ValueError(f"stage {st.name} requires undeclared stage(s): {', '.join(missing)}")
+			extra = [d for d in st.may_skip if d not in st.requires]
+			if extra:
+				raise ValueError(f"stage {st.name}: may_skip not in requires: {', '.join(extra)}")
+			seen.add(st.name)
+			self.stages.append(st)
+		self._lock = threading.Lock()
+		self._runs = 0
+		self._counts: Dict[str, Dict[str, float]] = {
+			st.name: {RAN: 0, ERROR: 0, "skipped": 0, "total_ms": 0.0} for st in self.stages
+		}
+
+	@property
+	def optional(self) -> List[str]:
+		return [st.name for st in self.stages if st.optional]
+
+	def run(self, state: Dict[str, Any], enabled: Iterable[str] = ()) -> List[Dict[str, Any]]:
+		"""Chạy các stage cần thiết, ghi kết quả vào `state[tên stage]`.
+
+		`enabled`: các stage optional được bật cho request này. Trả về trace theo thứ tự stage:
+		[{"stage", "status", "ms"?}]; stage lỗi nhận `fallback` và status "error".
+		"""
+		enabled = set(enabled)
+		done = set()
+		skipped: Dict[str, str] = {}
+		trace: List[Dict[str, Any]] = []
+		for st in self.stages:
+			if st.optional and st.name not in enabled:
+				trace.append({"stage": st.name, "status": SKIP_DISABLED})
+				skipped[st.name] = SKIP_DISABLED
+				continue
+			if any(not self._satisfied(st, d, done, skipped) for d in st.requires):
+				trace.append({"stage": st.name, "status": SKIP_UPSTREAM})
+				skipped[st.name] = SKIP_UPSTREAM
+				continue
+			if st.when is not None and not st.when(state):
+				trace.append({"stage": st.name, "status": SKIP_NOT_NEEDED})
+				skipped[st.name] = SKIP_NOT_NEEDED
+				continue
+			t0 = time.perf_counter()
+			try:
+				state[st.name] = st.fn(state)
+				status = RAN
+			except Exception as e:
+				print(f"[PIPELINE] stage {st.name} error: {e}")
+				state[st.name] = st.fallback
+				status = ERROR
+			elapsed = time.perf_counter() - t0
+			done.add(st.name)
+			trace.append({"stage": st.name, "status": status, "ms": round(elapsed * 1000.0, 2)})
+			if self.observer is not None:
+				self.observer(st.name, status, elapsed)
+		self._record(trace)
+		return trace
+
+	@staticmethod
+	def _satisfied(st: Stage, dep: str, done: set, skipped: Dict[str, str]) -> bool:
+		if dep in done:
+			return True
+		return dep in st.may_skip and skipped.get(dep) in (SKIP_DISABLED, SKIP_NOT_NEEDED)
+
+	def _record(self, trace: List[Dict[str, Any]]) -> None:
+		with self._lock:
+			self._runs += 1
+			for t in trace:
+				c = self._counts[t["stage"]]
+				if t["status"] in (RAN, ERROR):
+					c[t["status"]] += 1
+					c["total_ms"] += t.get("ms", 0.0)
+				else:
+					c["skipped"] += 1
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			runs = self._runs
+			stages = {}
+			for name, c in self._counts.items():
+				executed = c[RAN] + c[ERROR]
+				stages[name] = {
+					"ran": int(c[RAN]),
+					"errors": int(c[ERROR]),
+					"skipped": int(c["skipped"]),
+					"skip_rate": round(c["skipped"] / runs, 4) if runs else 0.0,
+					"mean_ms": round(c["total_ms"] / executed, 2) if executed else 0.0,
+				}
+		return {"runs": runs, "stages": stages}
@@ -1,2 +1,180 @@
 // script.js - Thêm JS cho giao diện web
 console.log("Trang web đã sẵn sàng!");
+
+// ---------------------------------------------------------------------------
+// Overlay nhận diện: vẽ bbox + nhãn + mask lên canvas phủ trên ảnh gốc.
+// Server chỉ trả JSON trong thuộc tính data-overlay của <img>:
+//   {"size": [w, h], "boxes": [{"label", "conf", "bbox": [x1, y1, x2, y2]}],
+//    "masks": [{"label", "polygons": [[x, y, ...]]} | {"label", "rle": {"size", "counts"}}]}
+// Toạ độ theo ảnh gốc nên dùng được cả với thumbnail cùng tỉ lệ.
+// ---------------------------------------------------------------------------
+(function () {
+  var COLORS = { dog: "0, 128, 255", cat: "255, 165, 0" };
+
+  function colorFor(label) {
+    return COLORS[label] || "46, 204, 113";
+  }
+
+  function parseOverlay(img) {
+    try {
+      return JSON.parse(img.getAttribute("data-overlay") || "null");
+    } catch (e) {
+      return null;
+    }
+  }
+
+  // Ánh xạ toạ độ ảnh gốc -> toạ độ hiển thị, tính cả object-fit (cover/contain/fill)
+  function viewTransform(img, natW, natH) {
+    var cw = img.clientWidth;
+    var ch = img.clientHeight;
+    var fit = window.getComputedStyle(img).objectFit;
+    var sx = cw / natW;
+    var sy = ch / natH;
+    if (fit === "cover" || fit === "contain") {
+      var s = fit === "cover" ? Math.max(sx, sy) : Math.min(sx, sy);
+      sx = sy = s;
+    }
+    return {
+      sx: sx,
+      sy: sy,
+      ox: (cw - natW * sx) / 2,
+      oy: (ch - natH * sy) / 2,
+      width: cw,
+      height: ch,
+    };
+  }
+
+  function rleCanvas(rle, rgb) {
+    var h = rle.size[0];
+    var w = rle.size[1];
+    var off = document.createElement("canvas");
+    off.width = w;
+    off.height = h;
+    var octx = off.getContext("2d");
+    var data = octx.createImageData(w, h);
+    var pos = 0;
+    var parts = rgb.split(",").map(Number);
+    rle.counts.forEach(function (n, i) {
+      if (i % 2 === 1) {
+        for (var k = pos; k < pos + n; k++) {
+          data.data[k * 4] = parts[0];
+          data.data[k * 4 + 1] = parts[1];
+          data.data[k * 4 + 2] = parts[2];
+          data.data[k * 4 + 3] = 90;
+        }
+      }
+      pos += n;
+    });
+    octx.putImageData(data, 0, 0);
+    return off;
+  }
+
+  function drawMasks(ctx, masks, t) {
+    (masks || []).forEach(function (m) {
+      var rgb = colorFor(m.label);
+      if (m.rle) {
+        var h = m.rle.size[0];
+        var w = m.rle.size[1];
+        ctx.drawImage(rleCanvas(m.rle, rgb), t.ox, t.oy, w * t.sx, h * t.sy);
+        return;
+      }
+      ctx.fillStyle = "rgba(" + rgb + ", 0.35)";
+      (m.polygons || []).forEach(function (poly) {
+        if (poly.length < 6) return;
+        ctx.beginPath();
+        for (var i = 0; i < poly.length; i += 2) {
+          var x = t.ox + poly[i] * t.sx;
+          var y = t.oy + poly[i + 1] * t.sy;
+          if (i === 0) ctx.moveTo(x, y);
+          else ctx.lineTo(x, y);
+        }
+        ctx.closePath();
+        ctx.fill();
+      });
+    });
+  }
+
+  function drawBoxes(ctx, boxes, t, compact) {
+    var fontSize = compact ? 11 : 14;
+    ctx.font = "bold " + fontSize + "px sans-serif";
+    ctx.textBaseline = "bottom";
+    (boxes || []).forEach(function (b) {
+      if (!b.bbox) return;
+      var rgb = colorFor(b.label);
+      var x1 = t.ox + b.bbox[0] * t.sx;
+      var y1 = t.oy + b.bbox[1] * t.sy;
+      var x2 = t.ox + b.bbox[2] * t.sx;
+      var y2 = t.oy + b.bbox[3] * t.sy;
+      ctx.strokeStyle = "rgb(" + rgb + ")";
+      ctx.lineWidth = compact ? 1.5 : 2;
+      ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+      var text = String(b.label || "").toUpperCase();
+      if (b.conf !== null && b.conf !== undefined) {
+        text += " " + Math.round(b.conf * 100) + "%";
+      }
+      var tw = ctx.measureText(text).width + 6;
+      var th = fontSize + 4;
+      var ty = Math.max(y1, th);
+      ctx.fillStyle = "rgb(" + rgb + ")";
+      ctx.fillRect(x1, ty - th, tw, th);
+      ctx.fillStyle = "#fff";
+      ctx.fillText(text, x1 + 3, ty - 2);
+    });
+  }
+
+  function render(img) {
+    var overlay = img._overlayData;
+    if (!overlay || !img.complete || !img.naturalWidth) return;
+    var size = overlay.size || [img.naturalWidth, img.naturalHeight];
+    var t = viewTransform(img, size[0], size[1]);
+    if (!t.width || !t.height) return;
+
+    var canvas = img._overlayCanvas;
+    var dpr = window.devicePixelRatio || 1;
+    canvas.width = Math.round(t.width * dpr);
+    canvas.height = Math.round(t.height * dpr);
+    canvas.style.width = t.width + "px";
+    canvas.style.height = t.height + "px";
+    canvas.style.left = img.offsetLeft + img.clientLeft + "px";
+    canvas.style.top = img.offsetTop + img.clientTop + "px";
+
+    var ctx = canvas.getContext("2d");
+    ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+    ctx.clearRect(0, 0, t.width, t.height);
+    drawMasks(ctx, overlay.masks, t);
+    drawBoxes(ctx, overlay.boxes, t, t.width < 240);
+  }
+
+  function attach(img) {
+    var overlay = parseOverlay(img);
+    if (!overlay || (!(overlay.boxes || []).length && !(overlay.masks || []).length)) return;
+    img._overlayData = overlay;
+    var canvas = document.createElement("canvas");
+    canvas.className = "overlay-canvas";
+    canvas.setAttribute("aria-hidden", "true");
+    img._overlayCanvas = canvas;
+    if (window.getComputedStyle(img.parentNode).position === "static") {
+      img.parentNode.style.position = "relative";
+    }
+    img.insertAdjacentElement("afterend", canvas);
+    if (img.complete) render(img);
+    img.addEventListener("load", function () {
+      render(img);
+    });
+  }
+
+  function init() {
+    var imgs = Array.prototype.slice.call(document.querySelectorAll("img[data-overlay]"));
+    imgs.forEach(attach);
+    var pending = null;
+    window.addEventListener("resize", function () {
+      if (pending) cancelAnimationFrame(pending);
+      pending = requestAnimationFrame(function () {
+        imgs.forEach(render);
+      });
+    });
+  }
+
+  window.renderDetectionOverlays = init;
+  document.addEventListener("DOMContentLoaded", init);
+})();
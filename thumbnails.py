@@ -0,0 +1,118 @@
+# thumbnails.py
+# Thumbnail nhiều kích thước cho lưới lịch sử / dashboard (srcset + lazy loading)
+#
+# Thumbnail nằm ở static/thumbs/<width>/<đường dẫn ảnh trong static/uploads>.jpg, được tạo
+# ngay lúc upload (từ ảnh đã giải mã sẵn) hoặc lười ở lần đầu được yêu cầu rồi cache trên đĩa.
+
+import os
+import threading
+from typing import Iterable
+
+import cv2
+import numpy as np
+from flask import Blueprint, abort, send_file, url_for
+
+from utils import decode_image
+
+THUMB_WIDTHS = (128, 320, 640)
+THUMB_QUALITY = 80
+UPLOAD_ROOT = os.path.join("static", "uploads")
+THUMB_ROOT = os.path.join("static", "thumbs")
+
+thumbs_bp = Blueprint("thumbs", __name__)
+
+
+def _relative_upload_path(image_path: str) -> str | None:
+	"""Đường dẫn ảnh tính từ static/uploads; None nếu ảnh nằm ngoài thư mục upload."""
+	root = os.path.abspath(UPLOAD_ROOT)
+	abs_path = os.path.abspath(image_path)
+	if not abs_path.startswith(root + os.sep):
+		return None
+	return os.path.relpath(abs_path, root)
+
+
+def thumb_path(image_path: str, width: int) -> str | None:
+	rel = _relative_upload_path(image_path)
+	if rel is None:
+		return None
+	return os.path.join(THUMB_ROOT, str(width), os.path.splitext(rel)[0] + ".jpg")
+
+
+def _write_thumb(img: np.ndarray, dest: str, width: int) -> np.ndarray:
+	h, w = img.shape[:2]
+	if w > width:
+		img = cv2.resize(img, (width, max(1, int(round(h * width / w)))), interpolation=cv2.INTER_AREA)
+	ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, THUMB_QUALITY])
+	if not ok:
+		raise OSError(f"cannot encode thumbnail {dest}")
+	os.makedirs(os.path.dirname(dest), exist_ok=True)
+	# Ghi file tạm rồi đổi tên: request song song không đọc phải thumbnail dở
+	tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(tmp, "wb") as f:
+		f.write(buf.tobytes())
+	os.replace(tmp, dest)
+	return img
+
+
+def generate_thumbnails(image_path: str, img: np.ndarray | None = None, widths: Iterable[int] = THUMB_WIDTHS) -> int:
+	"""Tạo các thumbnail còn thiếu. Truyền `img` (BGR đã giải mã) để khỏi đọc lại file.
+
+	Trả về số thumbnail đã tạo mới. Tạo từ cỡ lớn xuống nhỏ, mỗi cỡ resize từ cỡ trước đó.
+	"""
+	created = 0
+	for width in sorted(widths, reverse=True):
+		dest = thumb_path(image_path, width)
+		if dest is None or os.path.exists(dest):
+			continue
+		if img is None:
+			# Ảnh cũ / lớn: giải mã thẳng ở cỡ gần thumbnail lớn nhất (IMREAD_REDUCED_*)
+			img = decode_image(image_path, max(widths))
+			if img is None:
+				return created
+		try:
+			img = _write_thumb(img, dest, width)
+			created += 1
+		except OSError as e:
+			print(f"[THUMB] {dest}: {e}")
+	return created
+
+
+def delete_thumbnails(image_path: str) -> None:
+	for width in THUMB_WIDTHS:
+		dest = thumb_path(image_path, width)
+		if dest and os.path.exists(dest):
+			try:
+				os.remove(dest)
+			except OSError:
+				pass
+
+
+@thumbs_bp.app_template_global()
+def thumb_url(image_path: str, width: int) -> str:
+	"""URL thumbnail: file tĩnh nếu đã có, ngược lại route tạo lười (ảnh ngoài uploads -> ảnh gốc)."""
+	dest = thumb_path(image_path, width)
+	if dest is None:
+		return "/" + image_path
+	if os.path.exists(dest):
+		return url_for("static", filename=os.path.relpath(dest, "static").replace(os.sep, "/"))
+	return url_for("thumbs.thumbnail", width=width, image_path=image_path.replace(os.sep, "/"))
+
+
+@thumbs_bp.app_template_global()
+def thumb_srcset(image_path: str) -> str:
+	return ", ".join(f"{thumb_url(image_path, w)} {w}w" for w in THUMB_WIDTHS)
+
+
+@thumbs_bp.route("/thumbs/<int:width>/<path:image_path>", methods=["GET"])
+def thumbnail(width: int, image_path: str):
+	"""Tạo thumbnail lần đầu được yêu cầu, các lần sau template trỏ thẳng vào file tĩnh."""
+	if width not in THUMB_WIDTHS:
+		abort(404)
+	dest = thumb_path(image_path, width)
+	if dest is None or not os.path.exists(image_path):
+		abort(404)
+	if not os.path.exists(dest):
+		generate_thumbnails(image_path, widths=(width,))
+	if not os.path.exists(dest):
+		abort(404)
+	return send_file(os.path.abspath(dest), mimetype="image/jpeg", max_age=7 * 24 * 3600)
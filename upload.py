@@ -2,21 +2,39 @@
 # upload.py
 # Blueprint xử lý upload ảnh và dự đoán
 
-from flask import Blueprint, request, redirect, url_for, flash, render_template, current_app, session, send_file
+from flask import Blueprint, request, redirect, url_for, flash, render_template, current_app, session, send_file, jsonify, abort, g
 from predict import ImagePredictor
-from werkzeug.utils import secure_filename
-import cv2
+from utils import IMAGE_MAX_SIDE, ImageFrame
+from inference_queue import BatchScheduler
+from result_cache import ResultCache, sha256_file, fingerprint_files
+from jobs import job_manager
+from mask_codec import MASK_FORMATS, encode_masks, save_masks
+from thumbnails import generate_thumbnails
+from upload_store import MAX_UPLOAD_BYTES, UPLOAD_ROOT, UploadRejected, ingest_upload
+from stage_graph import Stage, StageGraph
+from metrics import (
+	CACHE_LOOKUPS, DOG_GATE, JOBS_PENDING, QUEUE_DEPTH, STAGE_SECONDS, UPLOAD_SECONDS, UPLOADS,
+)
+from warmup import Warmup
 import numpy as np
 import os
+import threading
+import time
 from io import BytesIO
 import uuid
+from contextlib import contextmanager
 
 # --- YOLOv8 integration ---
-from ultralytics import YOLO
+from yolo_models import (
+	BREED_IMGSZ, DET_WEIGHTS, MAX_DET, MODEL_IMGSZ, SEG_WEIGHTS, YOLO_IMGSZ, LazyModel, find_breed_weight, load_named,
+	run_yolo,
+)
+from model_server import ModelServerClient, ModelServerUnavailable
+from model_registry import RegistryWatcher, resolve
 
 # --- Database integration ---
 from connect import get_connection
-from models import PredictionHistory, UserQuota, PaymentOrder
+from models import PredictionHistory, PredictionTimings, UserQuota, PaymentOrder
 from vietqr import build_vietqr_payload
 
 try:
@@ -25,7 +43,9 @@ except Exception:
 	qrcode = None
 
 predict_bp = Blueprint("predict", __name__)
-predictor = ImagePredictor()
+# HOG+SVM (3 file joblib) cũng nạp lười như YOLO: import blueprint không tốn thời gian nạp mô hình
+HOG_MODELS_DIR = "models"
+predictor = LazyModel("hog-svm", lambda: ImagePredictor(HOG_MODELS_DIR))
 
 
 def _get_session_user_id() -> int | None:
@@ -37,53 +57,139 @@ def _get_session_user_id() -> int | None:
 	except (TypeError, ValueError):
 		return None
 
-# Base detection models (COCO dog/cat + optional segmentation)
-det_model = YOLO('yolov8n.pt')        # Detection/classification
-seg_model = YOLO('yolov8n-seg.pt')    # Segmentation
-
-# Optional: auto-discover YOLOv8 breed model weights (trained locally)
-# Scan common locations and any runs/detect/*/weights/best.pt
-def _find_breed_weight() -> str | None:
-	# direct candidates
-	direct_candidates = [
-		os.path.join('runs', 'detect', 'breeds', 'weights', 'best.pt'),
-		os.path.join('runs', 'detect', 'breeds_from_scratch', 'weights', 'best.pt'),
-		os.path.join('weights', 'yolov8_breed_best.pt'),
-		os.path.join('models', 'yolov8_breed_best.pt'),
-	]
-
-	found: list[tuple[str, float]] = []
-	for p in direct_candidates:
-		if os.path.exists(p):
+# Base detection models (COCO dog/cat + optional segmentation) + YOLO breed (nếu có trọng số).
+# Mọi mô hình nạp lười (LazyModel) khi dùng lần đầu; warm-up nền (start_warmup, gọi từ app.py)
+# nạp sẵn và chạy suy luận giả để request thật không phải trả chi phí khởi động.
+# Khi cấu hình MODEL_SERVER_ADDRESS, mô hình nằm ở model_server.py; bản trong tiến trình chỉ
+# được nạp khi cần fallback (server không chạy) nên web worker không phải giữ trọng số.
+# Ảnh đầy đủ vào detect/segment ở YOLO_IMGSZ; breed chạy trên crop từng con chó ở BREED_IMGSZ.
+# Gate: chỉ khi xác nhận là chó >= 75% mới bắt đầu suy luận giống
+DOG_THRESHOLD = 0.75
+# YOLO_SINGLE_PASS=1: chỉ chạy mô hình segment (box + class + conf + mask trong 1 lần),
+# dùng cho cả gate loài lẫn mask -> bỏ hẳn 1 lượt backbone của mô hình detect.
+SINGLE_PASS = os.environ.get("YOLO_SINGLE_PASS", "0") == "1"
+# Mask phân đoạn mã hoá gọn theo toạ độ ảnh gốc: polygon (mặc định) hoặc rle.
+# MASK_PERSIST=1 lưu thêm <ảnh>_masks.json cạnh ảnh để hiển thị lại sau.
+MASK_FORMAT = os.environ.get("MASK_FORMAT", "polygon").strip().lower()
+if MASK_FORMAT not in MASK_FORMATS:
+	MASK_FORMAT = "polygon"
+MASK_PERSIST = os.environ.get("MASK_PERSIST", "0") == "1"
+# Nới bbox chó mỗi cạnh thêm tỉ lệ này trước khi crop cho breed model
+BREED_CROP_PAD = float(os.environ.get("BREED_CROP_PAD", "0.1"))
+# Cascade trước YOLO (PRE_CASCADE=1): species SVM (HOG) chắc chắn "không phải chó", tức margin
+# <= -PRE_CASCADE_MARGIN, thì trả kết quả luôn, không chạy detect/segment/breed.
+# Đo cái giá độ chính xác bằng scripts/eval_cascade.py trước khi bật.
+CASCADE_ENABLED = os.environ.get("PRE_CASCADE", "0") == "1"
+CASCADE_MARGIN = float(os.environ.get("PRE_CASCADE_MARGIN", "1.0"))
+_cascade_lock = threading.Lock()
+# Gói được bật sẵn stage segment (mask phân đoạn); gói khác bật từng request bằng masks=1
+SEGMENT_PLANS = {p.strip() for p in os.environ.get("SEGMENT_PLANS", "basic,pro,enterprise").split(",") if p.strip()}
+_cascade_counts = {"checked": 0, "rejected": 0, "unavailable": 0, "total_ms": 0.0}
+# Lưu thời gian từng stage của mỗi lần nhận diện vào bảng prediction_timings (PREDICTION_TIMINGS=0 để tắt)
+RECORD_TIMINGS = os.environ.get("PREDICTION_TIMINGS", "1") != "0"
+model_client = ModelServerClient.from_env()
+# Đường dẫn + phiên bản: bản active trong model registry, không có thì trọng số mặc định
+_det_path, _det_ver = resolve("detect", DET_WEIGHTS)
+_seg_path, _seg_ver = resolve("segment", SEG_WEIGHTS)
+_bw, _bw_ver = resolve("breed", find_breed_weight())
+det_model = LazyModel("detect", lambda: load_named("detect", _det_path), _det_ver)        # Detection/classification
+seg_model = LazyModel("segment", lambda: load_named("segment", _seg_path), _seg_ver)       # Segmentation
+breed_model = LazyModel("breed", lambda: load_named("breed", _bw), _bw_ver) if _bw else None
+
+# Theo dõi manifest: bản mới được kích hoạt sẽ nạp + warm-up nền rồi đổi nóng (MODEL_REGISTRY_POLL=0 để tắt)
+registry_watcher = RegistryWatcher(
+	{m.name: m for m in (det_model, seg_model, breed_model) if m is not None},
+	loader=load_named,
+	imgsz=MODEL_IMGSZ,
+	poll_seconds=float(os.environ.get("MODEL_REGISTRY_POLL", "5")),
+).start()
+
+# --- Micro-batching: gom ảnh từ nhiều thread thành 1 lần gọi batch cho mỗi mô hình ---
+# Cấu hình qua biến môi trường; INFER_BATCH_WINDOW_MS=0 để tắt (gọi trực tiếp như cũ).
+BATCH_WINDOW_MS = float(os.environ.get("INFER_BATCH_WINDOW_MS", "10"))
+BATCH_MAX_SIZE = int(os.environ.get("INFER_MAX_BATCH", "8"))
+
+
+def _yolo_batch_runner(model: LazyModel):
+	# Mọi ảnh của 1 mô hình đều đã letterbox cùng kích thước nên ghép batch được ngay.
+	# Ưu tiên model server; server không chạy thì suy luận trong tiến trình.
+	# Mỗi kết quả mang theo model_version của bản mô hình đã thực sự chạy batch đó.
+	def run(images):
+		if model_client is not None:
 			try:
-				found.append((p, os.path.getmtime(p)))
-			except Exception:
-				found.append((p, 0.0))
-
-	# Walk under runs/detect/**/weights/best.pt
-	detect_root = os.path.join('runs', 'detect')
-	if os.path.isdir(detect_root):
-		for dirpath, dirnames, filenames in os.walk(detect_root):
-			if 'best.pt' in filenames and os.path.basename(dirpath) == 'weights':
-				p = os.path.join(dirpath, 'best.pt')
-				try:
-					found.append((p, os.path.getmtime(p)))
-				except Exception:
-					found.append((p, 0.0))
-
-	if found:
-		# pick the most recently modified best.pt
-		found.sort(key=lambda t: t[1], reverse=True)
-		return found[0][0]
-	return None
-
-breed_model = None
-_bw = _find_breed_weight()
-if _bw:
-	try:
-		breed_model = YOLO(_bw)
-	except Exception:
-		breed_model = None
+				return model_client.infer(model.name, images)
+			except ModelServerUnavailable as e:
+				print(f"[MODEL] {model.name}: fallback in-process ({e})")
+		local, version = model.get_with_version()
+		if local is None:
+			raise RuntimeError(f"model {model.name} not available")
+		results = run_yolo(local, images)
+		for r in results:
+			r["model_version"] = version
+		return results
+	return run
+
+
+det_queue = BatchScheduler("detect", _yolo_batch_runner(det_model), BATCH_WINDOW_MS, BATCH_MAX_SIZE)
+seg_queue = BatchScheduler("segment", _yolo_batch_runner(seg_model), BATCH_WINDOW_MS, BATCH_MAX_SIZE)
+breed_queue = BatchScheduler("breed", _yolo_batch_runner(breed_model), BATCH_WINDOW_MS, BATCH_MAX_SIZE) if breed_model is not None else None
+# Độ sâu hàng đợi / số job đọc lúc /metrics được scrape
+QUEUE_DEPTH.set_function(lambda: {
+	(q.name,): q.stats()["queue_depth"] for q in (det_queue, seg_queue, breed_queue) if q is not None
+})
+JOBS_PENDING.set_function(lambda: {(): job_manager.stats()["pending"]})
+
+# --- Cache kết quả theo SHA-256 ảnh + fingerprint trọng số (RESULT_CACHE_SIZE=0 để tắt tầng RAM) ---
+# Phiên bản YOLO lấy lúc tra cache (_model_fingerprint) nên đổi nóng mô hình không dùng lại kết quả cũ.
+_BASE_FINGERPRINT = fingerprint_files(
+	[
+		os.path.join(HOG_MODELS_DIR, "species_svm.joblib"),
+		os.path.join(HOG_MODELS_DIR, "breed_svm.joblib"),
+		os.path.join(HOG_MODELS_DIR, "breed_labels.joblib"),
+	],
+	extra=(
+		f"imgsz={YOLO_IMGSZ};breed_imgsz={BREED_IMGSZ};pad={BREED_CROP_PAD};dog={DOG_THRESHOLD};"
+		f"single={SINGLE_PASS};max_det={MAX_DET};mask={MASK_FORMAT};backend={os.environ.get('INFER_BACKEND', 'torch')};"
+		f"max_side={IMAGE_MAX_SIDE};cascade={CASCADE_ENABLED}:{CASCADE_MARGIN}"
+	),
+)
+
+
+def _model_fingerprint() -> str:
+	versions = ",".join(f"{m.name}={m.version}" for m in (det_model, seg_model, breed_model) if m is not None)
+	return fingerprint_files([], extra=f"{_BASE_FINGERPRINT};{versions}")
+
+
+result_cache = ResultCache(
+	max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "256")),
+	ttl_seconds=float(os.environ.get("RESULT_CACHE_TTL", "86400")),
+	disk_dir=os.environ.get("RESULT_CACHE_DIR") or None,
+)
+
+
+# --- Warm-up: MODEL_WARMUP=0 để tắt (sẵn sàng ngay, nạp lười ở request đầu) ---
+def _warmup_steps() -> list:
+	# Ảnh xám đúng kích thước letterbox, đi qua hàng đợi như request thật (nạp mô hình cục bộ
+	# hoặc mở kết nối tới model server, khởi động luôn thread gom batch).
+	dummy = ImageFrame(np.full((YOLO_IMGSZ, YOLO_IMGSZ, 3), 114, dtype=np.uint8), source="warmup")
+	steps = [] if SINGLE_PASS else [("detect", lambda: det_queue.submit(dummy.letterbox(YOLO_IMGSZ)))]
+	steps.append(("segment", lambda: seg_queue.submit(dummy.letterbox(YOLO_IMGSZ))))
+	if breed_queue is not None:
+		steps.append(("breed", lambda: breed_queue.submit(dummy.letterbox(BREED_IMGSZ))))
+	steps.append(("hog-svm", lambda: predictor.get().predict(dummy)))
+	return steps
+
+
+warmup = Warmup(
+	_warmup_steps(),
+	runs=int(os.environ.get("MODEL_WARMUP_RUNS", "2")),
+	enabled=os.environ.get("MODEL_WARMUP", "1") != "0",
+)
+
+
+def start_warmup() -> Warmup:
+	"""Bắt đầu warm-up nền (idempotent). Gọi từ app.py sau khi đăng ký blueprint."""
+	return warmup.start()
 
 # Trang upload ảnh: chỉ hiển thị form nếu đã đăng nhập
 @predict_bp.route("/upload-page", methods=["GET"])
@@ -429,19 +535,527 @@ def my_payments():
 	return render_template("payments_user.html", orders=orders, quota_info=quota_info)
 
 
+@predict_bp.route("/inference-stats", methods=["GET"])
+def inference_stats():
+	"""Thống kê hàng đợi gom batch (admin) để tinh chỉnh INFER_BATCH_WINDOW_MS / INFER_MAX_BATCH."""
+	if _get_session_user_id() is None:
+		return jsonify({"error": "Not authenticated"}), 401
+	if session.get("role") != "admin":
+		abort(403)
+	queues = [q for q in (det_queue, seg_queue, breed_queue) if q is not None]
+	return jsonify({
+		"queues": [q.stats() for q in queues],
+		"result_cache": result_cache.stats(),
+		"jobs": job_manager.stats(),
+		"models": registry_watcher.stats(),
+		"warmup": warmup.stats(),
+		"cascade": cascade_stats(),
+		"pipeline": pipeline.stats(),
+	})
+
+
 def allowed_file(filename: str) -> bool:
 	allowed = current_app.config.get("ALLOWED_EXTENSIONS", {"png", "jpg", "jpeg"})
 	return "." in filename and filename.rsplit(".", 1)[1].lower() in allowed
 
 
+# --- Các bước suy luận: đều nhận ImageFrame (đã giải mã sẵn) thay vì đường dẫn ---
+# YOLO nhận thẳng ảnh letterbox 640 đã cache nên không resize lại; bbox trả về
+# nằm trong hệ toạ độ letterbox và được map về ảnh gốc bằng frame.to_original().
+# Các lần gọi mô hình đi qua BatchScheduler để gom batch giữa các request.
+
+
+def _detect_species(frame: ImageFrame) -> tuple[str, list[dict]]:
+	"""Chạy det_model, trả về (nhãn loài 'Dog'|'Cat'|'Unknown', danh sách detection)."""
+	return _parse_species(frame, det_queue.submit(frame.letterbox(YOLO_IMGSZ)))
+
+
+def _parse_species(frame: ImageFrame, r: dict) -> tuple[str, list[dict]]:
+	"""Từ kết quả YOLO (detect hoặc segment) lấy (nhãn loài, danh sách detection toạ độ ảnh gốc).
+
+	Lưu ý: mô hình detect (yolov8n.pt) không có probs.top1 như mô hình classify.
+	Thay vào đó dùng boxes.cls để lấy class id, map sang tên và chọn 'dog' hoặc 'cat' nếu có.
+	"""
+	names = r['names']
+	det_label = 'Unknown'
+	det_items = []
+	if r['cls']:
+		labels = []
+		for ci in r['cls']:
+			try:
+				labels.append(names[int(ci)])
+			except Exception:
+				continue
+		# Lấy conf và bbox nếu có để hiển thị chi tiết
+		confs = r['conf'] or [None] * len(labels)
+		xyxy = r['xyxy'] or [None] * len(labels)
+		for lab, cf, bb in zip(labels, confs, xyxy):
+			item = {
+				'label': lab,
+				'conf': float(cf) if cf is not None else None,
+				'bbox': frame.to_original(bb, YOLO_IMGSZ) if bb is not None else None,
+			}
+			det_items.append(item)
+		# Ưu tiên theo box có độ tự tin cao nhất giữa dog/cat
+		best_species = None
+		best_conf = -1.0
+		if r['conf']:
+			for lab, conf in zip(labels, r['conf']):
+				if lab in ('dog', 'cat') and conf > best_conf:
+					best_species = lab
+					best_conf = conf
+		# Nếu không có conf thì chỉ cần thấy có dog/cat là chọn
+		if best_species is None:
+			if 'dog' in labels:
+				best_species = 'dog'
+			elif 'cat' in labels:
+				best_species = 'cat'
+		if best_species is not None:
+			det_label = 'Dog' if best_species == 'dog' else 'Cat'
+	return det_label, det_items
+
+
+def _overlay_boxes(det_items: list[dict]) -> list[dict]:
+	"""Box dog/cat (toạ độ ảnh gốc) để client vẽ overlay lên ảnh gốc (static/js/script.js)."""
+	return [
+		{
+			'label': it['label'],
+			'conf': round(float(it['conf']), 4) if it.get('conf') is not None else None,
+			'bbox': [round(float(v), 1) for v in it['bbox']],
+		}
+		for it in det_items
+		if it.get('bbox') and it.get('label') in ('dog', 'cat')
+	]
+
+
+def _segment(frame: ImageFrame) -> list[dict]:
+	"""Chạy seg_model, trả về mask đã mã hoá (mask_codec.encode_masks, toạ độ ảnh gốc)."""
+	r = seg_queue.submit(frame.letterbox(YOLO_IMGSZ))
+	return encode_masks(r, frame, YOLO_IMGSZ, MASK_FORMAT)
+
+
+def _detect_and_segment(frame: ImageFrame) -> tuple[str, list[dict], list[dict]]:
+	"""Chế độ 1 lượt: chỉ seg_model, trả về (nhãn loài, detection, mask đã mã hoá) như 2 bước riêng."""
+	r = seg_queue.submit(frame.letterbox(YOLO_IMGSZ))
+	det_label, det_items = _parse_species(frame, r)
+	return det_label, det_items, encode_masks(r, frame, YOLO_IMGSZ, MASK_FORMAT)
+
+
+def _dog_boxes(det_items: list[dict]) -> list[dict]:
+	"""Các box chó đủ tin cậy (>= DOG_THRESHOLD) theo conf giảm dần: mỗi box là 1 con chó cần suy luận giống."""
+	dogs = [
+		it for it in det_items
+		if it.get('label') == 'dog' and it.get('bbox') and (it.get('conf') or 0.0) >= DOG_THRESHOLD
+	]
+	return sorted(dogs, key=lambda it: -(it.get('conf') or 0.0))
+
+
+def _predict_breed(frame: ImageFrame, det_items: list[dict]) -> list[dict]:
+	"""Chạy breed_model trên crop (có nới biên) của từng con chó, tất cả crop trong 1 lần gọi batch.
+
+	Trả về list theo thứ tự conf chó giảm dần, mỗi phần tử:
+	{bbox, det_conf, breed, breed_conf, model_version}. Không có bbox chó thì dùng cả ảnh.
+	"""
+	dogs = _dog_boxes(det_items)
+	if dogs:
+		crops = [frame.crop(d['bbox'], BREED_CROP_PAD) for d in dogs]
+	else:
+		dogs = [{'bbox': None, 'conf': None}]
+		crops = [frame]
+	results = breed_queue.submit_many([c.letterbox(BREED_IMGSZ) for c in crops])
+	out = []
+	for dog, br in zip(dogs, results):
+		breed_name = None
+		breed_conf = None
+		names = br['names']
+		# lấy box có conf cao nhất trong crop
+		confs = br['conf']
+		cls = br['cls']
+		if confs and cls and len(confs) == len(cls):
+			best_i = max(range(len(confs)), key=lambda i: confs[i])
+			breed_name = names.get(int(cls[best_i]), None)
+			breed_conf = confs[best_i]
+		out.append({
+			'bbox': dog['bbox'],
+			'det_conf': dog['conf'],
+			'breed': breed_name,
+			'breed_conf': breed_conf,
+			'model_version': br.get('model_version'),
+		})
+	return out
+
+
+def _breed_available() -> bool:
+	"""Có breed model dùng được: trên model server, hoặc nạp được trong tiến trình."""
+	if breed_queue is None:
+		return False
+	return model_client is not None or breed_model.get() is not None
+
+
+def _cascade_rejects(frame: ImageFrame) -> bool:
+	"""Tầng lọc rẻ trước YOLO: True nếu species SVM chắc chắn ảnh không phải chó."""
+	t0 = time.perf_counter()
+	try:
+		margin = predictor.get().dog_margin(frame)
+	except Exception as e:
+		print("[CASCADE] error:", e)
+		margin = None
+	rejected = margin is not None and margin <= -CASCADE_MARGIN
+	with _cascade_lock:
+		_cascade_counts["checked"] += 1
+		_cascade_counts["total_ms"] += (time.perf_counter() - t0) * 1000.0
+		if margin is None:
+			_cascade_counts["unavailable"] += 1
+		elif rejected:
+			_cascade_counts["rejected"] += 1
+	return rejected
+
+
+def cascade_stats() -> dict:
+	with _cascade_lock:
+		counts = dict(_cascade_counts)
+	checked = counts.pop("checked")
+	total_ms = counts.pop("total_ms")
+	return {
+		"enabled": CASCADE_ENABLED,
+		"margin": CASCADE_MARGIN,
+		"checked": checked,
+		**counts,
+		"reject_rate": round(counts["rejected"] / checked, 4) if checked else 0.0,
+		"mean_ms": round(total_ms / checked, 2) if checked else 0.0,
+	}
+
+
+def _detect_stage(state: dict):
+	"""(nhãn loài, detection, mask đã mã hoá | None); chế độ 1 lượt có luôn mask từ seg_model."""
+	frame = state["frame"]
+	if SINGLE_PASS:
+		return _detect_and_segment(frame)
+	det_label, det_items = _detect_species(frame)
+	return det_label, det_items, None
+
+
+def _gate_stage(state: dict) -> dict:
+	"""Gate chó: conf của box loài đã chọn, và đã đủ >= DOG_THRESHOLD để suy luận giống chưa."""
+	det_label, det_items, _ = state["detect"]
+	yolo_conf = None
+	if det_label in ["Dog", "Cat"] and det_items:
+		for item in det_items:
+			if (det_label == "Dog" and item["label"] == "dog") or (det_label == "Cat" and item["label"] == "cat"):
+				yolo_conf = item["conf"]
+				break
+	is_dog_enough = (det_label == "Dog") and (yolo_conf is not None) and (float(yolo_conf) >= DOG_THRESHOLD)
+	return {"yolo_conf": yolo_conf, "is_dog_enough": is_dog_enough}
+
+
+def _has_breed(state: dict) -> bool:
+	primary = (state.get("breed") or [{}])[0]
+	return bool(primary.get("breed"))
+
+
+# Đồ thị stage của pipeline. Bỏ qua những gì sẽ không được hiển thị/lưu:
+# - ảnh bị cascade loại: không chạy YOLO;
+# - không qua gate chó: không chạy segment / breed / HOG+SVM (trang kết quả chỉ hiện ghi chú);
+# - có giống từ breed model: không chạy HOG+SVM (chỉ là phương án dự phòng; breed lỗi / không có
+#   breed model thì HOG+SVM vẫn chạy);
+# - segment là stage optional, bật theo request (masks=1), theo gói (SEGMENT_PLANS) hoặc admin.
+pipeline = StageGraph([
+	Stage("cascade", lambda st: _cascade_rejects(st["frame"]), when=lambda st: CASCADE_ENABLED),
+	Stage("detect", _detect_stage, when=lambda st: not st.get("cascade"), fallback=("Unknown", [], None)),
+	Stage("gate", _gate_stage, requires=("detect",)),
+	Stage(
+		"segment", lambda st: _segment(st["frame"]), requires=("gate",), optional=True,
+		when=lambda st: st["gate"]["is_dog_enough"] and not SINGLE_PASS,
+	),
+	Stage(
+		"breed", lambda st: _predict_breed(st["frame"], st["detect"][1]), requires=("gate",),
+		when=lambda st: st["gate"]["is_dog_enough"] and _breed_available(), fallback=[],
+	),
+	Stage(
+		"hog", lambda st: predictor.get().predict(st["frame"]), requires=("gate", "breed"), may_skip=("breed",),
+		when=lambda st: st["gate"]["is_dog_enough"] and not _has_breed(st),
+	),
+], observer=lambda name, status, seconds: STAGE_SECONDS.observe(seconds, stage=name))
+
+
+def _run_pipeline(frame: ImageFrame, stages: frozenset = frozenset()) -> dict:
+	"""Chạy đồ thị stage cho 1 ảnh, trả về dict thuần (cache được).
+
+	Gồm: det_label, det_items, yolo_conf, seg_masks (mask đã mã hoá), image_size [w, h],
+	result (giống từ YOLO, hoặc HOG+SVM nếu không có breed model),
+	is_dog_enough (đã qua gate chó >= DOG_THRESHOLD hay chưa), dog_breeds (giống từng con chó),
+	gate_outcome (pass / fail / cascade),
+	model_version (phiên bản breed model đã cho ra giống, None nếu dùng HOG+SVM), stages (trace
+	các stage đã chạy / bỏ qua) và degraded (có stage lỗi, không nên cache).
+	`stages`: các stage optional được bật (vd. {"segment"}).
+	"""
+	state: dict = {"frame": frame}
+	trace = pipeline.run(state, stages)
+	degraded = any(t["status"] == "error" for t in trace)
+
+	det_label, det_items, seg_masks = state.get("detect") or ("Unknown", [], None)
+	if state.get("segment") is not None:
+		seg_masks = state["segment"]
+	gate = state.get("gate") or {"yolo_conf": None, "is_dog_enough": False}
+	yolo_conf = gate["yolo_conf"]
+	is_dog_enough = gate["is_dog_enough"]
+	gate_outcome = "cascade" if state.get("cascade") else ("pass" if is_dog_enough else "fail")
+	DOG_GATE.inc(outcome=gate_outcome)
+	dog_breeds = state.get("breed") or []
+	model_version = None
+
+	if not is_dog_enough:
+		# Không phải chó / hoặc độ tin cậy thấp -> không suy luận giống
+		if det_label != "Dog":
+			note = "Ảnh này không được nhận diện là CHÓ. Vui lòng tải ảnh có chó rõ ràng để nhận diện giống."
+		else:
+			pct = int(round(float(yolo_conf or 0) * 100))
+			note = f"Độ tin cậy CHÓ chỉ {pct}% (< 75%). Vui lòng tải ảnh rõ hơn để nhận diện giống."
+		result = {"breed": "Không xác định", "breed_conf": 0.0, "note": note}
+	elif _has_breed(state):
+		# Giống hiển thị chính = con chó có conf phát hiện cao nhất
+		primary = dog_breeds[0]
+		result = {"breed": primary["breed"], "breed_conf": primary["breed_conf"]}
+		model_version = primary["model_version"]
+	else:
+		# Không có breed model (hoặc không ra giống): dùng kết quả HOG+SVM
+		result = state.get("hog") or {"breed": "Unknown"}
+
+	return {
+		"det_label": det_label,
+		"det_items": det_items,
+		"yolo_conf": yolo_conf,
+		"seg_masks": seg_masks,
+		"image_size": [frame.width, frame.height],
+		"result": result,
+		"is_dog_enough": is_dog_enough,
+		"gate_outcome": gate_outcome,
+		"dog_breeds": dog_breeds,
+		"model_version": model_version,
+		"stages": trace,
+		"degraded": degraded,
+	}
+
+
+@contextmanager
+def _timed(stage: str, stage_ms: dict | None = None):
+	"""Đo khối `with`: ghi histogram /metrics và (nếu có) stage_ms[stage] (ms) cho prediction_timings."""
+	t0 = time.perf_counter()
+	try:
+		yield
+	finally:
+		elapsed = time.perf_counter() - t0
+		STAGE_SECONDS.observe(elapsed, stage=stage)
+		if stage_ms is not None:
+			stage_ms[stage] = round(elapsed * 1000.0, 2)
+
+
+def _model_versions() -> dict:
+	return {m.name: m.version for m in (det_model, seg_model, breed_model) if m is not None}
+
+
+def _save_timings(conn, user_id: int, prediction_id: int | None, out: dict, stage_ms: dict,
+				  cache_hit: bool, timing: dict | None) -> None:
+	"""1 dòng prediction_timings: thời gian các stage + phiên bản mô hình + kích thước ảnh + cache/gate."""
+	timing = timing or {}
+	t0 = timing.get("t0")
+	total_ms = (time.perf_counter() - t0) * 1000.0 if t0 is not None else sum(stage_ms.values())
+	try:
+		PredictionTimings.save(
+			conn,
+			user_id,
+			{**stage_ms, "total": round(total_ms, 2)},
+			total_ms,
+			prediction_id=prediction_id,
+			model_versions=_model_versions(),
+			size=timing.get("size"),
+			work_size=out.get("image_size"),
+			cache_hit=cache_hit,
+			gate=out.get("gate_outcome") or ("pass" if out["is_dog_enough"] else "fail"),
+			mode=timing.get("mode"),
+		)
+	except Exception as e:
+		print(f"[TIMINGS] save error: {e}")
+
+
+def _process_upload(save_path: str, user_id: int, digest: str | None = None,
+					frame: ImageFrame | None = None, stages: frozenset = frozenset(),
+					timing: dict | None = None) -> dict | None:
+	"""Suy luận + lưu lịch sử cho 1 ảnh đã lưu. Không dùng request/session
+	nên chạy được cả trong request lẫn trên worker nền (job bất đồng bộ).
+
+	digest: SHA-256 ảnh nếu đã có sẵn (kho ảnh theo nội dung) để khỏi hash lại.
+	frame: ảnh đã giải mã lúc ingest (độ phân giải làm việc) để khỏi giải mã lại.
+	stages: stage optional được bật cho request (_optional_stages), là một phần của cache key.
+	timing: thời gian đo trong request trước khi gọi hàm này, cho prediction_timings:
+	{"t0": perf_counter lúc nhận request, "stages": {tên: ms}, "size": [w, h] ảnh gốc, "mode": "sync"|"async"}.
+
+	Trả về context để render predict.html, hoặc None nếu không đọc được ảnh.
+	"""
+	# Cache theo nội dung ảnh + phiên bản trọng số: ảnh trùng thì bỏ qua toàn bộ suy luận
+	cache_key = None
+	if result_cache.enabled:
+		try:
+			cache_key = ResultCache.make_key(
+				digest or sha256_file(save_path), f"{_model_fingerprint()};stages={','.join(sorted(stages))}"
+			)
+		except OSError as e:
+			print("[CACHE] hash error:", e)
+	out = result_cache.get(cache_key) if cache_key else None
+	cache_hit = out is not None
+	if cache_key:
+		CACHE_LOOKUPS.inc(result="hit" if cache_hit else "miss")
+	if out is None:
+		# Giải mã ảnh đúng 1 lần, mọi bước phía sau dùng chung frame này
+		if frame is None:
+			frame = ImageFrame.from_path(save_path)
+		if frame is None:
+			return None
+		out = _run_pipeline(frame, stages)
+		if cache_key and not out["degraded"]:
+			result_cache.set(cache_key, out)
+
+	# Thời gian từng stage cho prediction_timings: các bước trong request + các stage pipeline đã chạy
+	stage_ms = dict((timing or {}).get("stages") or {})
+	if not cache_hit:
+		stage_ms.update({t["stage"]: t["ms"] for t in out.get("stages", []) if "ms" in t})
+
+	det_label = out["det_label"]
+	result = out["result"]
+	# Không vẽ/ghi ảnh _det nữa: chỉ trả box JSON, trình duyệt vẽ overlay lên ảnh gốc
+	image_path = save_path.replace("\\", "/")
+	with _timed("annotate", stage_ms):
+		boxes = _overlay_boxes(out["det_items"])
+		# Thumbnail cho lịch sử/dashboard: tạo luôn từ ảnh đã giải mã (cache hit thì để route tạo lười)
+		if out["is_dog_enough"] and frame is not None:
+			generate_thumbnails(save_path, frame.bgr)
+		if MASK_PERSIST and out["seg_masks"] and out.get("image_size"):
+			try:
+				save_masks(save_path, out["seg_masks"], *out["image_size"])
+			except OSError as e:
+				print("[MASK] save error:", e)
+
+	# Lưu vào database: lịch sử chỉ khi đã pass gate chó >= 75%, thời gian thì mọi lần nhận diện
+	conn = None
+	if user_id is not None and (out["is_dog_enough"] or RECORD_TIMINGS):
+		try:
+			with _timed("db_connect", stage_ms):
+				conn = get_connection()
+		except Exception as e:
+			print(f"Warning: Could not save to history: {e}")
+	try:
+		prediction_id = None
+		if out["is_dog_enough"] and conn is not None:
+			with _timed("history_save", stage_ms):
+				try:
+					breed_to_save = result.get('breed', 'Unknown') if isinstance(result, dict) else 'Unknown'
+					conf_to_save = result.get('breed_conf', 0.0) if isinstance(result, dict) else 0.0
+					prediction_id = PredictionHistory.save(
+						conn, 
+						user_id,
+						image_path,
+						breed_to_save,
+						float(conf_to_save) if conf_to_save else 0.0,
+						det_label,
+						model_version=out.get("model_version"),
+						detections={"size": out.get("image_size"), "boxes": boxes},
+					)
+				except Exception as e:
+					print(f"Warning: Could not save to history: {e}")
+		if RECORD_TIMINGS and conn is not None:
+			_save_timings(conn, user_id, prediction_id, out, stage_ms, cache_hit, timing)
+	finally:
+		if conn is not None:
+			conn.close()
+
+	return {
+		"image_path": image_path,
+		"result": result,
+		"yolo_species": det_label,
+		"yolo_species_conf": out["yolo_conf"],
+		"yolo_detections": out["det_items"],
+		"yolo_breeds": out.get("dog_breeds") or [],
+		"yolo_masks": out["seg_masks"] or [],
+		"image_size": out.get("image_size"),
+		# Dữ liệu cho overlay canvas phía client (data-overlay trên thẻ <img>)
+		"overlay": {"size": out.get("image_size"), "boxes": boxes, "masks": out["seg_masks"] or []},
+		# Stage đã chạy cho request này (cache hit: không stage nào chạy)
+		"stages": [] if cache_hit else out.get("stages", []),
+		"cache_hit": cache_hit,
+	}
+
+
+def _render_prediction(ctx: dict):
+	result = ctx.get("result")
+	note = result.get("note") if isinstance(result, dict) else None
+	if note:
+		# Không phải chó / hoặc độ tin cậy thấp -> không suy luận giống, không lưu lịch sử
+		flash(note, "warning")
+	return render_template("predict.html", **ctx)
+
+
+def _wants_async() -> bool:
+	"""Chế độ bất đồng bộ: bật toàn cục bằng PREDICT_ASYNC hoặc từng request bằng field/param async=1."""
+	if current_app.config.get("PREDICT_ASYNC"):
+		return True
+	return (request.form.get("async") or request.args.get("async") or "") in ("1", "true")
+
+
+def _optional_stages() -> frozenset:
+	"""Stage optional bật cho request hiện tại: admin bật hết; gói trong SEGMENT_PLANS hoặc
+	field/param masks=1 thì bật segment (mask phân đoạn)."""
+	if session.get("role") == "admin":
+		return frozenset(pipeline.optional)
+	enabled = set()
+	plan = getattr(g, "user_plan", None)
+	if plan in SEGMENT_PLANS or (request.form.get("masks") or request.args.get("masks") or "") in ("1", "true", "on"):
+		enabled.add("segment")
+	return frozenset(enabled)
+
+
+def _quota_gate(user_id: int):
+	"""Kiểm tra quota (chỉ role=user). Trả về redirect nếu bị chặn, None nếu được nhận diện."""
+	try:
+		role = session.get("role", "user")
+		if role == "user":
+			conn_q = get_connection()
+			try:
+				quota = UserQuota.get_or_create(conn_q, user_id)
+				g.user_plan = quota.get("plan")
+				# Gói trả phí: bỏ qua giới hạn/ads
+				if quota.get("plan") == "free":
+					total_predictions = PredictionHistory.count_by_user(conn_q, user_id)
+					if int(total_predictions or 0) >= UserQuota.FREE_PREDICTIONS:
+						# hết free -> cần unlock từ quảng cáo
+						if int(quota.get("ad_unlocks_remaining", 0)) <= 0:
+							if int(quota.get("ad_views_used", 0)) >= UserQuota.MAX_AD_VIEWS:
+								flash("Bạn đã dùng hết 10 lượt miễn phí và 3 lượt xem quảng cáo. Vui lòng mua gói để tiếp tục.", "warning")
+								return redirect(url_for("predict.upgrade"))
+							flash("Bạn đã dùng hết 10 lượt miễn phí. Vui lòng xem quảng cáo để mở khóa thêm.", "info")
+							return redirect(url_for("predict.watch_ad"))
+						# Consume 1 unlock cho lần nhận diện này
+						if not UserQuota.consume_ad_unlock(conn_q, user_id):
+							flash("Vui lòng xem quảng cáo để mở khóa thêm lượt nhận diện.", "info")
+							return redirect(url_for("predict.watch_ad"))
+			finally:
+				conn_q.close()
+	except Exception as e:
+		print("[QUOTA] gate error:", e)
+	return None
+
+
 @predict_bp.route("/upload", methods=["POST"])
 def upload():
+	t_start = time.perf_counter()
 	# Bắt buộc đăng nhập mới được sử dụng chức năng này
 	user_id = _get_session_user_id()
 	if user_id is None:
 		flash("Vui lòng đăng nhập để sử dụng chức năng này.", "warning")
 		return redirect(url_for("login.login"))
 
+	# ingest = đọc body multipart (hash + giới hạn dung lượng) + probe header + giải mã
+	t_ingest = time.perf_counter()
+	timing = {"t0": t_start, "stages": {}, "mode": "sync"}
 	if "image" not in request.files:
 		flash("Không tìm thấy file ảnh.", "error")
 		return redirect(url_for("home.index"))
@@ -451,213 +1065,127 @@ def upload():
 		flash("Tên file không hợp lệ.", "error")
 		return redirect(url_for("home.index"))
 	if file and allowed_file(fname):
-		filename = secure_filename(fname)
-		upload_dir = current_app.config.get("UPLOAD_FOLDER")
-		if not upload_dir:
-			upload_dir = os.path.join("static", "uploads")
-			os.makedirs(upload_dir, exist_ok=True)
-		save_path = os.path.join(upload_dir, filename)
-
-		# --- Quota gate (only for role=user) ---
+		upload_dir = current_app.config.get("UPLOAD_FOLDER") or UPLOAD_ROOT
+		# Body đã được hash + giới hạn dung lượng lúc đọc (IngestRequest); kiểm tra header ảnh
+		# trước quota gate, chỉ ghi vào kho khi mọi bước đều qua
 		try:
-			role = session.get("role", "user")
-			if role == "user":
-				conn_q = get_connection()
-				try:
-					quota = UserQuota.get_or_create(conn_q, user_id)
-					# Gói trả phí: bỏ qua giới hạn/ads
-					if quota.get("plan") == "free":
-						total_predictions = PredictionHistory.count_by_user(conn_q, user_id)
-						if int(total_predictions or 0) >= UserQuota.FREE_PREDICTIONS:
-							# hết free -> cần unlock từ quảng cáo
-							if int(quota.get("ad_unlocks_remaining", 0)) <= 0:
-								if int(quota.get("ad_views_used", 0)) >= UserQuota.MAX_AD_VIEWS:
-									flash("Bạn đã dùng hết 10 lượt miễn phí và 3 lượt xem quảng cáo. Vui lòng mua gói để tiếp tục.", "warning")
-									return redirect(url_for("predict.upgrade"))
-								flash("Bạn đã dùng hết 10 lượt miễn phí. Vui lòng xem quảng cáo để mở khóa thêm.", "info")
-								return redirect(url_for("predict.watch_ad"))
-							# Consume 1 unlock cho lần nhận diện này
-							if not UserQuota.consume_ad_unlock(conn_q, user_id):
-								flash("Vui lòng xem quảng cáo để mở khóa thêm lượt nhận diện.", "info")
-								return redirect(url_for("predict.watch_ad"))
-				finally:
-					conn_q.close()
-		except Exception as e:
-			print("[QUOTA] gate error:", e)
-
-		file.save(save_path)
-
-
-		# --- YOLOv8 inference ---
-		# Lưu ý: mô hình detect (yolov8n.pt) không có probs.top1 như mô hình classify.
-		# Thay vào đó dùng boxes.cls để lấy class id, map sang tên và chọn 'dog' hoặc 'cat' nếu có.
+			incoming = ingest_upload(file, current_app.config.get("MAX_CONTENT_LENGTH") or MAX_UPLOAD_BYTES)
+		except UploadRejected as e:
+			UPLOADS.inc(outcome="rejected")
+			flash(str(e), "error")
+			return redirect(url_for("predict.upload_page"))
+		elapsed = time.perf_counter() - t_ingest
+		STAGE_SECONDS.observe(elapsed, stage="ingest")
+		timing["stages"]["ingest"] = round(elapsed * 1000.0, 2)
+		timing["size"] = [incoming.width, incoming.height]
+
+		with _timed("quota_gate", timing["stages"]):
+			blocked = _quota_gate(user_id)
+		if blocked is not None:
+			UPLOADS.inc(outcome="quota_blocked")
+			incoming.discard()
+			return blocked
+
+		# Lưu theo nội dung (static/uploads/ab/cd/<sha256>.jpg): ảnh trùng chỉ lưu 1 bản
 		try:
-			det_results = det_model(save_path)
-			r = det_results[0]
-			names = getattr(r, 'names', {}) or {}
-			det_label = 'Unknown'
-			det_items = []
-			if hasattr(r, 'boxes') and r.boxes is not None and getattr(r.boxes, 'cls', None) is not None:
-				cls_list = r.boxes.cls.tolist()
-				# Trường hợp chỉ 1 phần tử có thể là float -> chuyển về list
-				if not isinstance(cls_list, list):
-					cls_list = [cls_list]
-				labels = []
-				for ci in cls_list:
-					try:
-						labels.append(names[int(ci)])
-					except Exception:
-						continue
-				# Lấy conf và bbox nếu có để hiển thị chi tiết
-				confs = r.boxes.conf.tolist() if getattr(r.boxes, 'conf', None) is not None else [None] * len(labels)
-				xyxy = r.boxes.xyxy.tolist() if getattr(r.boxes, 'xyxy', None) is not None else [None] * len(labels)
-				for lab, cf, bb in zip(labels, confs, xyxy):
-					item = {
-						'label': lab,
-						'conf': float(cf) if cf is not None else None,
-						'bbox': bb,
-					}
-					det_items.append(item)
-				# Ưu tiên theo box có độ tự tin cao nhất giữa dog/cat
-				best_species = None
-				best_conf = -1.0
-				if hasattr(r.boxes, 'conf') and r.boxes.conf is not None:
-					confs = r.boxes.conf.tolist()
-					for lab, conf in zip(labels, confs):
-						if lab in ('dog', 'cat') and conf > best_conf:
-							best_species = lab
-							best_conf = conf
-				# Nếu không có conf thì chỉ cần thấy có dog/cat là chọn
-				if best_species is None:
-					if 'dog' in labels:
-						best_species = 'dog'
-					elif 'cat' in labels:
-						best_species = 'cat'
-				if best_species is not None:
-					det_label = 'Dog' if best_species == 'dog' else 'Cat'
-
-			# Vẽ bbox lên ảnh (chỉ cho dog/cat) nếu có bbox
-			annotated_path = save_path
-			try:
-				if det_items:
-					img = cv2.imread(save_path)
-					for it in det_items:
-						bb = it.get('bbox')
-						lab = it.get('label')
-						if not bb or lab not in ('dog', 'cat'):
-							continue
-						x1, y1, x2, y2 = [int(v) for v in bb]
-						color = (255, 128, 0) if lab == 'dog' else (0, 165, 255)  # BGR: dog=blue-ish, cat=orange
-						cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
-						conf_txt = f"{int(round((it.get('conf') or 0)*100))}%"
-						label_txt = f"{lab.upper()} {conf_txt if it.get('conf') is not None else ''}"
-						# Draw label background
-						(tw, th), _ = cv2.getTextSize(label_txt, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-						cv2.rectangle(img, (x1, max(y1- th - 6, 0)), (x1 + tw + 6, y1), color, -1)
-						cv2.putText(img, label_txt, (x1+3, y1-6), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2, cv2.LINE_AA)
-					# Lưu ảnh annotate cạnh file gốc
-					base, ext = os.path.splitext(save_path)
-					annotated_path = f"{base}_det{ext}"
-					cv2.imwrite(annotated_path, img)
-			except Exception as _:
-				annotated_path = save_path
-
-		except Exception as e:
-			print("YOLO detect error:", e)
-			det_label = 'Unknown'
-			det_items = []
-			annotated_path = save_path
+			with _timed("store", timing["stages"]):
+				stored = incoming.commit(upload_dir)
+		except OSError as e:
+			UPLOADS.inc(outcome="store_error")
+			print("[STORE] save error:", e)
+			flash("Không thể lưu ảnh. Vui lòng thử lại.", "error")
+			return redirect(url_for("predict.upload_page"))
+		save_path = stored.path
+		stages = _optional_stages()
 
-		try:
-			seg_results = seg_model(save_path)
-			seg_masks = seg_results[0].masks.data.cpu().numpy() if hasattr(seg_results[0], 'masks') and seg_results[0].masks is not None else None
-		except Exception as e:
-			print("YOLO seg error:", e)
-			seg_masks = None
-
-		# Kết quả cũ (HOG+SVM)
-		result = predictor.predict(save_path)
-
-		# Tìm confidence của loài YOLOv8 (dog/cat) để hiển thị
-		yolo_conf = None
-		if det_label in ["Dog", "Cat"] and det_items:
-			for item in det_items:
-				if (det_label == "Dog" and item["label"] == "dog") or (det_label == "Cat" and item["label"] == "cat"):
-					yolo_conf = item["conf"]
-					break
-
-		# Gate: chỉ khi xác nhận là chó >= 75% mới bắt đầu suy luận giống
-		DOG_THRESHOLD = 0.75
-		is_dog_enough = (det_label == "Dog") and (yolo_conf is not None) and (float(yolo_conf) >= DOG_THRESHOLD)
-		if not is_dog_enough:
-			# Không phải chó / hoặc độ tin cậy thấp -> không suy luận giống
-			note = None
-			if det_label != "Dog":
-				note = "Ảnh này không được nhận diện là CHÓ. Vui lòng tải ảnh có chó rõ ràng để nhận diện giống."
-			else:
-				pct = int(round(float(yolo_conf or 0) * 100))
-				note = f"Độ tin cậy CHÓ chỉ {pct}% (< 75%). Vui lòng tải ảnh rõ hơn để nhận diện giống."
-			flash(note, "warning")
-			return render_template(
-				"predict.html",
-				image_path=annotated_path.replace("\\", "/"),
-				result={"breed": "Không xác định", "breed_conf": 0.0, "note": note},
-				yolo_species=det_label,
-				yolo_species_conf=yolo_conf,
-				yolo_detections=det_items,
-				yolo_masks=seg_masks,
+		if _wants_async():
+			timing["mode"] = "async"
+			job_id = job_manager.submit(
+				user_id, _process_upload, save_path, user_id, stored.sha256, incoming.frame, stages, timing
 			)
-
-		# Nếu có YOLO breed model, suy luận giống từ đó và ghi đè result.breed
-		if breed_model is not None:
-			try:
-				br = breed_model(save_path)[0]
-				breed_name = None
-				breed_conf = None
-				if hasattr(br, 'boxes') and br.boxes is not None:
-					names = getattr(br, 'names', {}) or {}
-					# lấy box có conf cao nhất
-					confs = br.boxes.conf.tolist() if getattr(br.boxes, 'conf', None) is not None else []
-					cls = br.boxes.cls.tolist() if getattr(br.boxes, 'cls', None) is not None else []
-					if confs and cls and len(confs) == len(cls):
-						best_i = max(range(len(confs)), key=lambda i: confs[i])
-						breed_name = names.get(int(cls[best_i]), None)
-						breed_conf = confs[best_i]
-				if breed_name:
-					# override breed in result
-					if isinstance(result, dict):
-						result['breed'] = breed_name
-						result['breed_conf'] = breed_conf
-			except Exception as _:
-				pass
-		
-		# Lưu vào database (chỉ khi đã pass gate chó >= 75%)
-		try:
-			if user_id is not None:
-				conn = get_connection()
-				breed_to_save = result.get('breed', 'Unknown') if isinstance(result, dict) else 'Unknown'
-				conf_to_save = result.get('breed_conf', 0.0) if isinstance(result, dict) else 0.0
-				PredictionHistory.save(
-					conn, 
-					user_id,
-					annotated_path.replace("\\", "/"),
-					breed_to_save,
-					float(conf_to_save) if conf_to_save else 0.0,
-					det_label
-				)
-				conn.close()
-		except Exception as e:
-			print(f"Warning: Could not save to history: {e}")
-		
-		return render_template(
-			"predict.html",
-			image_path=annotated_path.replace("\\", "/"),
-			result=result,
-			yolo_species=det_label,
-			yolo_species_conf=yolo_conf,
-			yolo_detections=det_items,
-			yolo_masks=seg_masks,
-		)
+			if job_id is None:
+				UPLOADS.inc(outcome="busy")
+				flash("Hệ thống đang bận, vui lòng thử lại sau ít phút.", "warning")
+				return redirect(url_for("predict.upload_page"))
+			UPLOADS.inc(outcome="queued")
+			UPLOAD_SECONDS.observe(time.perf_counter() - t_start, mode="async")
+			if request.accept_mimetypes.best == "application/json":
+				return jsonify({
+					"job_id": job_id,
+					"status_url": url_for("predict.job_status", job_id=job_id),
+					"result_url": url_for("predict.job_result", job_id=job_id),
+				}), 202
+			return redirect(url_for("predict.job_page", job_id=job_id))
+
+		ctx = _process_upload(save_path, user_id, stored.sha256, incoming.frame, stages, timing)
+		if ctx is None:
+			UPLOADS.inc(outcome="unreadable")
+			flash("Không thể đọc ảnh. Vui lòng thử lại với ảnh khác.", "error")
+			return redirect(url_for("predict.upload_page"))
+		UPLOADS.inc(outcome="done")
+		UPLOAD_SECONDS.observe(time.perf_counter() - t_start, mode="sync")
+		return _render_prediction(ctx)
 
 	flash("Định dạng file không được hỗ trợ.", "error")
 	return redirect(url_for("home.index"))
+
+
+@predict_bp.route("/jobs/<job_id>", methods=["GET"])
+def job_page(job_id: str):
+	"""Trang chờ job; khi job xong thì render predict.html từ kết quả của job."""
+	user_id = _get_session_user_id()
+	if user_id is None:
+		flash("Vui lòng đăng nhập để sử dụng chức năng này.", "warning")
+		return redirect(url_for("login.login"))
+	job = job_manager.get(job_id, owner_id=user_id)
+	if job is None:
+		# Job chỉ nằm trong RAM: worker khởi động lại / job hết hạn thì không còn
+		flash("Không tìm thấy yêu cầu nhận diện (có thể đã hết hạn). Vui lòng tải ảnh lên lại.", "warning")
+		return redirect(url_for("predict.upload_page"))
+	if job["status"] == "error" or (job["status"] == "done" and job["result"] is None):
+		flash("Không thể xử lý ảnh. Vui lòng thử lại với ảnh khác.", "error")
+		return redirect(url_for("predict.upload_page"))
+	if job["status"] == "done":
+		return _render_prediction(job["result"])
+	return render_template(
+		"job_pending.html",
+		job_id=job_id,
+		status=job["status"],
+		status_url=url_for("predict.job_status", job_id=job_id),
+	)
+
+
+@predict_bp.route("/jobs/<job_id>/status", methods=["GET"])
+def job_status(job_id: str):
+	user_id = _get_session_user_id()
+	if user_id is None:
+		return jsonify({"error": "Not authenticated"}), 401
+	job = job_manager.get(job_id, owner_id=user_id)
+	if job is None:
+		return jsonify({"error": "Job not found"}), 404
+	return jsonify({
+		"job_id": job_id,
+		"status": job["status"],
+		"error": job["error"],
+		"result_url": url_for("predict.job_result", job_id=job_id) if job["status"] == "done" else None,
+	})
+
+
+@predict_bp.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id: str):
+	"""Kết quả job dạng JSON (mask dạng polygon/RLE theo toạ độ ảnh gốc)."""
+	user_id = _get_session_user_id()
+	if user_id is None:
+		return jsonify({"error": "Not authenticated"}), 401
+	job = job_manager.get(job_id, owner_id=user_id)
+	if job is None:
+		return jsonify({"error": "Job not found"}), 404
+	if job["status"] != "done":
+		return jsonify({"job_id": job_id, "status": job["status"], "error": job["error"]}), 409
+	ctx = job["result"]
+	if ctx is None:
+		return jsonify({"job_id": job_id, "status": "error", "error": "Không thể đọc ảnh."}), 422
+	# overlay chỉ gom lại các trường đã có (box + mask) cho template
+	payload = {k: v for k, v in ctx.items() if k != "overlay"}
+	payload["mask_count"] = len(ctx.get("yolo_masks") or [])
+	return jsonify({"job_id": job_id, "status": "done", "result": payload})
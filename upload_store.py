@@ -0,0 +1,364 @@
+# upload_store.py
+# Lưu ảnh upload theo nội dung (content-addressed): static/uploads/ab/cd/<sha256>.<ext>
+#
+# - Ảnh giống hệt nhau (kể cả của nhiều user) chỉ lưu 1 bản; tên file gốc không còn ghi đè nhau.
+# - Chia thư mục 2 cấp theo hash để mỗi thư mục chỉ vài chục file (liệt kê / backup nhanh).
+# - Đếm tham chiếu từ prediction_history: chỉ xoá file khi không còn bản ghi nào trỏ tới.
+# - Ingest: body request được hash + giới hạn dung lượng ngay lúc đọc, header ảnh được kiểm tra
+#   (định dạng, số pixel, EXIF orientation) rồi giải mã ở độ phân giải làm việc; chỉ ghi vào kho
+#   sau khi qua quota gate (IncomingUpload.commit).
+#
+# Usage:
+#   python upload_store.py stats
+#   python upload_store.py gc [--min-age-hours 24]    # xoá ảnh không còn được tham chiếu
+#   python upload_store.py migrate                     # chuyển ảnh cũ (thư mục phẳng) sang dạng shard
+
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from typing import IO, Dict, Iterable, List
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from mask_codec import masks_path_for
+from models import PredictionHistory
+from result_cache import sha256_file
+from thumbnails import delete_thumbnails
+from utils import IMAGE_MAX_SIDE, ImageFrame, decode_image, probe_image
+
+UPLOAD_ROOT = os.path.join("static", "uploads")
+INCOMING_DIR = ".incoming"
+# Giới hạn ingest: byte của file (cũng là MAX_CONTENT_LENGTH của app) và số pixel đọc từ header
+MAX_UPLOAD_BYTES = int(float(os.environ.get("MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", "40000000"))
+# release() không xoá ảnh vừa được ghi / dùng lại (mtime mới hơn khoảng này): upload trùng nội dung
+# của user khác có thể chưa kịp lưu bản ghi lịch sử; để gc() dọn sau
+RELEASE_GRACE_SECONDS = float(os.environ.get("UPLOAD_RELEASE_GRACE_SECONDS", "600"))
+SPOOL_MAX_BYTES = 2 * 1024 * 1024  # ảnh nhỏ hơn nằm hẳn trong RAM tới lúc commit
+INGEST_CHUNK = 256 * 1024
+IMAGE_FORMATS = {"JPEG": ".jpg", "PNG": ".png"}
+_EXT_ALIASES = {".jpeg": ".jpg"}
+
+
+@dataclass
+class StoredUpload:
+	path: str      # đường dẫn dùng trong prediction_history (dấu "/")
+	sha256: str
+	created: bool  # False nếu nội dung đã có sẵn (dedup)
+
+
+def normalize_ext(filename: str) -> str:
+	ext = os.path.splitext(filename)[1].lower()
+	return _EXT_ALIASES.get(ext, ext) or ".jpg"
+
+
+def blob_path(digest: str, ext: str, root: str = UPLOAD_ROOT) -> str:
+	return os.path.join(root, digest[:2], digest[2:4], digest + ext)
+
+
+def is_blob_path(path: str) -> bool:
+	"""Đường dẫn có dạng .../ab/cd/<sha256>.<ext> (đã lưu theo nội dung)?"""
+	parts = path.replace("\\", "/").split("/")
+	if len(parts) < 3:
+		return False
+	name = os.path.splitext(parts[-1])[0]
+	return len(name) == 64 and parts[-3] == name[:2] and parts[-2] == name[2:4]
+
+
+def _commit_file(tmp: str | None, digest: str, ext: str, root: str) -> StoredUpload:
+	dest = blob_path(digest, ext, root)
+	if os.path.exists(dest):
+		if tmp:
+			os.remove(tmp)
+		# Cập nhật mtime để gc không xoá nhầm ảnh vừa được dùng lại nhưng chưa kịp có bản ghi
+		os.utime(dest)
+		created = False
+	else:
+		os.makedirs(os.path.dirname(dest), exist_ok=True)
+		os.replace(tmp, dest)
+		created = True
+	return StoredUpload(dest.replace("\\", "/"), digest, created)
+
+
+class UploadRejected(Exception):
+	"""Upload bị từ chối trước khi lưu (rỗng, không phải ảnh, quá nhiều pixel)."""
+
+
+class HashingSpool(tempfile.SpooledTemporaryFile):
+	"""File tạm (RAM, tràn ra đĩa khi > max_size) nhận phần file của request multipart.
+
+	Werkzeug ghi từng chunk vào đây trong lúc đọc body: hash SHA-256 và đếm byte ngay khi
+	dữ liệu tới, vượt `limit` thì dừng đọc request (413) thay vì nhận hết rồi mới kiểm tra.
+	"""
+
+	def __init__(self, max_size: int, limit: int | None = None):
+		super().__init__(max_size=max_size, mode="w+b")
+		self.limit = limit
+		self.nbytes = 0
+		self._sha = hashlib.sha256()
+
+	def write(self, data) -> int:
+		self.nbytes += len(data)
+		if self.limit and self.nbytes > self.limit:
+			raise RequestEntityTooLarge()
+		self._sha.update(data)
+		return super().write(data)
+
+	def hexdigest(self) -> str:
+		return self._sha.hexdigest()
+
+
+class IngestRequest(Request):
+	"""Request của app: file upload đi thẳng vào HashingSpool (app.request_class)."""
+
+	def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+		# Cùng giới hạn với ingest_upload: MAX_CONTENT_LENGTH của app (đổi được lúc deploy)
+		return HashingSpool(SPOOL_MAX_BYTES, self.max_content_length or MAX_UPLOAD_BYTES)
+
+
+@dataclass
+class IncomingUpload:
+	"""Ảnh đã nhận + kiểm tra header nhưng CHƯA ghi vào kho (chờ quota gate)."""
+	stream: IO[bytes]
+	sha256: str
+	size: int
+	ext: str
+	width: int   # kích thước gốc (đã xoay theo EXIF)
+	height: int
+	frame: ImageFrame  # ảnh đã giải mã ở độ phân giải làm việc
+
+	def commit(self, root: str = UPLOAD_ROOT) -> StoredUpload:
+		"""Ghi vào kho theo nội dung; nội dung đã có thì chỉ trả về file sẵn có."""
+		dest = blob_path(self.sha256, self.ext, root)
+		if os.path.exists(dest):
+			self.discard()
+			stored = _commit_file(None, self.sha256, self.ext, root)
+			self.frame.source = stored.path
+			return stored
+		tmp_dir = os.path.join(root, INCOMING_DIR)
+		os.makedirs(tmp_dir, exist_ok=True)
+		tmp = os.path.join(tmp_dir, uuid.uuid4().hex + ".part")
+		try:
+			self.stream.seek(0)
+			with open(tmp, "wb") as f:
+				shutil.copyfileobj(self.stream, f, INGEST_CHUNK)
+			stored = _commit_file(tmp, self.sha256, self.ext, root)
+			self.frame.source = stored.path
+			return stored
+		except Exception:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+			raise
+		finally:
+			self.discard()
+
+	def discard(self) -> None:
+		try:
+			self.stream.close()
+		except Exception:
+			pass
+
+
+def ingest_upload(file, max_bytes: int = MAX_UPLOAD_BYTES, max_pixels: int = MAX_IMAGE_PIXELS,
+				  max_side: int = IMAGE_MAX_SIDE) -> IncomingUpload:
+	"""Kiểm tra 1 FileStorage trước khi lưu: hash, giới hạn byte, định dạng + số pixel từ header,
+	rồi giải mã (thu nhỏ ngay lúc giải mã, xoay theo EXIF) thành ImageFrame.
+
+	Với IngestRequest, hash/đếm byte đã xong trong lúc đọc request; stream khác (vd. test client
+	không dùng request_class) được đọc lại theo chunk.
+	"""
+	stream = file.stream
+	if isinstance(stream, HashingSpool):
+		digest, size = stream.hexdigest(), stream.nbytes
+	else:
+		sha, size = hashlib.sha256(), 0
+		stream.seek(0)
+		for chunk in iter(lambda: stream.read(INGEST_CHUNK), b""):
+			size += len(chunk)
+			if max_bytes and size > max_bytes:
+				raise RequestEntityTooLarge()
+			sha.update(chunk)
+		digest = sha.hexdigest()
+	if size == 0:
+		raise UploadRejected("File ảnh rỗng.")
+	stream.seek(0)
+	info = probe_image(stream)
+	stream.seek(0)
+	if info is None or info["format"] not in IMAGE_FORMATS:
+		raise UploadRejected("File không phải ảnh JPEG/PNG hợp lệ.")
+	width, height = info["width"], info["height"]
+	if width <= 0 or height <= 0 or (max_pixels and width * height > max_pixels):
+		raise UploadRejected(f"Ảnh quá lớn ({width}x{height}), tối đa {max_pixels / 1_000_000:g} megapixel.")
+	# Giải mã luôn ở độ phân giải làm việc: ảnh hỏng bị loại trước quota gate, và pipeline
+	# dùng lại frame này thay vì đọc + giải mã file lần nữa
+	img = decode_image(stream.read(), max_side, info)
+	stream.seek(0)
+	if img is None:
+		raise UploadRejected("Ảnh bị hỏng hoặc không giải mã được.")
+	return IncomingUpload(stream, digest, size, IMAGE_FORMATS[info["format"]], width, height, ImageFrame(img))
+
+
+def _under_root(path: str, root: str) -> bool:
+	return os.path.abspath(path).startswith(os.path.abspath(root) + os.sep)
+
+
+def _remove_blob(path: str) -> bool:
+	"""Xoá ảnh + thumbnail + mask đi kèm."""
+	try:
+		os.remove(path)
+	except FileNotFoundError:
+		return False
+	delete_thumbnails(path)
+	masks = masks_path_for(path)
+	if os.path.exists(masks):
+		try:
+			os.remove(masks)
+		except OSError:
+			pass
+	return True
+
+
+def release(conn, image_paths: Iterable[str], root: str = UPLOAD_ROOT) -> int:
+	"""Gọi SAU khi đã xoá bản ghi lịch sử: xoá các ảnh không còn bản ghi nào tham chiếu.
+
+	Trả về số file đã xoá. Ảnh nằm ngoài thư mục upload không bao giờ bị đụng tới; ảnh có
+	mtime trong RELEASE_GRACE_SECONDS gần nhất được giữ lại cho gc() (xem _commit_file).
+	"""
+	paths = sorted({p for p in image_paths if p and _under_root(p, root)})
+	if not paths:
+		return 0
+	counts = PredictionHistory.reference_counts(conn, paths)
+	cutoff = time.time() - RELEASE_GRACE_SECONDS
+	deleted = 0
+	for p in paths:
+		if counts.get(p, 0) > 0:
+			continue
+		try:
+			if os.path.getmtime(p) >= cutoff:
+				continue
+		except FileNotFoundError:
+			continue
+		try:
+			deleted += 1 if _remove_blob(p) else 0
+		except OSError as e:
+			print(f"[STORE] delete {p}: {e}")
+	return deleted
+
+
+def _iter_images(root: str):
+	for dirpath, dirnames, filenames in os.walk(root):
+		dirnames[:] = [d for d in dirnames if d != INCOMING_DIR]
+		for f in filenames:
+			if f.endswith("_masks.json") or f.endswith(".part"):
+				continue
+			yield os.path.join(dirpath, f).replace("\\", "/")
+
+
+def stats(root: str = UPLOAD_ROOT) -> Dict[str, int]:
+	out = {"blobs": 0, "legacy": 0, "bytes": 0}
+	for p in _iter_images(root):
+		out["blobs" if is_blob_path(p) else "legacy"] += 1
+		out["bytes"] += os.path.getsize(p)
+	return out
+
+
+def gc(conn, root: str = UPLOAD_ROOT, min_age_hours: float = 24.0) -> List[str]:
+	"""Xoá ảnh đã lưu theo nội dung nhưng không có bản ghi lịch sử nào (vd. ảnh không qua
+	gate chó) và cũ hơn `min_age_hours` (tránh xoá ảnh đang xử lý). Dọn luôn file tạm mồ côi."""
+	cutoff = time.time() - min_age_hours * 3600.0
+	candidates = [p for p in _iter_images(root) if is_blob_path(p) and os.path.getmtime(p) < cutoff]
+	counts = PredictionHistory.reference_counts(conn, candidates) if candidates else {}
+	removed = []
+	for p in candidates:
+		if counts.get(p, 0) == 0 and _remove_blob(p):
+			removed.append(p)
+	tmp_dir = os.path.join(root, INCOMING_DIR)
+	if os.path.isdir(tmp_dir):
+		for f in os.listdir(tmp_dir):
+			fp = os.path.join(tmp_dir, f)
+			if os.path.getmtime(fp) < cutoff:
+				os.remove(fp)
+	return removed
+
+
+def _is_det(path: str) -> bool:
+	return os.path.splitext(path)[0].endswith("_det")
+
+
+def _shard_legacy(conn, path: str, root: str) -> StoredUpload:
+	"""Chuyển 1 file phẳng vào kho theo nội dung và sửa các bản ghi lịch sử trỏ tới nó."""
+	tmp = os.path.join(root, INCOMING_DIR, uuid.uuid4().hex + ".part")
+	os.makedirs(os.path.dirname(tmp), exist_ok=True)
+	digest = sha256_file(path)
+	os.replace(path, tmp)
+	stored = _commit_file(tmp, digest, normalize_ext(path), root)
+	PredictionHistory.relink_image(conn, path, stored.path)
+	delete_thumbnails(path)
+	return stored
+
+
+def migrate(conn, root: str = UPLOAD_ROOT) -> Dict[str, int]:
+	"""Chuyển ảnh cũ lưu phẳng (static/uploads/<tên>) sang dạng shard và sửa prediction_history.
+
+	Ảnh trùng nội dung gộp về 1 file. Bản ghi cũ trỏ tới ảnh annotate `<tên>_det<ext>` được
+	chuyển sang ảnh gốc `<tên><ext>` (overlay giờ vẽ phía client từ box) rồi file _det bị xoá;
+	nếu không còn ảnh gốc thì chính file _det được chuyển vào kho.
+	"""
+	moved = deduped = det_replaced = 0
+	legacy = [p for p in _iter_images(root) if not is_blob_path(p)]
+	for p in legacy:
+		if _is_det(p):
+			continue
+		stored = _shard_legacy(conn, p, root)
+		moved += 1
+		deduped += 0 if stored.created else 1
+		base, ext = os.path.splitext(p)
+		det = f"{base}_det{ext}"
+		if os.path.exists(det):
+			PredictionHistory.relink_image(conn, det, stored.path)
+			os.remove(det)
+			delete_thumbnails(det)
+			det_replaced += 1
+	# _det không còn ảnh gốc: giữ ảnh annotate làm ảnh của bản ghi
+	for p in legacy:
+		if not _is_det(p) or not os.path.exists(p):
+			continue
+		stored = _shard_legacy(conn, p, root)
+		moved += 1
+		deduped += 0 if stored.created else 1
+	return {"moved": moved, "deduplicated": deduped, "det_replaced": det_replaced}
+
+
+def main() -> None:
+	ap = argparse.ArgumentParser(description="Quản lý kho ảnh upload theo nội dung")
+	ap.add_argument("--root", default=UPLOAD_ROOT)
+	sub = ap.add_subparsers(dest="cmd", required=True)
+	sub.add_parser("stats", help="Đếm ảnh shard / ảnh cũ và dung lượng")
+	p_gc = sub.add_parser("gc", help="Xoá ảnh không còn bản ghi lịch sử nào tham chiếu")
+	p_gc.add_argument("--min-age-hours", type=float, default=24.0)
+	sub.add_parser("migrate", help="Chuyển ảnh lưu phẳng sang dạng shard theo hash")
+	args = ap.parse_args()
+
+	if args.cmd == "stats":
+		print(stats(args.root))
+		return
+	from connect import get_connection
+	conn = get_connection()
+	try:
+		if args.cmd == "gc":
+			removed = gc(conn, args.root, args.min_age_hours)
+			print(f"Removed {len(removed)} unreferenced image(s)")
+		else:
+			print(migrate(conn, args.root))
+	finally:
+		conn.close()
+
+
+if __name__ == "__main__":
+	main()
@@ -1,11 +1,15 @@
 # users.py
 # Blueprint quản trị người dùng (admin-only)
 
-from flask import Blueprint, render_template, session, redirect, url_for, flash, abort, request
+import os
+
+from flask import Blueprint, render_template, session, redirect, url_for, flash, abort, request, send_file
 from connect import get_connection
 from models import init_database
 from models import PaymentOrder
 from models import UserQuota
+from models import PredictionTimings
+from profiling import list_profiles, profile_path
 from psycopg2.extras import RealDictCursor
 
 users_bp = Blueprint("users", __name__)
@@ -172,3 +176,101 @@ def set_user_plan():
             conn.close()
 
     return redirect(url_for("users.list_users"))
+
+
+# Cửa sổ thời gian cho trang độ trễ: tham số ?window= -> số giây
+LATENCY_WINDOWS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+# Thứ tự hiển thị stage (theo luồng upload); stage lạ xếp cuối theo tên
+LATENCY_STAGE_ORDER = [
+    "ingest", "quota_gate", "store", "cascade", "detect", "gate", "segment", "breed", "hog",
+    "annotate", "db_connect", "history_save", "total",
+]
+
+
+@users_bp.route("/latency")
+def latency_dashboard():
+    """p50/p95/p99 từng stage nhận diện (bảng prediction_timings) trong cửa sổ thời gian chọn."""
+    if not require_admin():
+        return redirect(url_for("login.login"))
+
+    window = request.args.get("window", "24h")
+    if window not in LATENCY_WINDOWS:
+        window = "24h"
+    seconds = LATENCY_WINDOWS[window]
+
+    conn = None
+    stages = []
+    versions = []
+    try:
+        conn = get_connection()
+        stages = PredictionTimings.stage_percentiles(conn, seconds)
+        versions = PredictionTimings.version_summary(conn, seconds)
+    except Exception as e:
+        print(f"[USERS] latency query error: {e}")
+        flash("Không thể tải số liệu độ trễ (đã khởi tạo DB chưa?).", "error")
+    finally:
+        if conn:
+            conn.close()
+
+    order = {name: i for i, name in enumerate(LATENCY_STAGE_ORDER)}
+    stages.sort(key=lambda r: (order.get(r["stage"], len(order)), r["stage"]))
+    return render_template(
+        "latency_admin.html", stages=stages, versions=versions, window=window, windows=list(LATENCY_WINDOWS)
+    )
+
+
+@users_bp.route("/latency/prune", methods=["POST"])
+def latency_prune():
+    if not require_admin():
+        return redirect(url_for("login.login"))
+
+    try:
+        keep_days = max(1, int(request.form.get("keep_days") or 30))
+    except ValueError:
+        keep_days = 30
+    conn = None
+    try:
+        conn = get_connection()
+        removed = PredictionTimings.prune(conn, keep_days)
+        flash(f"Đã xoá {removed} bản ghi thời gian cũ hơn {keep_days} ngày.", "success")
+    except Exception as e:
+        print(f"[USERS] latency prune error: {e}")
+        flash("Không thể xoá bản ghi cũ.", "error")
+    finally:
+        if conn:
+            conn.close()
+    return redirect(url_for("users.latency_dashboard"))
+
+
+@users_bp.route("/profiles")
+def profiles_list():
+    """Các request đã profile (?profile=1 / header X-Profile, profiling.py), mới nhất trước."""
+    if not require_admin():
+        return redirect(url_for("login.login"))
+
+    return render_template("profiles_admin.html", profiles=list_profiles())
+
+
+@users_bp.route("/profiles/<name>")
+def profile_detail(name):
+    if not require_admin():
+        return redirect(url_for("login.login"))
+
+    path = profile_path(name, ".txt")
+    if path is None:
+        abort(404)
+    with open(path, encoding="utf-8") as f:
+        summary = f.read()
+    return render_template("profiles_admin.html", profiles=None, name=name, summary=summary)
+
+
+@users_bp.route("/profiles/<name>/download")
+def profile_download(name):
+    """Tải file .prof (mở bằng snakeviz hoặc python -m pstats)."""
+    if not require_admin():
+        return redirect(url_for("login.login"))
+
+    path = profile_path(name, ".prof")
+    if path is None:
+        abort(404)
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=name + ".prof")
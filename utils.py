@@ -1,12 +1,24 @@
 # utils.py
 # Các hàm tiện ích: xử lý ảnh, đặc trưng, v.v.
 
-from typing import Tuple
+import io
+import os
+from typing import Tuple, Dict
 
 import numpy as np
 import cv2
+from PIL import Image
 from skimage.feature import hog
 
+# Độ phân giải làm việc: ảnh upload được giải mã + thu nhỏ về cạnh dài tối đa này trước suy luận
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "1280"))
+_EXIF_ORIENTATION = 0x0112
+_REDUCED_FLAGS = {
+	2: cv2.IMREAD_REDUCED_COLOR_2,
+	4: cv2.IMREAD_REDUCED_COLOR_4,
+	8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
 
 def load_image_bgr(path: str) -> np.ndarray | None:
 	try:
@@ -16,6 +28,76 @@ def load_image_bgr(path: str) -> np.ndarray | None:
 		return None
 
 
+def probe_image(src) -> Dict[str, object] | None:
+	"""Đọc header ảnh (định dạng, kích thước, EXIF orientation) mà không giải mã pixel.
+
+	`src`: đường dẫn hoặc file object (vị trí đọc sẽ bị thay đổi). None nếu không phải ảnh.
+	width/height là kích thước SAU khi xoay theo EXIF (đúng như trình duyệt hiển thị).
+	"""
+	try:
+		with Image.open(src) as im:
+			orientation = int(im.getexif().get(_EXIF_ORIENTATION, 1) or 1)
+			w, h = int(im.width), int(im.height)
+			fmt = im.format
+	except Exception:
+		return None
+	if orientation not in range(1, 9):
+		orientation = 1
+	if orientation in (5, 6, 7, 8):
+		w, h = h, w
+	return {"format": fmt, "width": w, "height": h, "orientation": orientation}
+
+
+def apply_orientation(img: np.ndarray, orientation: int) -> np.ndarray:
+	"""Xoay/lật ảnh BGR theo giá trị EXIF orientation (1 = giữ nguyên)."""
+	if orientation in (2, 4, 5, 7):
+		img = cv2.flip(img, 1)
+	if orientation in (3, 4):
+		img = cv2.rotate(img, cv2.ROTATE_180)
+	elif orientation in (5, 6):
+		img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+	elif orientation in (7, 8):
+		img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+	return img
+
+
+def decode_image(src, max_side: int = IMAGE_MAX_SIDE, info: Dict[str, object] | None = None) -> np.ndarray | None:
+	"""Giải mã ảnh về BGR với cạnh dài tối đa `max_side` (0 = giữ nguyên), xoay theo EXIF.
+
+	`src`: đường dẫn hoặc bytes; `info`: kết quả probe_image nếu đã có. JPEG được giải mã thẳng
+	ở 1/2, 1/4 hoặc 1/8 độ phân giải (IMREAD_REDUCED_*, libjpeg bỏ qua hệ số DCT cao) nên ảnh
+	8000x6000 không bao giờ được bung hết ra RAM; phần dư resize INTER_AREA. Hỏng -> None.
+	"""
+	if info is None:
+		info = probe_image(src if isinstance(src, str) else io.BytesIO(src))
+		if info is None:
+			return None
+	flags = cv2.IMREAD_COLOR
+	longest = max(int(info["width"]), int(info["height"]))
+	if max_side:
+		for factor in (8, 4, 2):
+			if longest // factor >= max_side:
+				flags = _REDUCED_FLAGS[factor]
+				break
+	# Tự xoay theo EXIF (không phụ thuộc bản build OpenCV có áp orientation hay không)
+	flags |= cv2.IMREAD_IGNORE_ORIENTATION
+	try:
+		if isinstance(src, str):
+			img = cv2.imread(src, flags)
+		else:
+			img = cv2.imdecode(np.frombuffer(src, dtype=np.uint8), flags)
+	except Exception:
+		return None
+	if img is None or img.size == 0:
+		return None
+	img = apply_orientation(img, int(info.get("orientation", 1)))
+	h, w = img.shape[:2]
+	if max_side and max(h, w) > max_side:
+		scale = max_side / float(max(h, w))
+		img = cv2.resize(img, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+	return img
+
+
 def resize_keep_ratio(img: np.ndarray, target_size: Tuple[int, int] = (256, 256)) -> np.ndarray:
 	h, w = img.shape[:2]
 	th, tw = target_size
@@ -29,10 +111,124 @@ def resize_keep_ratio(img: np.ndarray, target_size: Tuple[int, int] = (256, 256)
 	return canvas
 
 
-def extract_hog_features(img: np.ndarray) -> np.ndarray:
-	"""Trích xuất đặc trưng HOG từ ảnh BGR."""
+def letterbox(img: np.ndarray, size: int = 640, color: Tuple[int, int, int] = (114, 114, 114)) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+	"""Resize giữ tỉ lệ + pad về ô vuông size x size (giống LetterBox của ultralytics).
+
+	Trả về (ảnh, tỉ lệ scale, (pad_left, pad_top)) để map bbox về ảnh gốc.
+	"""
+	h, w = img.shape[:2]
+	r = min(size / h, size / w)
+	nw, nh = int(round(w * r)), int(round(h * r))
+	dw, dh = (size - nw) / 2, (size - nh) / 2
+	if (w, h) != (nw, nh):
+		img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+	top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+	left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+	out = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+	return out, r, (left, top)
+
+
+class ImageFrame:
+	"""Ảnh upload được giải mã đúng 1 lần và dùng chung cho mọi bước trong request.
+
+	Các biến thể (letterbox 640 cho YOLO, canvas 256x256 cho HOG, ảnh xám)
+	được tính khi cần lần đầu rồi cache lại trên object.
+	"""
+
+	def __init__(self, bgr: np.ndarray, source: str | None = None):
+		self.bgr = bgr
+		self.source = source
+		self._letterboxes: Dict[int, Tuple[np.ndarray, float, Tuple[int, int]]] = {}
+		self._gray: np.ndarray | None = None
+		self._hog_canvas: np.ndarray | None = None
+		self._hog_gray: np.ndarray | None = None
+		self._hog_features: np.ndarray | None = None
+
+	@classmethod
+	def from_path(cls, path: str, max_side: int = IMAGE_MAX_SIDE) -> "ImageFrame | None":
+		"""Giải mã ở độ phân giải làm việc (xem decode_image); None nếu ảnh hỏng."""
+		img = decode_image(path, max_side)
+		if img is None:
+			return None
+		return cls(img, source=path)
+
+	@property
+	def height(self) -> int:
+		return int(self.bgr.shape[0])
+
+	@property
+	def width(self) -> int:
+		return int(self.bgr.shape[1])
+
+	def letterbox(self, size: int = 640) -> np.ndarray:
+		"""Ảnh BGR đã letterbox về size x size (đưa thẳng vào YOLO, không resize lại)."""
+		if size not in self._letterboxes:
+			self._letterboxes[size] = letterbox(self.bgr, size)
+		return self._letterboxes[size][0]
+
+	def letterbox_info(self, size: int = 640) -> Tuple[float, Tuple[int, int]]:
+		"""(tỉ lệ scale, (pad_x, pad_y)) của ảnh letterbox `size`."""
+		self.letterbox(size)
+		_, r, pad = self._letterboxes[size]
+		return r, pad
+
+	def to_original(self, xyxy, size: int = 640) -> list[float]:
+		"""Map bbox từ toạ độ ảnh letterbox về toạ độ ảnh gốc."""
+		self.letterbox(size)
+		_, r, (pad_x, pad_y) = self._letterboxes[size]
+		x1, y1, x2, y2 = [float(v) for v in xyxy]
+		x1 = min(max((x1 - pad_x) / r, 0.0), float(self.width))
+		x2 = min(max((x2 - pad_x) / r, 0.0), float(self.width))
+		y1 = min(max((y1 - pad_y) / r, 0.0), float(self.height))
+		y2 = min(max((y2 - pad_y) / r, 0.0), float(self.height))
+		return [x1, y1, x2, y2]
+
+	def crop(self, xyxy, pad: float = 0.1) -> "ImageFrame":
+		"""Cắt vùng bbox (toạ độ ảnh gốc), nới mỗi cạnh thêm `pad` × kích thước box, cắt theo biên ảnh.
+
+		Trả về ImageFrame mới trỏ vào vùng nhớ của ảnh gốc (không copy pixel).
+		"""
+		x1, y1, x2, y2 = [float(v) for v in xyxy]
+		dx, dy = (x2 - x1) * pad, (y2 - y1) * pad
+		ix1 = max(int(x1 - dx), 0)
+		iy1 = max(int(y1 - dy), 0)
+		ix2 = min(int(np.ceil(x2 + dx)), self.width)
+		iy2 = min(int(np.ceil(y2 + dy)), self.height)
+		if ix2 <= ix1 or iy2 <= iy1:
+			return self
+		return ImageFrame(self.bgr[iy1:iy2, ix1:ix2], source=self.source)
+
+	@property
+	def gray(self) -> np.ndarray:
+		if self._gray is None:
+			self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+		return self._gray
+
+	@property
+	def hog_canvas(self) -> np.ndarray:
+		if self._hog_canvas is None:
+			self._hog_canvas = resize_keep_ratio(self.bgr, (256, 256))
+		return self._hog_canvas
+
+	@property
+	def hog_gray(self) -> np.ndarray:
+		if self._hog_gray is None:
+			self._hog_gray = cv2.cvtColor(self.hog_canvas, cv2.COLOR_BGR2GRAY)
+		return self._hog_gray
+
+
+def extract_hog_features(img: "np.ndarray | ImageFrame") -> np.ndarray:
+	"""Trích xuất đặc trưng HOG từ ảnh BGR (hoặc ImageFrame: cache luôn vector đặc trưng
+	để cascade loài và HOG+SVM predictor dùng chung)."""
+	if isinstance(img, ImageFrame):
+		if img._hog_features is None:
+			img._hog_features = _hog(img.hog_gray)
+		return img._hog_features
 	img256 = resize_keep_ratio(img, (256, 256))
-	gray = cv2.cvtColor(img256, cv2.COLOR_BGR2GRAY)
+	return _hog(cv2.cvtColor(img256, cv2.COLOR_BGR2GRAY))
+
+
+def _hog(gray: np.ndarray) -> np.ndarray:
 	features = hog(
 		gray,
 		orientations=9,
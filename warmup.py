@@ -0,0 +1,75 @@
+# warmup.py
+# Warm-up mô hình ở nền sau khi khởi động + cờ sẵn sàng (readiness) cho /ready
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class Warmup:
+	"""Chạy tuần tự các bước warm-up (nạp mô hình + suy luận giả) trên 1 thread nền.
+
+	`ready` chỉ bật sau khi mọi bước đã chạy xong (bước lỗi được ghi lại nhưng không chặn
+	readiness: request thật sẽ tự fallback như khi không warm-up). enabled=False thì
+	coi như sẵn sàng ngay, mô hình nạp lười ở request đầu tiên.
+	"""
+
+	def __init__(self, steps: List[Tuple[str, Callable[[], Any]]], runs: int = 1, enabled: bool = True):
+		self.steps = steps
+		self.runs = max(1, int(runs))
+		self.enabled = enabled
+		self.results: List[Dict[str, Any]] = []
+		self.started_at: str | None = None
+		self.duration_ms: float | None = None
+		self._ready = threading.Event()
+		self._thread: threading.Thread | None = None
+		self._lock = threading.Lock()
+		if not enabled:
+			self._ready.set()
+
+	@property
+	def ready(self) -> bool:
+		return self._ready.is_set()
+
+	def wait(self, timeout: float | None = None) -> bool:
+		return self._ready.wait(timeout)
+
+	def start(self) -> "Warmup":
+		"""Bắt đầu warm-up (gọi nhiều lần cũng chỉ chạy 1 lần)."""
+		with self._lock:
+			if self.enabled and self._thread is None:
+				self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+				self._thread.start()
+		return self
+
+	def _run(self) -> None:
+		self.started_at = datetime.now().isoformat(timespec="seconds")
+		t_all = time.perf_counter()
+		for name, fn in self.steps:
+			timings: List[float] = []
+			error = None
+			for _ in range(self.runs):
+				t0 = time.perf_counter()
+				try:
+					fn()
+				except Exception as e:
+					error = str(e)
+					print(f"[WARMUP] {name} error: {e}")
+					break
+				timings.append(round((time.perf_counter() - t0) * 1000.0, 1))
+			# Lần đầu gồm cả thời gian nạp mô hình, các lần sau là suy luận đã "nóng"
+			self.results.append({"step": name, "ms": timings, "error": error})
+		self.duration_ms = round((time.perf_counter() - t_all) * 1000.0, 1)
+		self._ready.set()
+		print(f"[WARMUP] ready after {self.duration_ms} ms")
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"enabled": self.enabled,
+			"ready": self.ready,
+			"runs": self.runs,
+			"started_at": self.started_at,
+			"duration_ms": self.duration_ms,
+			"steps": list(self.results),
+		}
@@ -0,0 +1,162 @@
+# yolo_backends.py
+# Backend suy luận CPU cho các mô hình YOLO: PyTorch (ultralytics) / ONNX Runtime / OpenCV DNN
+
+import os
+import threading
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from yolo_models import to_plain
+
+BACKENDS = ("torch", "onnxruntime", "opencv")
+_export_lock = threading.Lock()
+
+
+def onnx_path_for(weights: str, dynamic: bool = True) -> str:
+	"""File ONNX cache cạnh file .pt (bản static batch=1 cho OpenCV DNN có hậu tố _static)."""
+	base = os.path.splitext(weights)[0]
+	return f"{base}.onnx" if dynamic else f"{base}_static.onnx"
+
+
+def export_onnx(weights: str, imgsz: int = 640, dynamic: bool = True) -> str:
+	"""Export .pt -> ONNX đúng 1 lần; dùng lại file đã export nếu còn mới hơn file .pt."""
+	target = onnx_path_for(weights, dynamic)
+	with _export_lock:
+		if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(weights):
+			return target
+		from ultralytics import YOLO
+		print(f"[BACKEND] exporting {weights} -> {target} (dynamic={dynamic})")
+		exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=dynamic)
+		exported = str(exported)
+		if os.path.abspath(exported) != os.path.abspath(target):
+			os.replace(exported, target)
+		return target
+
+
+class TorchBackend:
+	"""Backend mặc định: ultralytics + PyTorch.
+
+	`labels` giới hạn các class giữ lại (lọc trước NMS), `max_det` giới hạn số box sau NMS.
+	"""
+
+	name = "torch"
+
+	def __init__(self, weights: str, imgsz: int = 640, labels: Sequence[str] | None = None, max_det: int | None = None):
+		from ultralytics import YOLO
+		self.weights = weights
+		self.imgsz = imgsz
+		self.model = YOLO(weights)
+		self.task = getattr(self.model, "task", None)
+		self._setup_predict(labels, max_det)
+
+	def _setup_predict(self, labels: Sequence[str] | None, max_det: int | None) -> None:
+		self.predict_kwargs: Dict[str, Any] = {"imgsz": self.imgsz}
+		if labels:
+			names = self.model.names or {}
+			classes = sorted(int(i) for i, n in names.items() if n in labels)
+			if classes:
+				self.predict_kwargs["classes"] = classes
+			else:
+				# classes=[] sẽ loại mọi box -> không lọc nếu mô hình không có các nhãn này
+				print(f"[BACKEND] {self.weights}: no class named {list(labels)}, class filter disabled")
+		if max_det:
+			self.predict_kwargs["max_det"] = int(max_det)
+
+	def __call__(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+		return [to_plain(r) for r in self.model(images, **self.predict_kwargs)]
+
+
+class OnnxRuntimeBackend(TorchBackend):
+	"""ONNX Runtime (CPUExecutionProvider) qua AutoBackend của ultralytics: tiền/hậu xử lý
+	(letterbox, NMS, mask) giữ nguyên như PyTorch nên kết quả so sánh được trực tiếp."""
+
+	name = "onnxruntime"
+	dynamic = True
+
+	def __init__(self, weights: str, imgsz: int = 640, task: str | None = None,
+				 labels: Sequence[str] | None = None, max_det: int | None = None):
+		from ultralytics import YOLO
+		self.weights = weights
+		self.imgsz = imgsz
+		self.onnx_path = export_onnx(weights, imgsz, dynamic=self.dynamic) if weights.endswith(".pt") else weights
+		self.model = YOLO(self.onnx_path, task=task)
+		self.task = getattr(self.model, "task", task)
+		self._setup_predict(labels, max_det)
+
+
+class OpenCVBackend(OnnxRuntimeBackend):
+	"""OpenCV DNN trên file ONNX static (batch=1) -> chạy lần lượt từng ảnh trong batch."""
+
+	name = "opencv"
+	dynamic = False
+
+	def __call__(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+		out = []
+		for im in images:
+			out.extend(to_plain(r) for r in self.model(im, dnn=True, **self.predict_kwargs))
+		return out
+
+
+def load_backend(weights: str, backend: str | None = None, imgsz: int = 640, task: str | None = None,
+				 labels: Sequence[str] | None = None, max_det: int | None = None):
+	"""Nạp mô hình theo backend (mặc định lấy từ INFER_BACKEND). Lỗi export/nạp -> quay về torch."""
+	backend = (backend or os.environ.get("INFER_BACKEND", "torch")).strip().lower()
+	if backend not in BACKENDS:
+		print(f"[BACKEND] unknown backend {backend!r}, using torch")
+		backend = "torch"
+	if weights.endswith(".onnx") and backend == "torch":
+		# File ONNX có sẵn (vd. bản INT8 đã lượng tử hoá) -> chạy bằng ONNX Runtime
+		backend = "onnxruntime"
+	if backend == "onnxruntime":
+		try:
+			return OnnxRuntimeBackend(weights, imgsz, task=task, labels=labels, max_det=max_det)
+		except Exception as e:
+			print(f"[BACKEND] onnxruntime load error for {weights}: {e}; using torch")
+	elif backend == "opencv":
+		try:
+			return OpenCVBackend(weights, imgsz, task=task, labels=labels, max_det=max_det)
+		except Exception as e:
+			print(f"[BACKEND] opencv load error for {weights}: {e}; using torch")
+	return TorchBackend(weights, imgsz, labels=labels, max_det=max_det)
+
+
+# ----------------------------- Parity check -----------------------------
+
+
+def box_iou(a: List[float], b: List[float]) -> float:
+	ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+	ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+	inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+	union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+	return inter / union if union > 0 else 0.0
+
+
+def compare_results(ref: Dict[str, Any], other: Dict[str, Any], iou_thr: float = 0.9) -> Dict[str, Any]:
+	"""So khớp box của backend khác với kết quả tham chiếu (PyTorch).
+
+	Ghép tham lam theo conf giảm dần: cùng class và IoU >= iou_thr thì tính là khớp.
+	"""
+	order = sorted(range(len(ref["cls"])), key=lambda i: -ref["conf"][i])
+	used: set[int] = set()
+	matched = 0
+	conf_deltas: List[float] = []
+	for i in order:
+		best_j, best_iou = None, iou_thr
+		for j in range(len(other["cls"])):
+			if j in used or int(other["cls"][j]) != int(ref["cls"][i]):
+				continue
+			iou = box_iou(ref["xyxy"][i], other["xyxy"][j])
+			if iou >= best_iou:
+				best_j, best_iou = j, iou
+		if best_j is not None:
+			used.add(best_j)
+			matched += 1
+			conf_deltas.append(abs(float(ref["conf"][i]) - float(other["conf"][best_j])))
+	return {
+		"ref_boxes": len(ref["cls"]),
+		"other_boxes": len(other["cls"]),
+		"matched": matched,
+		"max_conf_delta": max(conf_deltas) if conf_deltas else 0.0,
+		"ok": matched == len(ref["cls"]) == len(other["cls"]),
+	}
@@ -0,0 +1,169 @@
+# yolo_models.py
+# Tìm/nạp trọng số YOLOv8 và chuẩn hoá kết quả về dict thuần (dùng chung cho web và model server)
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+# Trọng số mặc định (COCO dog/cat + segmentation)
+DET_WEIGHTS = 'yolov8n.pt'
+SEG_WEIGHTS = 'yolov8n-seg.pt'
+
+# Kích thước đầu vào YOLO: ảnh đầy đủ cho detect/segment, crop từng con chó cho breed
+YOLO_IMGSZ = 640
+BREED_IMGSZ = int(os.environ.get("BREED_CROP_IMGSZ", "320"))
+MODEL_IMGSZ = {"detect": YOLO_IMGSZ, "segment": YOLO_IMGSZ, "breed": BREED_IMGSZ}
+
+# detect/segment (COCO) chỉ cần dog/cat: lọc class trước NMS và giới hạn số box (YOLO_MAX_DET)
+SPECIES_LABELS = ("dog", "cat")
+MAX_DET = int(os.environ.get("YOLO_MAX_DET", "10"))
+MODEL_FILTERS: Dict[str, Dict[str, Any]] = {
+	"detect": {"labels": SPECIES_LABELS, "max_det": MAX_DET},
+	"segment": {"labels": SPECIES_LABELS, "max_det": MAX_DET},
+	"breed": {},
+}
+
+
+# Optional: auto-discover YOLOv8 breed model weights (trained locally)
+# Scan common locations and any runs/detect/*/weights/best.pt
+def find_breed_weight() -> str | None:
+	# Chỉ định tường minh (vd. bản INT8 từ scripts/quantize_breed_model.py)
+	override = os.environ.get("BREED_WEIGHTS", "").strip()
+	if override:
+		return override if os.path.exists(override) else None
+
+	# direct candidates
+	direct_candidates = [
+		os.path.join('runs', 'detect', 'breeds', 'weights', 'best.pt'),
+		os.path.join('runs', 'detect', 'breeds_from_scratch', 'weights', 'best.pt'),
+		os.path.join('weights', 'yolov8_breed_best.pt'),
+		os.path.join('models', 'yolov8_breed_best.pt'),
+	]
+
+	found: list[tuple[str, float]] = []
+	for p in direct_candidates:
+		if os.path.exists(p):
+			try:
+				found.append((p, os.path.getmtime(p)))
+			except Exception:
+				found.append((p, 0.0))
+
+	# Walk under runs/detect/**/weights/best.pt
+	detect_root = os.path.join('runs', 'detect')
+	if os.path.isdir(detect_root):
+		for dirpath, dirnames, filenames in os.walk(detect_root):
+			if 'best.pt' in filenames and os.path.basename(dirpath) == 'weights':
+				p = os.path.join(dirpath, 'best.pt')
+				try:
+					found.append((p, os.path.getmtime(p)))
+				except Exception:
+					found.append((p, 0.0))
+
+	if found:
+		# pick the most recently modified best.pt
+		found.sort(key=lambda t: t[1], reverse=True)
+		return found[0][0]
+	return None
+
+
+def load_yolo(path: str, imgsz: int = 640, backend: str | None = None, **filters):
+	"""Nạp mô hình YOLO qua backend cấu hình (INFER_BACKEND: torch | onnxruntime | opencv).
+
+	`filters`: labels / max_det truyền cho backend (xem MODEL_FILTERS).
+	"""
+	from yolo_backends import load_backend
+	return load_backend(path, backend=backend, imgsz=imgsz, **filters)
+
+
+def load_named(name: str, path: str, imgsz: int | None = None):
+	"""Nạp mô hình `name` (detect | segment | breed) với kích thước + bộ lọc mặc định của nó."""
+	return load_yolo(path, imgsz or MODEL_IMGSZ[name], **MODEL_FILTERS.get(name, {}))
+
+
+class LazyModel:
+	"""Giữ 1 mô hình, chỉ nạp khi get() lần đầu (an toàn đa luồng).
+
+	Nạp lỗi thì get() trả về None và không thử lại. `version` là phiên bản trọng số
+	(từ model registry); replace()/reset() đổi mô hình nóng mà không chặn request đang chạy:
+	request đã lấy mô hình cũ vẫn dùng nốt, request sau nhận mô hình mới.
+	"""
+
+	def __init__(self, name: str, loader: Callable[[], Any], version: str | None = None):
+		self.name = name
+		self._loader = loader
+		# (mô hình, phiên bản) gán cùng lúc để đọc ra luôn khớp nhau
+		self._current: Tuple[Any, str | None] = (None, version)
+		self._loaded = False
+		self._lock = threading.Lock()
+
+	@property
+	def loaded(self) -> bool:
+		return self._loaded
+
+	@property
+	def version(self) -> str | None:
+		return self._current[1]
+
+	def get(self) -> Any:
+		return self.get_with_version()[0]
+
+	def get_with_version(self) -> Tuple[Any, str | None]:
+		if not self._loaded:
+			with self._lock:
+				if not self._loaded:
+					try:
+						model = self._loader()
+					except Exception as e:
+						print(f"[MODEL] load {self.name} error: {e}")
+						model = None
+					self._current = (model, self._current[1])
+					self._loaded = True
+		return self._current
+
+	def replace(self, model: Any, version: str | None) -> None:
+		"""Thay bằng mô hình đã nạp + warm-up sẵn."""
+		with self._lock:
+			self._current = (model, version)
+			self._loaded = True
+
+	def reset(self, loader: Callable[[], Any], version: str | None) -> None:
+		"""Đổi nguồn nạp khi mô hình chưa được nạp (lần get() sau mới nạp bản mới)."""
+		with self._lock:
+			self._loader = loader
+			self._current = (None, version)
+			self._loaded = False
+
+
+def to_plain(r) -> Dict[str, Any]:
+	"""Chuyển 1 ultralytics Results thành dict thuần (pickle được, không phụ thuộc torch).
+
+	Gồm names, cls, conf, xyxy (list) và masks (mảng uint8 N×H×W hoặc None).
+	"""
+	names = dict(getattr(r, 'names', {}) or {})
+	cls: List[float] = []
+	conf: List[float] = []
+	xyxy: List[List[float]] = []
+	boxes = getattr(r, 'boxes', None)
+	if boxes is not None:
+		if getattr(boxes, 'cls', None) is not None:
+			cls = boxes.cls.tolist()
+			# Trường hợp chỉ 1 phần tử có thể là float -> chuyển về list
+			if not isinstance(cls, list):
+				cls = [cls]
+		if getattr(boxes, 'conf', None) is not None:
+			conf = boxes.conf.tolist()
+			if not isinstance(conf, list):
+				conf = [conf]
+		if getattr(boxes, 'xyxy', None) is not None:
+			xyxy = boxes.xyxy.tolist()
+	masks = None
+	if getattr(r, 'masks', None) is not None:
+		masks = (r.masks.data.cpu().numpy() > 0.5).astype(np.uint8)
+	return {"names": names, "cls": cls, "conf": conf, "xyxy": xyxy, "masks": masks}
+
+
+def run_yolo(model, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+	"""Gọi mô hình (backend từ load_yolo) cho 1 batch ảnh đã letterbox, trả về list dict thuần."""
+	return model(images)